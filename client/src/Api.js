@@ -42,6 +42,11 @@ const Api = {
     home () {
       return instance.get('/api/admin/home');
     },
+    homeSeries ({ contest_id, start_date, end_date }) {
+      return instance.get('/api/admin/home/series', {
+        params: { contest_id, start_date, end_date },
+      });
+    },
     homeUsersDaily ({ contest_id, start_date, end_date }) {
       return instance.get('/api/admin/home/users/daily', {
         params: { contest_id, start_date, end_date },
@@ -75,9 +80,9 @@ const Api = {
     contests () {
       return instance.get('/api/admin/contests');
     },
-    users ({ contest_id, is_tester, order_by, query, page }) {
+    users ({ contest_id, is_tester, order_by, query, page, cursor }) {
       return instance.get('/api/admin/users', {
-        params: { contest_id, is_tester, order_by, query, page },
+        params: { contest_id, is_tester, order_by, query, page, cursor },
       });
     },
     usersByZip ({ contest_id, is_tester }) {
@@ -1,10 +1,14 @@
 import classNames from 'classnames';
 import { Link } from 'react-router';
 
-function Pagination ({ page, lastPage, otherParams = {} }) {
+function Pagination ({ page, lastPage, nextCursor, otherParams = {} }) {
   function onClick () {
     window.scrollTo(0, 0);
   }
+  // The next page seeks past this one when the API gave a cursor for it
+  const nextParams = nextCursor
+    ? { ...otherParams, page: page + 1, cursor: nextCursor }
+    : { ...otherParams, page: page + 1 };
   return (
     <nav>
       <ul className='pagination justify-content-center'>
@@ -73,7 +77,7 @@ function Pagination ({ page, lastPage, otherParams = {} }) {
         {page < lastPage && (
           <li className='page-item'>
             <Link
-              to={`?${new URLSearchParams({ ...otherParams, page: page + 1 })}`}
+              to={`?${new URLSearchParams(nextParams)}`}
               onClick={onClick}
               className='page-link'
             >
@@ -113,7 +117,7 @@ function Pagination ({ page, lastPage, otherParams = {} }) {
         >
           {page < lastPage && (
             <Link
-              to={`?${new URLSearchParams({ ...otherParams, page: page + 1 })}`}
+              to={`?${new URLSearchParams(nextParams)}`}
               onClick={onClick}
               className='page-link'
             >
@@ -43,61 +43,25 @@ function Home () {
   useEffect(() => {
     let cancelled = false;
     Api.admin
-      .homeUsersDaily({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setUsersDaily(response.data.map((r) => [new Date([r[0]]), r[1]]))
-      );
-    Api.admin
-      .homeUsersCumulative({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setUsersCumulative(
-            response.data.map((r) => [new Date([r[0]]), r[1]])
-          )
-      );
-    Api.admin
-      .homeStepsDaily({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setStepsDaily(response.data.map((r) => [new Date([r[0]]), r[1]]))
-      );
-    Api.admin
-      .homeStepsCumulative({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setStepsCumulative(
-            response.data.map((r) => [new Date([r[0]]), r[1]])
-          )
-      );
-    Api.admin
-      .homeDistanceDaily({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setDistanceDaily(
-            response.data.map((r, i) => [
-              new Date([r[0]]),
-              i === 0 ? r[1] : r[1] / 1609,
-            ])
-          )
-      );
-    Api.admin
-      .homeDistanceCumulative({ contest_id, start_date, end_date })
-      .then(
-        (response) =>
-          !cancelled &&
-          setDistanceCumulative(
-            response.data.map((r, i) => [
-              new Date([r[0]]),
-              i === 0 ? r[1] : r[1] / 1609,
-            ])
-          )
-      );
+      .homeSeries({ contest_id, start_date, end_date })
+      .then((response) => {
+        if (cancelled) {
+          return;
+        }
+        const toDates = (series) =>
+          series.map((r) => [new Date([r[0]]), r[1]]);
+        const toMiles = (series) =>
+          series.map((r, i) => [
+            new Date([r[0]]),
+            i === 0 ? r[1] : r[1] / 1609,
+          ]);
+        setUsersDaily(toDates(response.data.users_daily));
+        setUsersCumulative(toDates(response.data.users_cumulative));
+        setStepsDaily(toDates(response.data.steps_daily));
+        setStepsCumulative(toDates(response.data.steps_cumulative));
+        setDistanceDaily(toMiles(response.data.distance_daily));
+        setDistanceCumulative(toMiles(response.data.distance_cumulative));
+      });
     return () => (cancelled = true);
   }, [contest_id, start_date, end_date]);
 
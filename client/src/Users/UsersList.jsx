@@ -20,7 +20,9 @@ function UsersList () {
   const params = new URLSearchParams(search);
 
   const page = parseInt(params.get('page') ?? '1', 10);
+  const cursor = params.get('cursor') ?? '';
   const [lastPage, setLastPage] = useState();
+  const [nextCursor, setNextCursor] = useState();
 
   const is_tester = params.get('is_tester') === 'true';
 
@@ -65,7 +67,7 @@ function UsersList () {
     let cancelled = false;
     setUsers();
     Api.admin
-      .users({ contest_id, is_tester, order_by, query, page })
+      .users({ contest_id, is_tester, order_by, query, page, cursor })
       .then((response) => {
         if (cancelled) {
           return;
@@ -80,9 +82,13 @@ function UsersList () {
           newLastPage = page + 1;
         }
         setLastPage(newLastPage);
+        setNextCursor(
+          linkHeader?.next &&
+            new URL(linkHeader.next).searchParams.get('cursor')
+        );
       });
     return () => (cancelled = true);
-  }, [contest_id, is_tester, order_by, query, page]);
+  }, [contest_id, is_tester, order_by, query, page, cursor]);
 
   useEffect(() => {
     let cancelled = false;
@@ -560,6 +566,7 @@ function UsersList () {
         <Pagination
           page={page}
           lastPage={lastPage}
+          nextCursor={nextCursor}
           otherParams={{ contest_id, order_by, is_tester, query, show_rw }}
         />
       </div>
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    # In-process caches outlive the per-test transaction rollback, so start
+    # every test from a clean slate
+    from django.core.cache import cache
+
+    from home.models.contest import ContestCalendar
+    from home.models.device import DeviceResolver
+    from home.models.leaderboard import LeaderboardRanking
+    from home.utils import metrics
+
+    ContestCalendar.invalidate()
+    DeviceResolver.clear()
+    LeaderboardRanking.invalidate()
+    metrics.reset()
+    cache.clear()
+    yield
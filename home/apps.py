@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class HomeConfig(AppConfig):
     name = "home"
+
+    def ready(self):
+        # Register signal handlers
+        from home import signals  # noqa: F401
@@ -89,13 +89,16 @@ class Command(BaseCommand):
             sys.exit(1)
 
         # Retrieve ALL daily walks and try to fit them into contests
-        daily_walks = DailyWalk.objects.all().order_by("date")
+        calendar = Contest.calendar()
+        daily_walks = (
+            DailyWalk.objects.all().select_related("account").order_by("date")
+        )
         for walk in daily_walks:
             acct = walk.account
             walks_processed += 1
 
             # Retrieve the active contest for this walk
-            active_contest = Contest.active(for_date=walk.date, strict=True)
+            active_contest = calendar.active(for_date=walk.date, strict=True)
 
             # Only process if the active contest was selected
             if active_contest in contests:
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from home.models import DailyStats
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py fold_dailystats
+    """
+
+    help = (
+        "Fold the changes appended to the admin dashboard's daily totals"
+        " into them (also done by ingest_worker). Run it periodically"
+        " when the ingest worker isn't running."
+    )
+
+    def handle(self, *args, **options):
+        folded = DailyStats.fold()
+        self.stdout.write(f"Daily stats changes folded: {folded}")
@@ -0,0 +1,100 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.models import DailyStats, DailyWalkBatch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py ingest_worker --concurrency 4 --batch_size 200
+    """
+
+    help = (
+        "Save the daily walk batches queued by api/dailywalk/create"
+        " (when DAILYWALK_ASYNC_INGEST is enabled)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch_size",
+            type=int,
+            default=settings.INGEST_BATCH_SIZE,
+            help="Accounts to claim per transaction",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Worker threads (each with its own connection)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is drained",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained",
+        )
+
+    def handle(self, *args, batch_size, concurrency, interval, once, **opts):
+        self.stop = threading.Event()
+        self.saved = 0
+        self.lock = threading.Lock()
+        # A single worker runs in the main thread
+        if concurrency == 1:
+            try:
+                self.work(batch_size, interval, once)
+            except KeyboardInterrupt:
+                pass
+        else:
+            workers = [
+                threading.Thread(
+                    target=self.work_thread, args=(batch_size, interval, once)
+                )
+                for _ in range(concurrency)
+            ]
+            for worker in workers:
+                worker.start()
+            try:
+                for worker in workers:
+                    while worker.is_alive():
+                        worker.join(timeout=1)
+            except KeyboardInterrupt:
+                self.stop.set()
+                for worker in workers:
+                    worker.join()
+        self.stdout.write(f"Batches saved: {self.saved}")
+
+    def work_thread(self, *args):
+        try:
+            self.work(*args)
+        finally:
+            # Threads get their own database connection
+            connection.close()
+
+    def work(self, batch_size, interval, once):
+        while not self.stop.is_set():
+            claimed, saved = DailyWalkBatch.flush(batch_size)
+            # Roll the dashboard's daily totals up while at it
+            DailyStats.fold()
+            with self.lock:
+                self.saved += saved
+            if claimed:
+                logger.info(
+                    f"Saved {saved} of {claimed} daily walk batches,"
+                    f" lag {DailyWalkBatch.lag():.1f}s"
+                )
+            if saved == 0:
+                if once:
+                    break
+                self.stop.wait(interval)
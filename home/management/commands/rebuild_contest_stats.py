@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home.models import AccountContestStats
+from home.utils import dataversion
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py rebuild_contest_stats --contest_id <contest_id>
+    """
+
+    help = (
+        "Recompute the accounts' contest totals shown in the admin user"
+        " list and exports from their walks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--contest_id",
+            action="append",
+            help="Only rebuild the totals of this contest (may be repeated)",
+        )
+
+    def handle(self, *args, contest_id=None, **options):
+        with transaction.atomic():
+            rows = AccountContestStats.refresh(contest_ids=contest_id)
+            dataversion.bump()
+        self.stdout.write(f"Contest stats rows written: {rows}")
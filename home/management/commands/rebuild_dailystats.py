@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home.models import DailyStats
+from home.utils import dataversion
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py rebuild_dailystats --start_date 2024-01-01
+    """
+
+    help = (
+        "Recompute the daily totals shown on the admin dashboard from the"
+        " daily walks and accounts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start_date",
+            type=date.fromisoformat,
+            help="Only rebuild days from this date (inclusive)",
+        )
+        parser.add_argument(
+            "--end_date",
+            type=date.fromisoformat,
+            help="Only rebuild days up to this date (inclusive)",
+        )
+
+    def handle(self, *args, start_date=None, end_date=None, **options):
+        dates = None
+        if start_date or end_date:
+            start_date = start_date or DailyStats.objects.earliest("date").date
+            end_date = end_date or date.today()
+            dates = [
+                start_date + timedelta(days=days)
+                for days in range((end_date - start_date).days + 1)
+            ]
+
+        with transaction.atomic():
+            rows = DailyStats.refresh(dates)
+            dataversion.bump()
+        self.stdout.write(f"Daily stats rows written: {rows}")
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from home.models.leaderboard import LeaderboardRanking
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py reconcile_leaderboard --contest_id <id> --fix
+    """
+
+    help = (
+        "Recompute leaderboard totals from daily walks and report (or fix)"
+        " entries that disagree with the incrementally maintained steps"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--contest_id",
+            help=(
+                "Only reconcile these contests."
+                " (Separate multiple by commas.)"
+            ),
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Overwrite mismatched entries with the recomputed totals",
+        )
+
+    def handle(self, *args, contest_id=None, fix=False, **options):
+        conditions = "TRUE"
+        params = []
+        if contest_id:
+            conditions = "home_leaderboard.contest_id = ANY(%s)"
+            params.append(contest_id.split(","))
+
+        # Leaderboard entries with the sum of the account's daily walks
+        # during the contest
+        totals = f"""
+            WITH totals AS (
+                SELECT home_leaderboard.id,
+                       home_leaderboard.account_id,
+                       home_leaderboard.contest_id,
+                       home_leaderboard.steps,
+                       COALESCE(SUM(home_dailywalk.steps), 0) AS total
+                FROM home_leaderboard
+                JOIN home_contest ON
+                    home_contest.contest_id = home_leaderboard.contest_id
+                LEFT JOIN home_dailywalk ON
+                    home_dailywalk.account_id = home_leaderboard.account_id AND
+                    home_dailywalk.date BETWEEN home_contest.start
+                                            AND home_contest.end
+                WHERE {conditions}
+                GROUP BY home_leaderboard.id
+            )
+        """
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                {totals}
+                SELECT account_id, contest_id, steps, total
+                FROM totals
+                WHERE steps <> total
+                ORDER BY contest_id, account_id
+                """,
+                params,
+            )
+            mismatches = cursor.fetchall()
+            cursor.execute(
+                f"SELECT COUNT(*) FROM home_leaderboard WHERE {conditions}",
+                params,
+            )
+            (checked,) = cursor.fetchone()
+
+            for account_id, contest, steps, total in mismatches:
+                self.stdout.write(
+                    f"Mismatch: account {account_id}, contest {contest}:"
+                    f" {steps} steps, recomputed {total}"
+                )
+            if fix and mismatches:
+                cursor.execute(
+                    f"""
+                    {totals}
+                    UPDATE home_leaderboard
+                    SET steps = totals.total
+                    FROM totals
+                    WHERE home_leaderboard.id = totals.id AND
+                          totals.steps <> totals.total
+                    """,
+                    params,
+                )
+                LeaderboardRanking.invalidate()
+
+        fixed = " (fixed)" if fix and mismatches else ""
+        self.stdout.write(f"Entries checked: {checked}")
+        self.stdout.write(f"Mismatched entries: {len(mismatches)}{fixed}")
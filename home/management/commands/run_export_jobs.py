@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from django.core.management.base import BaseCommand
+
+from home.models import ExportJob
+from home.utils.processpool import django_process_pool
+from home.views.api.export import (
+    contest_users,
+    contest_users_csv,
+    shard_batches,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Example:
+        python manage.py run_export_jobs --interval 5 --workers 4
+    """
+
+    help = (
+        "Run the contest exports queued by api/export/users"
+        " (with background=true)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is drained",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Processes formatting the batches of an export in parallel"
+                " (1 formats them in the command's own process)"
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained",
+        )
+
+    def handle(self, *args, interval, workers, once, **opts):
+        self.stop = threading.Event()
+        self.done = 0
+        self.failed = 0
+        self.workers = workers
+        # The pool is kept for every job, rather than started for each
+        self.pool = django_process_pool(workers) if workers > 1 else None
+        try:
+            self.work(interval, once)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+        self.stdout.write(f"Jobs done: {self.done}, failed: {self.failed}")
+
+    def work(self, interval, once):
+        while not self.stop.is_set():
+            job = ExportJob.claim()
+            if job is None:
+                if once:
+                    break
+                self.stop.wait(interval)
+                continue
+            try:
+                self.run(job)
+            finally:
+                ExportJob.release(job.pk)
+
+    def run(self, job):
+        try:
+            contest = job.contest
+            job.start(contest_users(contest, job.is_tester).count())
+            batches = None
+            if self.pool is not None:
+                batches = shard_batches(job, self.pool, self.workers)
+            job.write(
+                contest_users_csv(
+                    contest,
+                    job.is_tester,
+                    job.survey_ids,
+                    progress=job.progress,
+                    batches=batches,
+                )
+            )
+        except Exception as e:
+            logger.error(f"Could not run export job {job.pk}!", exc_info=True)
+            job.fail(str(e))
+            self.failed += 1
+        else:
+            logger.info(
+                f"Exported {job.rows_done} rows of contest {job.contest_id}"
+                f" to {job.artifact}"
+            )
+            self.done += 1
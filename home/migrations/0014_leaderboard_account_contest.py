@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0013_weeklygoal"),
+    ]
+
+    operations = [
+        # Keep only the newest leaderboard entry per account and contest
+        migrations.RunSQL(
+            """
+            DELETE FROM home_leaderboard AS lb
+            USING home_leaderboard AS newer
+            WHERE lb.account_id = newer.account_id AND
+                  lb.contest_id = newer.contest_id AND
+                  lb.id < newer.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="leaderboard",
+            constraint=models.UniqueConstraint(
+                fields=("account", "contest"), name="account_contest"
+            ),
+        ),
+    ]
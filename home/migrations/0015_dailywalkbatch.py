@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0014_leaderboard_account_contest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyWalkBatch",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "daily_walks",
+                    models.JSONField(
+                        help_text="List of [date, steps, distance] entries as sent"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="When the batch was received",
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        help_text="Account the data is linked to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="home.account",
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        help_text="Device the data is coming from",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="home.device",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("id",),
+            },
+        ),
+    ]
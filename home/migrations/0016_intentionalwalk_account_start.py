@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0015_dailywalkbatch"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="intentionalwalk",
+            index=models.Index(
+                fields=["account", "-start", "-id"],
+                name="intentionalwalk_account_start",
+            ),
+        ),
+    ]
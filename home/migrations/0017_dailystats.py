@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0016_intentionalwalk_account_start"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateField(help_text="The day the totals are for"),
+                ),
+                (
+                    "is_tester",
+                    models.BooleanField(
+                        help_text="Whether the totals are for tester accounts"
+                    ),
+                ),
+                (
+                    "steps",
+                    models.BigIntegerField(
+                        default=0, help_text="Total steps recorded for the day"
+                    ),
+                ),
+                (
+                    "distance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Total distance recorded for the day",
+                    ),
+                ),
+                (
+                    "active_accounts",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Number of accounts with a daily walk that day",
+                    ),
+                ),
+                (
+                    "signups",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Number of accounts created that day",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily stats",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="dailywalk",
+            index=models.Index(fields=["date"], name="dailywalk_date"),
+        ),
+        migrations.AddConstraint(
+            model_name="dailystats",
+            constraint=models.UniqueConstraint(
+                fields=("date", "is_tester"), name="dailystats_date_tester"
+            ),
+        ),
+    ]
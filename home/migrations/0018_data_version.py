@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0017_dailystats"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE home_data_version",
+            reverse_sql="DROP SEQUENCE home_data_version",
+        ),
+    ]
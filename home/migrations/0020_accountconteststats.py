@@ -0,0 +1,152 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0019_account_search_trgm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountContestStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dw_contest_count",
+                    models.IntegerField(
+                        default=0, help_text="Daily walks during the contest"
+                    ),
+                ),
+                (
+                    "dw_contest_steps",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Daily walk steps during the contest",
+                    ),
+                ),
+                (
+                    "dw_contest_distance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Daily walk distance during the contest",
+                    ),
+                ),
+                (
+                    "dw_baseline_count",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Daily walks during the baseline period",
+                    ),
+                ),
+                (
+                    "dw_baseline_steps",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Daily walk steps during the baseline period",
+                    ),
+                ),
+                (
+                    "dw_baseline_distance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Daily walk distance during the baseline period",
+                    ),
+                ),
+                (
+                    "iw_contest_count",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Recorded walks during the contest",
+                    ),
+                ),
+                (
+                    "iw_contest_steps",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Recorded walk steps during the contest",
+                    ),
+                ),
+                (
+                    "iw_contest_distance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Recorded walk distance during the contest",
+                    ),
+                ),
+                (
+                    "iw_contest_time",
+                    models.FloatField(
+                        default=0,
+                        help_text="Recorded walk time (in seconds) during the contest",
+                    ),
+                ),
+                (
+                    "iw_baseline_count",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Recorded walks during the baseline period",
+                    ),
+                ),
+                (
+                    "iw_baseline_steps",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Recorded walk steps during the baseline period",
+                    ),
+                ),
+                (
+                    "iw_baseline_distance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Recorded walk distance during the baseline period",
+                    ),
+                ),
+                (
+                    "iw_baseline_time",
+                    models.FloatField(
+                        default=0,
+                        help_text="Recorded walk time (in seconds) during the baseline period",
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        help_text="Account the totals are for",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="contest_stats",
+                        to="home.account",
+                    ),
+                ),
+                (
+                    "contest",
+                    models.ForeignKey(
+                        help_text="Contest the totals are for",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="account_stats",
+                        to="home.contest",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "account contest stats",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("account", "contest"),
+                        name="accountconteststats_account_contest",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0020_accountconteststats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Hash of the contest, tester flag, survey and data version",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "is_tester",
+                    models.BooleanField(
+                        help_text="Export the tester accounts"
+                    ),
+                ),
+                (
+                    "survey_hash",
+                    models.CharField(
+                        blank=True,
+                        help_text="Hash of the survey file and columns (blank without one)",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "survey_ids",
+                    models.JSONField(
+                        default=dict,
+                        help_text="Survey ids from the survey file, by email",
+                    ),
+                ),
+                (
+                    "data_version",
+                    models.BigIntegerField(
+                        help_text="Data version when the job was queued"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=8,
+                    ),
+                ),
+                (
+                    "rows_done",
+                    models.IntegerField(default=0, help_text="Rows written"),
+                ),
+                (
+                    "rows_total",
+                    models.IntegerField(
+                        blank=True,
+                        help_text="Rows to write, once started",
+                        null=True,
+                    ),
+                ),
+                (
+                    "artifact",
+                    models.CharField(
+                        blank=True,
+                        help_text="Name of the gzipped CSV in the export storage",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True, help_text="Why the job failed"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="When the job was queued"
+                    ),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the job last started",
+                        null=True,
+                    ),
+                ),
+                (
+                    "finished",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the job finished",
+                        null=True,
+                    ),
+                ),
+                (
+                    "contest",
+                    models.ForeignKey(
+                        help_text="Contest to export the accounts of",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="home.contest",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("id",),
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0021_exportjob"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE TABLE home_series_version (
+                name varchar(100) NOT NULL,
+                month date NOT NULL,
+                version bigint NOT NULL,
+                PRIMARY KEY (name, month)
+            )
+            """,
+            reverse_sql="DROP TABLE home_series_version",
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+
+# The totals as DailyStats.refresh() computes them at this point. The SQL
+# is frozen here, as the model's will change along with the schema.
+BACKFILL = """
+    INSERT INTO home_dailystats
+        (date, is_tester, steps, distance, active_accounts, signups)
+    SELECT date, is_tester, SUM(steps), SUM(distance),
+           SUM(active_accounts), SUM(signups)
+    FROM (
+        SELECT home_dailywalk.date, home_account.is_tester,
+               SUM(home_dailywalk.steps) AS steps,
+               SUM(home_dailywalk.distance) AS distance,
+               COUNT(*) AS active_accounts,
+               0 AS signups
+        FROM home_dailywalk
+        JOIN home_account ON home_account.id = home_dailywalk.account_id
+        GROUP BY home_dailywalk.date, home_account.is_tester
+        UNION ALL
+        SELECT (created AT TIME ZONE %(tz)s)::date, is_tester, 0, 0, 0,
+               COUNT(*)
+        FROM home_account
+        GROUP BY 1, is_tester
+    ) AS totals
+    GROUP BY date, is_tester
+"""
+
+
+def backfill_dailystats(apps, schema_editor):
+    # The admin dashboard reads the rollup only, fill it from the existing
+    # daily walks and accounts (as the rebuild_dailystats command does)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM home_dailystats")
+        cursor.execute(BACKFILL, {"tz": settings.TIME_ZONE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0022_series_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dailystats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import migrations
+
+# The totals as AccountContestStats.refresh() computes them at this point.
+# The SQL is frozen here, as the model's will change along with the schema.
+BACKFILL = """
+    INSERT INTO home_accountconteststats (
+        account_id, contest_id,
+        dw_contest_count, dw_contest_steps, dw_contest_distance,
+        dw_baseline_count, dw_baseline_steps, dw_baseline_distance,
+        iw_contest_count, iw_contest_steps, iw_contest_distance,
+        iw_contest_time,
+        iw_baseline_count, iw_baseline_steps, iw_baseline_distance,
+        iw_baseline_time
+    )
+    SELECT enrollments.account_id, enrollments.contest_id,
+           dw.contest_count, dw.contest_steps, dw.contest_distance,
+           dw.baseline_count, dw.baseline_steps, dw.baseline_distance,
+           iw.contest_count, iw.contest_steps, iw.contest_distance,
+           iw.contest_time,
+           iw.baseline_count, iw.baseline_steps, iw.baseline_distance,
+           iw.baseline_time
+    FROM home_account_contests AS enrollments
+    JOIN home_contest ON home_contest.contest_id = enrollments.contest_id
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*) FILTER (WHERE contest) AS contest_count,
+            COALESCE(SUM(steps) FILTER (WHERE contest), 0)
+                AS contest_steps,
+            COALESCE(SUM(distance) FILTER (WHERE contest), 0)
+                AS contest_distance,
+            COUNT(*) FILTER (WHERE baseline) AS baseline_count,
+            COALESCE(SUM(steps) FILTER (WHERE baseline), 0)
+                AS baseline_steps,
+            COALESCE(SUM(distance) FILTER (WHERE baseline), 0)
+                AS baseline_distance
+        FROM (
+            SELECT steps, distance,
+                   date BETWEEN home_contest.start AND home_contest.end
+                       AS contest,
+                   date >= home_contest.start_baseline AND
+                   date < home_contest.start AS baseline
+            FROM home_dailywalk
+            WHERE account_id = enrollments.account_id AND
+                  date BETWEEN COALESCE(home_contest.start_baseline,
+                                        home_contest.start)
+                           AND home_contest.end
+        ) AS dailywalks
+    ) AS dw
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*) FILTER (WHERE contest) AS contest_count,
+            COALESCE(SUM(steps) FILTER (WHERE contest), 0)
+                AS contest_steps,
+            COALESCE(SUM(distance) FILTER (WHERE contest), 0)
+                AS contest_distance,
+            COALESCE(SUM(walk_time) FILTER (WHERE contest), 0)
+                AS contest_time,
+            COUNT(*) FILTER (WHERE baseline) AS baseline_count,
+            COALESCE(SUM(steps) FILTER (WHERE baseline), 0)
+                AS baseline_steps,
+            COALESCE(SUM(distance) FILTER (WHERE baseline), 0)
+                AS baseline_distance,
+            COALESCE(SUM(walk_time) FILTER (WHERE baseline), 0)
+                AS baseline_time
+        FROM (
+            SELECT steps, distance, walk_time,
+                   day BETWEEN home_contest.start AND home_contest.end
+                       AS contest,
+                   day >= home_contest.start_baseline AND
+                   day < home_contest.start AS baseline
+            FROM (
+                SELECT (start AT TIME ZONE %(tz)s)::date AS day,
+                       steps, distance, walk_time
+                FROM home_intentionalwalk
+                WHERE account_id = enrollments.account_id AND
+                      start >= COALESCE(home_contest.start_baseline,
+                                        home_contest.start)::timestamp
+                               AT TIME ZONE %(tz)s AND
+                      start < (home_contest.end + 1)::timestamp
+                              AT TIME ZONE %(tz)s
+            ) AS days
+        ) AS intentionalwalks
+    ) AS iw
+"""
+
+
+def backfill_contest_stats(apps, schema_editor):
+    # Contest user lists, charts and exports read the totals only, fill
+    # them from the existing walks and enrollments (as the
+    # rebuild_contest_stats command does)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM home_accountconteststats")
+        cursor.execute(BACKFILL, {"tz": settings.TIME_ZONE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0023_dailystats_backfill"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_contest_stats, migrations.RunPython.noop
+        ),
+    ]
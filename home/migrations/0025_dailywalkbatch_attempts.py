@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0024_accountconteststats_backfill"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dailywalkbatch",
+            name="attempts",
+            field=models.IntegerField(
+                default=0, help_text="Failed attempts to save the batch"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailywalkbatch",
+            name="error",
+            field=models.TextField(
+                blank=True, help_text="Why the last attempt to save it failed"
+            ),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0025_dailywalkbatch_attempts"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE home_device_version",
+            reverse_sql="DROP SEQUENCE home_device_version",
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0026_device_version"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "DROP SEQUENCE home_device_version",
+            reverse_sql="CREATE SEQUENCE home_device_version",
+        ),
+        migrations.RunSQL(
+            """
+            CREATE TABLE home_device_invalidation (
+                id bigserial PRIMARY KEY,
+                device_id varchar(250),
+                account_id integer,
+                created timestamptz NOT NULL DEFAULT now()
+            );
+            CREATE INDEX home_device_invalidation_created
+                ON home_device_invalidation (created)
+            """,
+            reverse_sql="DROP TABLE home_device_invalidation",
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0027_device_invalidation"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE TABLE home_dailystats_delta (
+                date date NOT NULL,
+                is_tester boolean NOT NULL,
+                steps bigint NOT NULL,
+                distance double precision NOT NULL,
+                active_accounts integer NOT NULL,
+                signups integer NOT NULL
+            )
+            """,
+            reverse_sql="DROP TABLE home_dailystats_delta",
+        ),
+    ]
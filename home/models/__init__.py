@@ -1,7 +1,11 @@
 from .account import Account
+from .accountconteststats import AccountContestStats
 from .contest import Contest
+from .dailystats import DailyStats
 from .dailywalk import DailyWalk
+from .dailywalkbatch import DailyWalkBatch
 from .device import Device
+from .exportjob import ExportJob
 from .intentionalwalk import IntentionalWalk
 from .leaderboard import Leaderboard
 from .weeklygoal import WeeklyGoal
@@ -1,6 +1,10 @@
+import json
 from enum import Enum
 
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import connection, models
+from django.db.models.functions import Upper
 from setfield import SetField
 
 SAN_FRANCISCO_ZIP_CODES = set(
@@ -150,5 +154,49 @@ class Account(models.Model):
     def __str__(self):
         return f"{self.name} | {self.email}"
 
+    @staticmethod
+    def estimate_count(is_tester):
+        # Estimates the number of tester (or other) accounts from the table
+        # statistics (pg_class.reltuples and the is_tester histogram) the
+        # query planner keeps, instead of counting every row.
+        #
+        # Returns None while the table is smaller than
+        # ACCOUNT_COUNT_ESTIMATE_MIN rows (or hasn't been analyzed yet), as
+        # exact counts are cheap then and estimates off the most.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT reltuples FROM pg_class
+                WHERE oid = 'home_account'::regclass
+                """
+            )
+            (reltuples,) = cursor.fetchone()
+            if reltuples < settings.ACCOUNT_COUNT_ESTIMATE_MIN:
+                return None
+            cursor.execute(
+                """
+                EXPLAIN (FORMAT JSON)
+                SELECT 1 FROM home_account WHERE is_tester = %s
+                """,
+                [is_tester],
+            )
+            (plan,) = cursor.fetchone()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     class Meta:
         ordering = ("-created",)
+        indexes = [
+            # Trigram indexes for the admin user search. Case insensitive
+            # lookups (icontains, istartswith) compare UPPER(column), so
+            # that is what is indexed.
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="account_name_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"),
+                name="account_email_trgm",
+            ),
+        ]
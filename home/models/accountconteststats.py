@@ -0,0 +1,304 @@
+from django.conf import settings
+from django.db import connection, models
+
+from .contest import Contest
+
+# Columns of the totals, with the SQL that sums them from the walks of one
+# account during a period (see refresh)
+DAILYWALK_TOTALS = {
+    "count": "COUNT(*) FILTER (WHERE {period})",
+    "steps": "COALESCE(SUM(steps) FILTER (WHERE {period}), 0)",
+    "distance": "COALESCE(SUM(distance) FILTER (WHERE {period}), 0)",
+}
+INTENTIONALWALK_TOTALS = {
+    "count": "COUNT(*) FILTER (WHERE {period})",
+    "steps": "COALESCE(SUM(steps) FILTER (WHERE {period}), 0)",
+    "distance": "COALESCE(SUM(distance) FILTER (WHERE {period}), 0)",
+    "time": "COALESCE(SUM(walk_time) FILTER (WHERE {period}), 0)",
+}
+PERIODS = {
+    "contest": "day BETWEEN home_contest.start AND home_contest.end",
+    "baseline": (
+        "day >= home_contest.start_baseline AND day < home_contest.start"
+    ),
+}
+
+
+class AccountContestStats(models.Model):
+    """
+    Stores the totals of an account's walks for a contest it is enrolled in:
+    daily walks and recorded (intentional) walks, during the contest and
+    during its baseline period. Rows are kept up to date as walks are saved
+    and accounts enroll (see DailyWalk.ingest, IntentionalWalk.insert_batch
+    and home.signals), so the admin user list, zip code charts and exports
+    read them instead of aggregating the walk tables. The
+    `rebuild_contest_stats` management command recomputes them.
+    """
+
+    account = models.ForeignKey(
+        "Account",
+        on_delete=models.CASCADE,
+        related_name="contest_stats",
+        help_text="Account the totals are for",
+    )
+    contest = models.ForeignKey(
+        "Contest",
+        on_delete=models.CASCADE,
+        related_name="account_stats",
+        help_text="Contest the totals are for",
+    )
+    dw_contest_count = models.IntegerField(
+        default=0, help_text="Daily walks during the contest"
+    )
+    dw_contest_steps = models.BigIntegerField(
+        default=0, help_text="Daily walk steps during the contest"
+    )
+    dw_contest_distance = models.FloatField(
+        default=0, help_text="Daily walk distance during the contest"
+    )
+    dw_baseline_count = models.IntegerField(
+        default=0, help_text="Daily walks during the baseline period"
+    )
+    dw_baseline_steps = models.BigIntegerField(
+        default=0, help_text="Daily walk steps during the baseline period"
+    )
+    dw_baseline_distance = models.FloatField(
+        default=0, help_text="Daily walk distance during the baseline period"
+    )
+    iw_contest_count = models.IntegerField(
+        default=0, help_text="Recorded walks during the contest"
+    )
+    iw_contest_steps = models.BigIntegerField(
+        default=0, help_text="Recorded walk steps during the contest"
+    )
+    iw_contest_distance = models.FloatField(
+        default=0, help_text="Recorded walk distance during the contest"
+    )
+    iw_contest_time = models.FloatField(
+        default=0,
+        help_text="Recorded walk time (in seconds) during the contest",
+    )
+    iw_baseline_count = models.IntegerField(
+        default=0, help_text="Recorded walks during the baseline period"
+    )
+    iw_baseline_steps = models.BigIntegerField(
+        default=0, help_text="Recorded walk steps during the baseline period"
+    )
+    iw_baseline_distance = models.FloatField(
+        default=0,
+        help_text="Recorded walk distance during the baseline period",
+    )
+    iw_baseline_time = models.FloatField(
+        default=0,
+        help_text="Recorded walk time (in seconds) during the baseline period",
+    )
+
+    def __str__(self):
+        return f"{self.account_id} | {self.contest_id}"
+
+    @staticmethod
+    def contests_for(dates):
+        # Ids of the contests whose baseline or contest period contains any
+        # of the dates, i.e. whose totals walks on those dates count towards.
+        # Baseline periods may overlap, so every contest is checked rather
+        # than looked up.
+        dates = set(dates)
+        return {
+            contest.contest_id
+            for contest in Contest.calendar().contests.values()
+            if any(
+                (contest.start_baseline or contest.start) <= day <= contest.end
+                for day in dates
+            )
+        }
+
+    @staticmethod
+    def refresh(account_ids=None, contest_ids=None):
+        # Recomputes the totals of the accounts (or all accounts) for the
+        # contests (or all contests) they are enrolled in, from their walks,
+        # and drops the totals of contests they are no longer enrolled in.
+        # Rows whose totals haven't changed are left alone.
+        #
+        # Returns the number of rows written.
+        if account_ids is not None:
+            account_ids = sorted(set(account_ids))
+            if not account_ids:
+                return 0
+        if contest_ids is not None:
+            contest_ids = sorted({str(pk) for pk in contest_ids})
+            if not contest_ids:
+                return 0
+        conditions = ["TRUE"]
+        if account_ids is not None:
+            conditions.append("account_id = ANY(%(account_ids)s)")
+        if contest_ids is not None:
+            conditions.append("contest_id = ANY(%(contest_ids)s)")
+        conditions = " AND ".join(conditions)
+        params = {
+            "account_ids": account_ids,
+            "contest_ids": contest_ids,
+            "tz": settings.TIME_ZONE,
+        }
+
+        columns = []
+        dailywalk_totals = []
+        intentionalwalk_totals = []
+        for period, condition in PERIODS.items():
+            for total, sql in DAILYWALK_TOTALS.items():
+                columns.append(f"dw_{period}_{total}")
+                dailywalk_totals.append(
+                    f"{sql.format(period=condition)} AS dw_{period}_{total}"
+                )
+            for total, sql in INTENTIONALWALK_TOTALS.items():
+                columns.append(f"iw_{period}_{total}")
+                intentionalwalk_totals.append(
+                    f"{sql.format(period=condition)} AS iw_{period}_{total}"
+                )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM home_accountconteststats AS stats
+                WHERE {conditions} AND NOT EXISTS (
+                    SELECT 1 FROM home_account_contests
+                    WHERE home_account_contests.account_id = stats.account_id
+                      AND home_account_contests.contest_id = stats.contest_id
+                )
+                """,
+                params,
+            )
+            # The walks of each enrollment are aggregated in LATERAL
+            # subqueries, through the (account, date) and (account, start)
+            # indexes. Intentional walks count on the local day they
+            # started.
+            cursor.execute(
+                f"""
+                INSERT INTO home_accountconteststats
+                    (account_id, contest_id, {", ".join(columns)})
+                SELECT enrollments.account_id, enrollments.contest_id,
+                       {", ".join(columns)}
+                FROM (
+                    SELECT account_id, contest_id FROM home_account_contests
+                    WHERE {conditions}
+                    ORDER BY account_id, contest_id
+                ) AS enrollments
+                JOIN home_contest ON
+                    home_contest.contest_id = enrollments.contest_id
+                CROSS JOIN LATERAL (
+                    SELECT {", ".join(dailywalk_totals)}
+                    FROM (
+                        SELECT date AS day, steps, distance
+                        FROM home_dailywalk
+                        WHERE account_id = enrollments.account_id AND
+                              date BETWEEN COALESCE(home_contest.start_baseline,
+                                                    home_contest.start)
+                                       AND home_contest.end
+                    ) AS dailywalks
+                ) AS dailywalk_totals
+                CROSS JOIN LATERAL (
+                    SELECT {", ".join(intentionalwalk_totals)}
+                    FROM (
+                        SELECT (start AT TIME ZONE %(tz)s)::date AS day,
+                               steps, distance, walk_time
+                        FROM home_intentionalwalk
+                        WHERE account_id = enrollments.account_id AND
+                              start >= COALESCE(home_contest.start_baseline,
+                                                home_contest.start)::timestamp
+                                       AT TIME ZONE %(tz)s AND
+                              start < (home_contest.end + 1)::timestamp
+                                      AT TIME ZONE %(tz)s
+                    ) AS intentionalwalks
+                ) AS intentionalwalk_totals
+                ON CONFLICT (account_id, contest_id) DO UPDATE SET
+                    {", ".join(f"{c} = EXCLUDED.{c}" for c in columns)}
+                WHERE ({", ".join(f"home_accountconteststats.{c}"
+                                  for c in columns)})
+                    IS DISTINCT FROM
+                      ({", ".join(f"EXCLUDED.{c}" for c in columns)})
+                """,
+                params,
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def lock(account_id):
+        # Serializes writes to an account's walks, and so to its totals,
+        # until the end of the transaction. Daily walk syncs (including the
+        # ingest worker, see DailyWalkBatch.flush) and recorded walk syncs
+        # take the same lock, so their changes to the totals can't overwrite
+        # each other.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock("
+                "'home_dailywalk'::regclass::oid::int, %s)",
+                [account_id],
+            )
+
+    @staticmethod
+    def add(account_id, kind, changes):
+        # Adds changes in an account's walks to its totals for the contests
+        # it is enrolled in whose baseline or contest period the days fall
+        # in, rather than recomputing them. Must run with the account's
+        # lock held (see lock).
+        #
+        # kind: "dw" (daily walks) or "iw" (recorded walks)
+        # changes: list of (date, {total: delta}) changes, e.g.
+        #          (date(2024, 5, 1), {"count": 1, "steps": 500})
+        deltas = {}
+        for contest in Contest.calendar().contests.values():
+            for day, change in changes:
+                if contest.start <= day <= contest.end:
+                    period = "contest"
+                elif (
+                    contest.start_baseline is not None
+                    and contest.start_baseline <= day < contest.start
+                ):
+                    period = "baseline"
+                else:
+                    continue
+                columns = deltas.setdefault(contest.contest_id, {})
+                for total, delta in change.items():
+                    column = f"{kind}_{period}_{total}"
+                    columns[column] = columns.get(column, 0) + delta
+
+        with connection.cursor() as cursor:
+            for contest_id, columns in sorted(deltas.items()):
+                columns = {
+                    column: delta for column, delta in columns.items() if delta
+                }
+                if not columns:
+                    continue
+                cursor.execute(
+                    f"""
+                    UPDATE home_accountconteststats SET
+                        {", ".join(f"{c} = {c} + %({c})s" for c in columns)}
+                    WHERE account_id = %(account_id)s AND
+                          contest_id = %(contest_id)s
+                    """,
+                    {
+                        **columns,
+                        "account_id": account_id,
+                        "contest_id": contest_id,
+                    },
+                )
+
+    @staticmethod
+    def walks_changed(account_id, dates):
+        # Refreshes an account's totals for the contests its walks on the
+        # dates count towards. Dates may also come from model instances as
+        # strings, or be the (aware) start times of recorded walks.
+        contest_ids = AccountContestStats.contests_for(
+            models.DateField().to_python(day) for day in dates
+        )
+        if contest_ids:
+            AccountContestStats.lock(account_id)
+        AccountContestStats.refresh([account_id], contest_ids)
+
+    class Meta:
+        verbose_name_plural = "account contest stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "contest"],
+                name="accountconteststats_account_contest",
+            ),
+        ]
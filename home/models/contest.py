@@ -1,9 +1,13 @@
 import datetime
+import threading
+import time
 import uuid
+from bisect import bisect_left, bisect_right
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Q
+from django.db.models import Count, Max, Q
 
 
 class Contest(models.Model):
@@ -51,30 +55,16 @@ class Contest(models.Model):
         #
         # If strict is False, then find most recent contest (prior to for_date)
         #
-        if isinstance(for_date, str):
-            for_date = datetime.date.fromisoformat(for_date)
-        today = datetime.date.today() if for_date is None else for_date
-        contest = (
-            Contest.objects.filter(start_promo__lte=today, end__gte=today)
-            .order_by("start_promo")
-            .first()
-        )
-        if contest is None and not strict:
-            # get the last contest
-            contest = (
-                Contest.objects.filter(end__lt=today).order_by("-end").first()
-            )
-        return contest
+        return ContestCalendar.current().active(for_date, strict=strict)
 
     @staticmethod
     def for_baseline(for_date: datetime.date):
-        return (
-            Contest.objects.filter(
-                start_baseline__lte=for_date, start__gt=for_date
-            )
-            .order_by("-start")
-            .first()
-        )
+        return ContestCalendar.current().for_baseline(for_date)
+
+    @staticmethod
+    def calendar():
+        # In-memory index of all contests, for callers doing many lookups
+        return ContestCalendar.current()
 
     def save(self, *args, **kwargs):
         # ensure promotion begins before or at same time as contest start
@@ -101,3 +91,126 @@ class Contest(models.Model):
         if query.exists():
             raise ValidationError("Contest must not overlap another")
         super().save(*args, **kwargs)
+
+
+class _IntervalIndex:
+    """Date -> contest lookup over possibly overlapping [lo, hi) intervals.
+
+    The date line is cut into elementary segments at every interval boundary
+    and each segment stores its winning contest, so a lookup is one bisect.
+    Where intervals overlap, the contest with the smallest `rank` wins.
+    """
+
+    def __init__(self, intervals):
+        # intervals: iterable of (lo, hi, rank, contest), hi exclusive
+        intervals = [i for i in intervals if i[0] < i[1]]
+        self.bounds = sorted({b for i in intervals for b in i[:2]})
+        self.segments = []
+        for lo in self.bounds[:-1]:
+            covering = [i for i in intervals if i[0] <= lo < i[1]]
+            best = min(covering, key=lambda i: i[2], default=None)
+            self.segments.append(best[3] if best else None)
+
+    def lookup(self, for_date):
+        idx = bisect_right(self.bounds, for_date) - 1
+        if 0 <= idx < len(self.segments):
+            return self.segments[idx]
+        return None
+
+
+class ContestCalendar:
+    """In-memory index of all contests for date lookups without queries.
+
+    Contests change a few times a year but are looked up for every synced
+    daily walk, so each process keeps a snapshot of the contest table. Saving
+    or deleting a contest invalidates the local snapshot (see home.signals);
+    other processes notice the change through a cheap version check on the
+    contest table, run at most once every CONTEST_CALENDAR_TTL seconds.
+    """
+
+    _lock = threading.Lock()
+    _current = None
+    _version = None
+    _checked = 0.0
+
+    def __init__(self, contests):
+        one_day = datetime.timedelta(days=1)
+        self.contests = {contest.pk: contest for contest in contests}
+        # promo through end, earliest promo start wins
+        self._promo = _IntervalIndex(
+            (c.start_promo, c.end + one_day, c.start_promo, c)
+            for c in self.contests.values()
+        )
+        # contest start through end, earliest start wins
+        self._contest = _IntervalIndex(
+            (c.start, c.end + one_day, c.start, c)
+            for c in self.contests.values()
+        )
+        # baseline start up to (not including) contest start, latest wins
+        self._baseline = _IntervalIndex(
+            (c.start_baseline, c.start, -c.start.toordinal(), c)
+            for c in self.contests.values()
+            if c.start_baseline
+        )
+        self._by_end = sorted(self.contests.values(), key=lambda c: c.end)
+        self._ends = [c.end for c in self._by_end]
+
+    @staticmethod
+    def _to_date(for_date):
+        if isinstance(for_date, str):
+            return datetime.date.fromisoformat(for_date)
+        return datetime.date.today() if for_date is None else for_date
+
+    def get(self, contest_id):
+        return self.contests.get(str(contest_id))
+
+    def active(self, for_date=None, strict=False):
+        # See Contest.active
+        for_date = self._to_date(for_date)
+        contest = self._promo.lookup(for_date)
+        if contest is None and not strict:
+            # get the last contest that ended before for_date
+            idx = bisect_left(self._ends, for_date)
+            contest = self._by_end[idx - 1] if idx > 0 else None
+        return contest
+
+    def for_baseline(self, for_date):
+        # Contest whose baseline period (start_baseline <= date < start)
+        # contains for_date
+        return self._baseline.lookup(self._to_date(for_date))
+
+    def for_contest(self, for_date):
+        # Contest whose contest period (start <= date <= end) contains
+        # for_date
+        return self._contest.lookup(self._to_date(for_date))
+
+    @staticmethod
+    def _db_version():
+        return tuple(
+            Contest.objects.order_by()
+            .aggregate(count=Count("pk"), updated=Max("updated"))
+            .values()
+        )
+
+    @classmethod
+    def current(cls):
+        now = time.monotonic()
+        with cls._lock:
+            calendar = cls._current
+            if (
+                calendar is not None
+                and abs(now - cls._checked) < settings.CONTEST_CALENDAR_TTL
+            ):
+                return calendar
+            version = cls._db_version()
+            if calendar is None or version != cls._version:
+                calendar = cls(Contest.objects.all())
+                cls._current, cls._version = calendar, version
+            cls._checked = now
+            return calendar
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._current = None
+            cls._version = None
@@ -0,0 +1,271 @@
+from django.conf import settings
+from django.db import connection, models
+
+from home.utils.series import cached_series, invalidate_series
+
+# Series of the daily stats cached by home.utils.series, by is_tester
+SERIES = {
+    None: "dailystats:all",
+    False: "dailystats:users",
+    True: "dailystats:testers",
+}
+
+# The days' rows along with the deltas not folded into them yet
+TOTALS = """
+    SELECT date, is_tester, steps, distance, active_accounts, signups
+    FROM home_dailystats
+    UNION ALL
+    SELECT date, is_tester, steps, distance, active_accounts, signups
+    FROM home_dailystats_delta
+"""
+
+
+class DailyStats(models.Model):
+    """
+    Stores the totals of a day across all accounts, testers and everyone else
+    separately, for the admin dashboard. As daily walks are saved and
+    accounts sign up (see DailyWalk.ingest and home.signals), the changes
+    are appended to home_dailystats_delta rather than written to the day's
+    row, which every sync that day would otherwise wait on. Reads add the
+    deltas to the rows, and `fold` moves them into the rows from the ingest
+    worker or the `fold_dailystats` management command, so the charts don't
+    re-aggregate the daily walk table. The `rebuild_dailystats` management
+    command recomputes the totals from scratch.
+    """
+
+    date = models.DateField(help_text="The day the totals are for")
+    is_tester = models.BooleanField(
+        help_text="Whether the totals are for tester accounts"
+    )
+    steps = models.BigIntegerField(
+        default=0, help_text="Total steps recorded for the day"
+    )
+    distance = models.FloatField(
+        default=0, help_text="Total distance recorded for the day"
+    )
+    active_accounts = models.IntegerField(
+        default=0, help_text="Number of accounts with a daily walk that day"
+    )
+    signups = models.IntegerField(
+        default=0, help_text="Number of accounts created that day"
+    )
+
+    def __str__(self):
+        return f"{self.date} | {'testers' if self.is_tester else 'users'}"
+
+    @staticmethod
+    def add(account_id, changes):
+        # Appends changes to the totals of the days, for the kind of account
+        # (tester or not) the changes come from, in one INSERT. No row is
+        # updated, so concurrent syncs don't wait on each other.
+        #
+        # changes: list of (date, steps, distance, active_accounts, signups)
+        #          deltas
+        if not changes:
+            return
+        values = ", ".join(
+            ["(%s::date, %s, %s::float, %s, %s)"] * len(changes)
+        )
+        params = [value for change in changes for value in change]
+        params.append(account_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO home_dailystats_delta
+                    (date, is_tester, steps, distance, active_accounts,
+                     signups)
+                SELECT changes.date, home_account.is_tester, changes.steps,
+                       changes.distance, changes.active_accounts,
+                       changes.signups
+                FROM (VALUES {values}) AS changes
+                    (date, steps, distance, active_accounts, signups)
+                CROSS JOIN home_account
+                WHERE home_account.id = %s
+                """,
+                params,
+            )
+        DailyStats.invalidate_series(change[0] for change in changes)
+
+    @staticmethod
+    def fold():
+        # Moves the appended deltas into the days' rows, outside of any
+        # sync. Deltas appended meanwhile are left for the next fold.
+        #
+        # Returns the number of deltas folded.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH deltas AS (
+                    DELETE FROM home_dailystats_delta
+                    RETURNING date, is_tester, steps, distance,
+                              active_accounts, signups
+                ), folded AS (
+                    INSERT INTO home_dailystats
+                        (date, is_tester, steps, distance, active_accounts,
+                         signups)
+                    SELECT date, is_tester, SUM(steps), SUM(distance),
+                           SUM(active_accounts), SUM(signups)
+                    FROM deltas
+                    GROUP BY date, is_tester
+                    ORDER BY date, is_tester
+                    ON CONFLICT (date, is_tester) DO UPDATE SET
+                        steps = home_dailystats.steps + EXCLUDED.steps,
+                        distance = home_dailystats.distance
+                            + EXCLUDED.distance,
+                        active_accounts = home_dailystats.active_accounts
+                            + EXCLUDED.active_accounts,
+                        signups = home_dailystats.signups + EXCLUDED.signups
+                )
+                SELECT COUNT(*) FROM deltas
+                """
+            )
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def totals(is_tester):
+        # Sums of the signups, steps and distance of every day, with the
+        # deltas not folded yet
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT SUM(signups)::bigint, SUM(steps)::bigint,
+                       SUM(distance)
+                FROM ({TOTALS}) AS totals
+                WHERE is_tester = %s
+                """,
+                [is_tester],
+            )
+            return dict(
+                zip(["signups", "steps", "distance"], cursor.fetchone())
+            )
+
+    @staticmethod
+    def bounds(is_tester):
+        # First and last day with totals
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT MIN(date), MAX(date)
+                FROM ({TOTALS}) AS totals
+                WHERE is_tester = %s
+                """,
+                [is_tester],
+            )
+            return cursor.fetchone()
+
+    @staticmethod
+    def refresh(dates=None):
+        # Recomputes the totals of the given days (or of every day) from the
+        # daily walks and accounts. Must run in a transaction.
+        #
+        # Returns the number of rows written.
+        conditions = {"dailywalk": "TRUE", "account": "TRUE", "stats": "TRUE"}
+        params = {"tz": settings.TIME_ZONE}
+        if dates is not None:
+            dates = sorted(set(dates))
+            if not dates:
+                return 0
+            conditions = {
+                "dailywalk": "home_dailywalk.date = ANY(%(dates)s::date[])",
+                "account": "signup_date = ANY(%(dates)s::date[])",
+                "stats": "date = ANY(%(dates)s::date[])",
+            }
+            params["dates"] = dates
+
+        with connection.cursor() as cursor:
+            # Hold off syncs (and folds) until the transaction ends: walks
+            # they write after the totals are read would otherwise be lost
+            # or counted twice
+            cursor.execute(
+                "LOCK TABLE home_dailystats_delta IN EXCLUSIVE MODE"
+            )
+            cursor.execute(
+                f"""
+                DELETE FROM home_dailystats_delta
+                WHERE {conditions['stats']}
+                """,
+                params,
+            )
+            cursor.execute(
+                f"""
+                DELETE FROM home_dailystats WHERE {conditions['stats']}
+                RETURNING date
+                """,
+                params,
+            )
+            changed = {row[0] for row in cursor.fetchall()}
+            cursor.execute(
+                f"""
+                INSERT INTO home_dailystats
+                    (date, is_tester, steps, distance, active_accounts,
+                     signups)
+                SELECT date, is_tester, SUM(steps), SUM(distance),
+                       SUM(active_accounts), SUM(signups)
+                FROM (
+                    SELECT home_dailywalk.date, home_account.is_tester,
+                           SUM(home_dailywalk.steps) AS steps,
+                           SUM(home_dailywalk.distance) AS distance,
+                           COUNT(*) AS active_accounts,
+                           0 AS signups
+                    FROM home_dailywalk
+                    JOIN home_account ON
+                        home_account.id = home_dailywalk.account_id
+                    WHERE {conditions['dailywalk']}
+                    GROUP BY home_dailywalk.date, home_account.is_tester
+                    UNION ALL
+                    SELECT signup_date, is_tester, 0, 0, 0, COUNT(*)
+                    FROM (
+                        SELECT (created AT TIME ZONE %(tz)s)::date
+                                   AS signup_date,
+                               is_tester
+                        FROM home_account
+                    ) AS accounts
+                    WHERE {conditions['account']}
+                    GROUP BY signup_date, is_tester
+                ) AS totals
+                GROUP BY date, is_tester
+                RETURNING date
+                """,
+                params,
+            )
+            rows = cursor.fetchall()
+        changed.update(row[0] for row in rows)
+        DailyStats.invalidate_series(changed)
+        return len(rows)
+
+    @staticmethod
+    def series(is_tester, start_date, end_date, granularity="day"):
+        # Dense series of the daily signups, steps and distance of testers,
+        # everyone else or everyone (is_tester None), see
+        # home.utils.series.cached_series
+        source = f"""
+            SELECT "date", "signups", "steps", "distance"
+            FROM ({TOTALS}) AS "totals"
+            WHERE "date" BETWEEN %(start_date)s AND %(end_date)s
+        """
+        if is_tester is not None:
+            source = f'{source} AND "is_tester"=%(is_tester)s'
+        return cached_series(
+            SERIES[is_tester],
+            source,
+            {"signups": "bigint", "steps": "bigint", "distance": "float"},
+            start_date,
+            end_date,
+            granularity=granularity,
+            params={"is_tester": is_tester},
+        )
+
+    @staticmethod
+    def invalidate_series(dates):
+        # Dates may also come from model instances as strings or datetimes
+        dates = {models.DateField().to_python(day) for day in dates}
+        for name in SERIES.values():
+            invalidate_series(name, dates)
+
+    class Meta:
+        verbose_name_plural = "daily stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "is_tester"], name="dailystats_date_tester"
+            ),
+        ]
@@ -1,12 +1,17 @@
 import logging
+from datetime import date
 
-from django.db import models
-from home.models.leaderboard import Leaderboard
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
+from django.db import connection, models
+from django.utils import timezone
 
 
 from home.templatetags.format_helpers import m_to_mi
+from home.utils import dataversion, metrics
+
+from .accountconteststats import AccountContestStats
+from .contest import Contest
+from .dailystats import DailyStats
+from .leaderboard import Leaderboard
 
 logger = logging.getLogger(__name__)
 
@@ -53,30 +58,201 @@ class DailyWalk(models.Model):
     def __str__(self):
         return f"{self.account.email} | {self.date}"
 
-    def update_leaderboard(**kwargs):
-        device = kwargs.get("device")
-        contest = kwargs.get("contest")
-        total_steps = (
-            DailyWalk.objects.filter(account=device.account)
-            .filter(date__range=(contest.start, contest.end))
-            .aggregate(Sum("steps"))
-        )
-        if total_steps["steps__sum"] is None:
-            total_steps["steps__sum"] = 0
-        try:
-            # Update
-            leaderboard = Leaderboard.objects.get(
-                account=device.account, contest=contest
+    @staticmethod
+    def upsert(account_id, device_id, daily_walks):
+        # Inserts or updates a batch of daily walks for an account in a single
+        # INSERT ... ON CONFLICT statement against the `account_date`
+        # constraint, instead of a get + save per walk.
+        #
+        # daily_walks: list of (date, steps, distance) tuples. A date may
+        #              only appear once per statement, so the last entry
+        #              for a date wins (same as saving each in turn).
+        #
+        # Dates whose steps and distance already match the stored row are
+        # left alone, so resending history doesn't rewrite rows.
+        #
+        # Returns the (date, steps, distance, previous steps, previous
+        # distance) rows actually written by the database. Previous values
+        # are None for new dates.
+        # Serialize concurrent syncs for the same account (until the end of
+        # the transaction), so the previous values read below can't change
+        # underneath the upsert
+        AccountContestStats.lock(account_id)
+
+        rows = {}
+        for walk_date, steps, distance in daily_walks:
+            rows[walk_date] = (walk_date, steps, distance)
+        if not rows:
+            return []
+
+        now = timezone.now()
+        values = []
+        params = [account_id, list(rows)]
+        for walk_date, steps, distance in rows.values():
+            values.append("(%s, %s, %s, %s, %s, %s, %s)")
+            params.extend(
+                [walk_date, steps, distance, device_id, account_id, now, now]
             )
-            leaderboard.steps = total_steps["steps__sum"]
-            leaderboard.device = device
-            leaderboard.save()
-        except ObjectDoesNotExist:
-            leaderboard = Leaderboard.objects.create(
-                steps=total_steps["steps__sum"],
-                device=device,
-                contest=contest,
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH previous AS (
+                    SELECT date, steps, distance
+                    FROM home_dailywalk
+                    WHERE account_id = %s AND date = ANY(%s::date[])
+                ), saved AS (
+                    INSERT INTO home_dailywalk
+                        (date, steps, distance, device_id, account_id,
+                         created, updated)
+                    VALUES {", ".join(values)}
+                    ON CONFLICT (account_id, date) DO UPDATE SET
+                        steps = EXCLUDED.steps,
+                        distance = EXCLUDED.distance,
+                        device_id = EXCLUDED.device_id,
+                        updated = EXCLUDED.updated
+                    WHERE (home_dailywalk.steps, home_dailywalk.distance)
+                        IS DISTINCT FROM (EXCLUDED.steps, EXCLUDED.distance)
+                    RETURNING date, steps, distance
+                )
+                SELECT saved.date, saved.steps, saved.distance,
+                       previous.steps, previous.distance
+                FROM saved
+                LEFT JOIN previous ON previous.date = saved.date
+                """,
+                params,
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def ingest(account_id, device_id, daily_walks, synced_on=None):
+        # Saves a validated batch of daily walks synced from a device, enrolls
+        # the account in the contest active on the sync date and applies the
+        # change in steps to the account's leaderboard entries.
+        #
+        # daily_walks: list of (date, steps, distance) tuples
+        # synced_on: date the batch was sent (defaults to today)
+        #
+        # Returns {date: (date, steps, distance, previous steps, previous
+        # distance)} as written.
+
+        # Look up contests in memory, without a query per walk
+        calendar = Contest.calendar()
+        active_contests = set()
+        for walk_date, _, _ in daily_walks:
+            contest = calendar.active(for_date=walk_date, strict=True)
+            if contest is not None:
+                active_contests.add(contest)
+
+        # Insert or update all the walks in one statement.
+        # NOTE: By definition, there should be one and only one entry for
+        # a given email and date.
+        # NOTE: This is a potential vulnerability. Since there is no email
+        # authentication at the moment, anyone can simply spoof an email
+        # id with a new device and overwrite daily walk data for the
+        # target email. This is also a result of no session auth
+        # (can easily hit the api directly)
+        written = DailyWalk.upsert(account_id, device_id, daily_walks)
+        # Dates that weren't written already had the values sent
+        saved = {
+            walk_date: (walk_date, steps, distance, steps, distance)
+            for walk_date, steps, distance in daily_walks
+        }
+        saved.update((row[0], row) for row in written)
+        logger.info(
+            f"Daily walks for account {account_id}: {len(saved)} sent,"
+            f" {len(written)} changed"
+        )
+        metrics.increment("dailywalk.sent", len(saved))
+        metrics.increment("dailywalk.changed", len(written))
+
+        # Register contest for account if the day falls between contest dates
+        contest = calendar.active(
+            for_date=synced_on or date.today(), strict=True
+        )
+        enrolled = False
+        if contest:
+            active_contests.add(contest)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        INSERT INTO home_account_contests
+                            (account_id, contest_id)
+                        VALUES (%s, %s)
+                        ON CONFLICT DO NOTHING
+                        RETURNING id
+                        """,
+                        [account_id, contest.contest_id],
+                    )
+                    enrolled = cursor.fetchone() is not None
+            except Exception:
+                logger.error(
+                    "Could not associate contest "
+                    f"{contest} with account {account_id}!",
+                    exc_info=True,
+                )
+
+        # Update Leaderboard with the change in steps during each contest
+        deltas = {contest.contest_id: 0 for contest in active_contests}
+        for walk_date, steps, _, previous_steps, _ in written:
+            contest = calendar.for_contest(walk_date)
+            if contest is not None and contest.contest_id in deltas:
+                deltas[contest.contest_id] += steps - (previous_steps or 0)
+        Leaderboard.apply_deltas(account_id, device_id, deltas)
+
+        # Apply the changes to the account's totals for the contests the
+        # written days count towards, and compute its totals for a contest
+        # it just enrolled in (walks synced before enrolling count towards
+        # its baseline)
+        AccountContestStats.add(
+            account_id,
+            "dw",
+            [
+                (
+                    walk_date,
+                    {
+                        "count": 1 if previous_steps is None else 0,
+                        "steps": steps - (previous_steps or 0),
+                        "distance": distance - (previous_distance or 0),
+                    },
+                )
+                for (
+                    walk_date,
+                    steps,
+                    distance,
+                    previous_steps,
+                    previous_distance,
+                ) in written
+            ],
+        )
+        if enrolled:
+            AccountContestStats.refresh([account_id], [contest.contest_id])
+
+        # Append the changes to the dashboard's daily totals
+        changes = []
+        for (
+            walk_date,
+            steps,
+            distance,
+            previous_steps,
+            previous_distance,
+        ) in written:
+            changes.append(
+                (
+                    walk_date,
+                    steps - (previous_steps or 0),
+                    distance - (previous_distance or 0),
+                    # A new date means one more active account that day
+                    1 if previous_steps is None else 0,
+                    0,
+                )
             )
+        DailyStats.add(account_id, changes)
+        if written:
+            dataversion.bump()
+
+        return saved
 
     class Meta:
         ordering = ("-date",)
@@ -85,3 +261,6 @@ class DailyWalk(models.Model):
                 fields=["account", "date"], name="account_date"
             ),
         ]
+        indexes = [
+            models.Index(fields=["date"], name="dailywalk_date"),
+        ]
@@ -0,0 +1,173 @@
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .dailywalk import DailyWalk
+
+logger = logging.getLogger(__name__)
+
+
+class DailyWalkBatch(models.Model):
+    """
+    Stores a validated batch of daily walks waiting to be saved. When
+    DAILYWALK_ASYNC_INGEST is enabled the sync endpoint queues batches here
+    and the `ingest_worker` management command saves them in the background.
+    Batches that failed to save INGEST_MAX_ATTEMPTS times are left in the
+    table, but no longer retried (see `dead`).
+    """
+
+    account = models.ForeignKey(
+        "Account",
+        on_delete=models.CASCADE,
+        help_text="Account the data is linked to",
+    )
+    device = models.ForeignKey(
+        "Device",
+        on_delete=models.CASCADE,
+        help_text="Device the data is coming from",
+    )
+    daily_walks = models.JSONField(
+        help_text="List of [date, steps, distance] entries as sent"
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, help_text="When the batch was received"
+    )
+    attempts = models.IntegerField(
+        default=0, help_text="Failed attempts to save the batch"
+    )
+    error = models.TextField(
+        blank=True, help_text="Why the last attempt to save it failed"
+    )
+
+    def __str__(self):
+        return f"{self.device_id} | {self.created}"
+
+    @staticmethod
+    def enqueue(account_id, device_id, daily_walks):
+        # daily_walks: list of (date, steps, distance) tuples
+        return DailyWalkBatch.objects.create(
+            account_id=account_id,
+            device_id=device_id,
+            daily_walks=[
+                [walk_date.isoformat(), steps, distance]
+                for walk_date, steps, distance in daily_walks
+            ],
+        )
+
+    @staticmethod
+    def queued():
+        # Batches still to be saved
+        return DailyWalkBatch.objects.filter(
+            attempts__lt=settings.INGEST_MAX_ATTEMPTS
+        )
+
+    @staticmethod
+    def dead():
+        # Batches given up on, to be looked at (and deleted) by hand
+        return DailyWalkBatch.objects.filter(
+            attempts__gte=settings.INGEST_MAX_ATTEMPTS
+        )
+
+    @staticmethod
+    def lag():
+        # Seconds the oldest queued batch has been waiting (0 if none)
+        oldest = (
+            DailyWalkBatch.queued()
+            .order_by("id")
+            .values_list("created", flat=True)
+            .first()
+        )
+        if oldest is None:
+            return 0.0
+        return (timezone.now() - oldest).total_seconds()
+
+    @staticmethod
+    def flush(batch_size):
+        # Saves the queued batches of up to batch_size accounts, oldest
+        # first. Each account is claimed with the same transaction-level
+        # advisory lock DailyWalk.upsert takes, skipping accounts that
+        # another worker (or a synchronous request) holds. That way one
+        # worker saves all of an account's batches, in the order they were
+        # received, and workers can run side by side, each claiming the
+        # oldest accounts nobody else holds.
+        #
+        # Batches for the same account (and sync date) are coalesced into a
+        # single ingest, with later batches winning for repeated dates.
+        #
+        # Returns (claimed, saved) batch counts. Batches that fail to save
+        # are logged and left in the queue, until they have failed
+        # INGEST_MAX_ATTEMPTS times.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # The lock is tried on the accounts in order, until enough
+                # are claimed: the sorted subquery is scanned lazily under
+                # the LIMIT. OFFSET 0 keeps the lock from being pushed down
+                # into the grouping, where it would be taken on every
+                # account.
+                cursor.execute(
+                    """
+                    SELECT account_id
+                    FROM (
+                        SELECT account_id, MIN(id) AS first
+                        FROM home_dailywalkbatch
+                        WHERE attempts < %s
+                        GROUP BY account_id
+                        ORDER BY first
+                        OFFSET 0
+                    ) AS accounts
+                    WHERE pg_try_advisory_xact_lock(
+                        'home_dailywalk'::regclass::oid::int, account_id
+                    )
+                    LIMIT %s
+                    """,
+                    [settings.INGEST_MAX_ATTEMPTS, batch_size],
+                )
+                account_ids = [row[0] for row in cursor.fetchall()]
+            batches = (
+                DailyWalkBatch.queued()
+                .filter(account_id__in=account_ids)
+                .order_by("id")
+            )
+
+            groups = {}
+            for batch in batches:
+                key = (batch.account_id, timezone.localdate(batch.created))
+                group = groups.setdefault(key, {"walks": [], "batches": []})
+                group["device_id"] = batch.device_id
+                group["batches"].append(batch.pk)
+                group["walks"].extend(
+                    (date.fromisoformat(walk_date), steps, distance)
+                    for walk_date, steps, distance in batch.daily_walks
+                )
+
+            claimed, saved = 0, []
+            for (account_id, synced_on), group in groups.items():
+                claimed += len(group["batches"])
+                try:
+                    with transaction.atomic():
+                        DailyWalk.ingest(
+                            account_id,
+                            group["device_id"],
+                            group["walks"],
+                            synced_on=synced_on,
+                        )
+                except Exception as e:
+                    logger.error(
+                        f"Could not save daily walk batches {group['batches']}"
+                        f" for account {account_id}!",
+                        exc_info=True,
+                    )
+                    DailyWalkBatch.objects.filter(
+                        pk__in=group["batches"]
+                    ).update(attempts=F("attempts") + 1, error=str(e))
+                else:
+                    saved.extend(group["batches"])
+            DailyWalkBatch.objects.filter(pk__in=saved).delete()
+        return claimed, len(saved)
+
+    class Meta:
+        ordering = ("id",)
@@ -1,4 +1,17 @@
-from django.db import models
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from home.utils import metrics
+
+
+# What the mobile endpoints need to know about a registered device
+ResolvedDevice = namedtuple(
+    "ResolvedDevice", ["device_id", "account_id", "is_tester"]
+)
 
 
 class Device(models.Model):
@@ -30,5 +43,196 @@ class Device(models.Model):
     def __str__(self):
         return f"{self.device_id} | {self.account} "
 
+    @staticmethod
+    def resolve(device_id):
+        """Returns a ResolvedDevice, or None if device_id is not registered"""
+        return DeviceResolver.resolve(device_id)
+
     class Meta:
         ordering = ("-created",)
+
+
+class DeviceResolver:
+    """Bounded, expiring in-process cache of device registrations.
+
+    Every mobile endpoint starts by resolving the device id in the request to
+    its account, so each process keeps the most recently used registrations
+    (DEVICE_CACHE_SIZE entries) for DEVICE_CACHE_TTL seconds. Unregistered
+    ids are cached too, for DEVICE_CACHE_NEGATIVE_TTL seconds, so clients
+    retrying with a bad id don't each cost a query.
+
+    Saving or deleting a device or account drops its entries in this process
+    and logs the change in home_device_invalidation (see home.signals). Other
+    processes read the log at most every DEVICE_CACHE_CHECK seconds and drop
+    the entries it names; a change they miss, e.g. one committed after a
+    later one they already read, still expires with its entries.
+    """
+
+    _lock = threading.Lock()
+    # device_id -> (expires, ResolvedDevice or None), least recent first
+    _entries = OrderedDict()
+    # account_id -> device_ids cached for it
+    _by_account = {}
+    # Bumped by every invalidation, so a lookup that raced one isn't cached
+    _generation = 0
+    # Last home_device_invalidation row read, and when the log was read
+    _logged = None
+    _checked = None
+
+    @staticmethod
+    def _lookup(device_id):
+        row = (
+            Device.objects.filter(device_id=device_id)
+            .values_list("account_id", "account__is_tester")
+            .first()
+        )
+        return ResolvedDevice(device_id, *row) if row else None
+
+    @classmethod
+    def resolve(cls, device_id):
+        now = time.monotonic()
+        cls._check(now)
+        with cls._lock:
+            entry = cls._entries.get(device_id)
+            if entry is not None:
+                expires, device = entry
+                if now < expires:
+                    cls._entries.move_to_end(device_id)
+                    metrics.increment("device_cache.hits")
+                    return device
+                cls._discard(device_id)
+                metrics.increment("device_cache.expirations")
+            metrics.increment("device_cache.misses")
+            generation = cls._generation
+
+        device = cls._lookup(device_id)
+        ttl = (
+            settings.DEVICE_CACHE_TTL
+            if device is not None
+            else settings.DEVICE_CACHE_NEGATIVE_TTL
+        )
+        with cls._lock:
+            if generation != cls._generation:
+                return device
+            cls._discard(device_id)
+            cls._entries[device_id] = (now + ttl, device)
+            if device is not None:
+                cls._by_account.setdefault(device.account_id, set()).add(
+                    device_id
+                )
+            while len(cls._entries) > settings.DEVICE_CACHE_SIZE:
+                cls._discard(next(iter(cls._entries)))
+                metrics.increment("device_cache.evictions")
+        return device
+
+    @classmethod
+    def _check(cls, now):
+        # Drops the entries of devices and accounts changed by any process
+        # since the log was last read
+        with cls._lock:
+            if (
+                cls._checked is not None
+                and abs(now - cls._checked) < settings.DEVICE_CACHE_CHECK
+            ):
+                return
+            cls._checked = now
+            logged = cls._logged
+        with connection.cursor() as cursor:
+            if logged is None:
+                # Nothing is cached yet: start from the end of the log
+                cursor.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM home_device_invalidation"
+                )
+                logged = cursor.fetchone()[0]
+                with cls._lock:
+                    cls._logged = max(cls._logged or 0, logged)
+                return
+            cursor.execute(
+                """
+                SELECT id, device_id, account_id
+                FROM home_device_invalidation
+                WHERE id > %s
+                ORDER BY id
+                """,
+                [logged],
+            )
+            rows = cursor.fetchall()
+        if rows:
+            cls._invalidate(
+                [device_id for _, device_id, _ in rows if device_id],
+                [account_id for _, _, account_id in rows if account_id],
+            )
+            with cls._lock:
+                cls._logged = max(cls._logged, rows[-1][0])
+
+    @classmethod
+    def _discard(cls, device_id):
+        # Caller holds the lock
+        entry = cls._entries.pop(device_id, None)
+        if entry is not None and entry[1] is not None:
+            account_id = entry[1].account_id
+            device_ids = cls._by_account.get(account_id)
+            if device_ids is not None:
+                device_ids.discard(device_id)
+                if not device_ids:
+                    del cls._by_account[account_id]
+
+    @classmethod
+    def _invalidate(cls, device_ids=(), account_ids=()):
+        with cls._lock:
+            device_ids = set(device_ids)
+            for account_id in account_ids:
+                device_ids |= cls._by_account.get(account_id, set())
+            for device_id in device_ids:
+                cls._discard(device_id)
+            cls._generation += 1
+
+    @classmethod
+    def invalidate(cls, device_ids=(), account_ids=()):
+        """Drops cached entries for the given devices and accounts.
+
+        Entries are dropped right away and again once the current transaction
+        commits, so a concurrent request can't cache the pre-commit state.
+        The change is logged in the same transaction for other processes,
+        and log rows older than DEVICE_CACHE_TTL, whose entries have expired
+        anyway, are pruned.
+        """
+        cls._invalidate(device_ids, account_ids)
+        rows = [(device_id, None) for device_id in device_ids]
+        rows += [(None, account_id) for account_id in account_ids]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM home_device_invalidation
+                    WHERE created < now() - make_interval(secs => %s)
+                    """,
+                    [settings.DEVICE_CACHE_TTL],
+                )
+                cursor.execute(
+                    "INSERT INTO home_device_invalidation"
+                    " (device_id, account_id) VALUES "
+                    + ", ".join(["(%s, %s)"] * len(rows)),
+                    [value for row in rows for value in row],
+                )
+        transaction.on_commit(lambda: cls._invalidate(device_ids, account_ids))
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._by_account.clear()
+            cls._logged = None
+            cls._checked = None
+
+    @classmethod
+    def stats(cls):
+        # Hits, misses, evictions and expirations since the process started
+        stats = dict.fromkeys(
+            ["hits", "misses", "evictions", "expirations"], 0
+        )
+        for name, value in metrics.snapshot("device_cache.").items():
+            stats[name.split(".", 1)[1]] = value
+        with cls._lock:
+            stats["size"] = len(cls._entries)
+        return stats
@@ -0,0 +1,241 @@
+import gzip
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, models
+from django.db.models import F
+from django.utils import timezone
+
+from home.utils import dataversion
+
+
+class ExportJob(models.Model):
+    """
+    Stores a contest export run in the background by the `run_export_jobs`
+    management command, which writes it as a gzipped CSV artifact under
+    EXPORT_ROOT. Jobs are keyed by the contest, tester flag, survey file and
+    data version they export, so an export of unchanged data is queued once
+    and served from its artifact afterwards.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Hash of the contest, tester flag, survey and data version",
+    )
+    contest = models.ForeignKey(
+        "Contest",
+        on_delete=models.CASCADE,
+        help_text="Contest to export the accounts of",
+    )
+    is_tester = models.BooleanField(help_text="Export the tester accounts")
+    survey_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Hash of the survey file and columns (blank without one)",
+    )
+    survey_ids = models.JSONField(
+        default=dict, help_text="Survey ids from the survey file, by email"
+    )
+    data_version = models.BigIntegerField(
+        help_text="Data version when the job was queued"
+    )
+    status = models.CharField(
+        max_length=8, choices=STATUS_CHOICES, default=QUEUED
+    )
+    rows_done = models.IntegerField(default=0, help_text="Rows written")
+    rows_total = models.IntegerField(
+        null=True, blank=True, help_text="Rows to write, once started"
+    )
+    artifact = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Name of the gzipped CSV in the export storage",
+    )
+    error = models.TextField(blank=True, help_text="Why the job failed")
+    created = models.DateTimeField(
+        auto_now_add=True, help_text="When the job was queued"
+    )
+    started = models.DateTimeField(
+        null=True, blank=True, help_text="When the job last started"
+    )
+    finished = models.DateTimeField(
+        null=True, blank=True, help_text="When the job finished"
+    )
+
+    def __str__(self):
+        return f"{self.contest_id} | {self.key} | {self.status}"
+
+    @staticmethod
+    def storage():
+        return FileSystemStorage(location=settings.EXPORT_ROOT)
+
+    @staticmethod
+    def survey_digest(content, email_col, id_col):
+        # Hash of a survey file's content and the columns read from it
+        digest = hashlib.sha256(f"{email_col}:{id_col}:".encode("utf-8"))
+        digest.update(content)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key_for(contest_id, is_tester, survey_hash, data_version):
+        return hashlib.sha256(
+            f"{contest_id}:{is_tester}:{survey_hash}:{data_version}".encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+    @staticmethod
+    def current(contest_id, is_tester, survey_hash=""):
+        # The job exporting the data as it is now, if any
+        key = ExportJob.key_for(
+            contest_id, is_tester, survey_hash, dataversion.current()
+        )
+        return ExportJob.objects.filter(key=key).first()
+
+    @staticmethod
+    def enqueue(contest_id, is_tester, survey_ids=None, survey_hash=""):
+        # Returns the job exporting the data as it is now, queuing it unless
+        # it is already queued, running or done. Failed jobs, and done jobs
+        # whose artifact is gone, are queued again.
+        data_version = dataversion.current()
+        job, created = ExportJob.objects.get_or_create(
+            key=ExportJob.key_for(
+                contest_id, is_tester, survey_hash, data_version
+            ),
+            defaults=dict(
+                contest_id=contest_id,
+                is_tester=is_tester,
+                survey_hash=survey_hash,
+                survey_ids=survey_ids or {},
+                data_version=data_version,
+            ),
+        )
+        if job.status == ExportJob.FAILED or (
+            job.status == ExportJob.DONE and not job.has_artifact()
+        ):
+            job.status = ExportJob.QUEUED
+            job.rows_done = 0
+            job.artifact = ""
+            job.error = ""
+            job.save()
+        return job
+
+    @staticmethod
+    def claim():
+        # Claims the oldest job waiting to run, with a session-level
+        # advisory lock held until release(). Running jobs nobody holds the
+        # lock of were left behind by a worker that died, and run again.
+        # That way workers can run side by side.
+        #
+        # Returns the job, or None if there is none to run.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id FROM home_exportjob
+                WHERE status IN (%s, %s)
+                ORDER BY id
+                """,
+                [ExportJob.QUEUED, ExportJob.RUNNING],
+            )
+            for (pk,) in cursor.fetchall():
+                cursor.execute(
+                    """
+                    SELECT pg_try_advisory_lock(
+                        'home_exportjob'::regclass::oid::int, %s
+                    )
+                    """,
+                    [pk],
+                )
+                if not cursor.fetchone()[0]:
+                    continue
+                # It may have finished since it was listed
+                job = ExportJob.objects.filter(
+                    pk=pk, status__in=[ExportJob.QUEUED, ExportJob.RUNNING]
+                ).first()
+                if job is not None:
+                    return job
+                ExportJob.release(pk)
+        return None
+
+    @staticmethod
+    def release(pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT pg_advisory_unlock(
+                    'home_exportjob'::regclass::oid::int, %s
+                )
+                """,
+                [pk],
+            )
+
+    def has_artifact(self):
+        return bool(self.artifact) and self.storage().exists(self.artifact)
+
+    def start(self, rows_total):
+        self.status = ExportJob.RUNNING
+        self.rows_done = 0
+        self.rows_total = rows_total
+        self.started = timezone.now()
+        self.save()
+
+    def progress(self, rows):
+        # Counts rows written, without reading the job back
+        ExportJob.objects.filter(pk=self.pk).update(
+            rows_done=F("rows_done") + rows
+        )
+
+    def write(self, chunks):
+        # Writes the chunks of CSV as the job's gzipped artifact, which only
+        # appears once complete, marks the job done and deletes the jobs
+        # and artifacts it supersedes, i.e. those of the same export at
+        # older data versions
+        storage = self.storage()
+        name = f"{self.key}.csv.gz"
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(f"{path}.tmp", "wb") as f:
+            for chunk in chunks:
+                f.write(chunk.encode(settings.DEFAULT_CHARSET))
+        os.replace(f"{path}.tmp", path)
+
+        self.refresh_from_db(fields=["rows_done"])
+        self.status = ExportJob.DONE
+        self.artifact = name
+        self.finished = timezone.now()
+        self.save()
+
+        superseded = ExportJob.objects.filter(
+            contest_id=self.contest_id,
+            is_tester=self.is_tester,
+            survey_hash=self.survey_hash,
+            status__in=[ExportJob.DONE, ExportJob.FAILED],
+            data_version__lt=self.data_version,
+        )
+        for job in superseded:
+            if job.artifact:
+                storage.delete(job.artifact)
+            job.delete()
+
+    def fail(self, error):
+        self.status = ExportJob.FAILED
+        self.error = error
+        self.finished = timezone.now()
+        self.save()
+
+    class Meta:
+        ordering = ("id",)
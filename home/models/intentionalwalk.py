@@ -2,9 +2,16 @@ import time
 
 from dateutil import parser
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models
+from django.db.models import Count, Sum
+from django.utils import timezone
 
 from home.templatetags.format_helpers import m_to_mi
+from home.utils import dataversion
+
+from .accountconteststats import AccountContestStats
 
 
 class IntentionalWalk(models.Model):
@@ -72,7 +79,8 @@ class IntentionalWalk(models.Model):
 
     def save(self, *args, **kwargs):
         # Auto populate the account field from the device field
-        self.account = self.device.account
+        if self.account_id is None:
+            self.account_id = self.device.account_id
         # Calculate the walk time
         self.update_walk_time()
         super().save(*args, **kwargs)
@@ -80,5 +88,132 @@ class IntentionalWalk(models.Model):
     def __str__(self):
         return f"{self.account.email}  | {self.start} - {self.end}"
 
+    @staticmethod
+    def insert_batch(account_id, device_id, walks):
+        # Inserts the walks an account doesn't have yet, in one statement.
+        # Walks are immutable, so event_ids that already exist (or show up
+        # twice in the batch) are skipped rather than updated.
+        #
+        # walks: list of dicts with event_id, start and end (aware
+        #        datetimes), steps, distance and pause_time
+        #
+        # Returns the set of event_ids that were inserted.
+
+        # Serialize with the account's other syncs, which update the same
+        # totals
+        AccountContestStats.lock(account_id)
+        existing = set(
+            IntentionalWalk.objects.filter(
+                event_id__in=[walk["event_id"] for walk in walks]
+            ).values_list("event_id", flat=True)
+        )
+        # Skip the insert (and the ids it would use up) for pure resends
+        new_walks = [
+            walk for walk in walks if walk["event_id"] not in existing
+        ]
+        if not new_walks:
+            return set()
+
+        now = timezone.now()
+        values = []
+        params = []
+        for walk in new_walks:
+            values.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+            params.extend(
+                [
+                    walk["event_id"],
+                    walk["start"],
+                    walk["end"],
+                    walk["steps"],
+                    walk["pause_time"],
+                    # Total time walked not including pause time
+                    (walk["end"] - walk["start"]).total_seconds()
+                    - walk["pause_time"],
+                    walk["distance"],
+                    device_id,
+                    account_id,
+                    now,
+                ]
+            )
+        with connection.cursor() as cursor:
+            # A concurrent request may have inserted some of them since
+            cursor.execute(
+                f"""
+                INSERT INTO home_intentionalwalk
+                    (event_id, start, "end", steps, pause_time, walk_time,
+                     distance, device_id, account_id, created)
+                VALUES {", ".join(values)}
+                ON CONFLICT (event_id) DO NOTHING
+                RETURNING event_id
+                """,
+                params,
+            )
+            inserted = {row[0] for row in cursor.fetchall()}
+        if inserted:
+            IntentionalWalk.invalidate_totals(account_id)
+            # Walks count on the local day they started
+            AccountContestStats.add(
+                account_id,
+                "iw",
+                [
+                    (
+                        timezone.localdate(walk["start"]),
+                        {
+                            "count": 1,
+                            "steps": walk["steps"],
+                            "distance": walk["distance"],
+                            "time": (
+                                walk["end"] - walk["start"]
+                            ).total_seconds()
+                            - walk["pause_time"],
+                        },
+                    )
+                    for walk in new_walks
+                    if walk["event_id"] in inserted
+                ],
+            )
+            dataversion.bump()
+        return inserted
+
+    @staticmethod
+    def _totals_key(account_id):
+        return f"intentionalwalk:totals:{account_id}"
+
+    @staticmethod
+    def totals(account_id):
+        # Count and sums of an account's walks in one aggregate query.
+        # Cached for INTENTIONALWALK_TOTALS_TTL seconds when set (walks are
+        # only ever added or deleted, see invalidate_totals).
+        key = IntentionalWalk._totals_key(account_id)
+        ttl = settings.INTENTIONALWALK_TOTALS_TTL
+        totals = cache.get(key) if ttl else None
+        if totals is None:
+            totals = (
+                IntentionalWalk.objects.filter(account_id=account_id)
+                .order_by()
+                .aggregate(
+                    count=Count("id"),
+                    steps=Sum("steps"),
+                    walk_time=Sum("walk_time"),
+                    pause_time=Sum("pause_time"),
+                    distance=Sum("distance"),
+                )
+            )
+            totals = {name: value or 0 for name, value in totals.items()}
+            if ttl:
+                cache.set(key, totals, ttl)
+        return totals
+
+    @staticmethod
+    def invalidate_totals(account_id):
+        cache.delete(IntentionalWalk._totals_key(account_id))
+
     class Meta:
         ordering = ("-start",)
+        indexes = [
+            # Keyset pagination of an account's walks, newest first
+            models.Index(
+                fields=["account", "-start", "-id"],
+                name="intentionalwalk_account_start",
+            ),
+        ]
@@ -1,4 +1,11 @@
-from django.db import models
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .account import Account
 
 
 # Event model
@@ -30,3 +37,209 @@ class Leaderboard(models.Model):
 
     def __str__(self):
         return f"{self.device.device_id} | {self.steps}"
+
+    @staticmethod
+    def apply_deltas(account_id, device_id, deltas):
+        # Adds step deltas to an account's leaderboard entries in one
+        # UPDATE ... SET steps = steps + delta, instead of re-summing all of
+        # the account's daily walks for every contest.
+        #
+        # deltas: {contest_id: change in steps}. A delta of 0 only makes
+        #         sure the entry exists, without rewriting it.
+        #
+        # Missing entries are created from the full sum of the account's
+        # daily walks during the contest.
+        if not deltas:
+            return
+        values = ", ".join(["(%s, %s)"] * len(deltas))
+        params = []
+        for contest_id, delta in deltas.items():
+            params.extend([contest_id, delta])
+        params.extend([device_id, account_id, account_id])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH deltas (contest_id, steps) AS (
+                    VALUES {values}
+                ), updated AS (
+                    UPDATE home_leaderboard AS lb
+                    SET steps = lb.steps + deltas.steps, device_id = %s
+                    FROM deltas
+                    WHERE lb.account_id = %s AND
+                          lb.contest_id = deltas.contest_id AND
+                          deltas.steps <> 0
+                    RETURNING lb.contest_id, lb.steps
+                )
+                SELECT contest_id, steps, TRUE FROM updated
+                UNION ALL
+                SELECT lb.contest_id, lb.steps, FALSE
+                FROM home_leaderboard AS lb
+                JOIN deltas ON deltas.contest_id = lb.contest_id
+                WHERE lb.account_id = %s AND deltas.steps = 0
+                """,
+                params,
+            )
+            existing = set()
+            for contest_id, steps, updated in cursor.fetchall():
+                existing.add(contest_id)
+                if updated:
+                    LeaderboardRanking.patch(contest_id, account_id, steps)
+        for contest_id in deltas:
+            if contest_id not in existing:
+                Leaderboard.recompute(account_id, device_id, contest_id)
+
+    @staticmethod
+    def recompute(account_id, device_id, contest_id):
+        # Sets an account's leaderboard entry for a contest to the sum of its
+        # daily walks during the contest, creating the entry if needed
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO home_leaderboard
+                    (steps, account_id, contest_id, device_id)
+                SELECT COALESCE(SUM(home_dailywalk.steps), 0), %s, %s, %s
+                FROM home_contest
+                LEFT JOIN home_dailywalk ON
+                    home_dailywalk.account_id = %s AND
+                    home_dailywalk.date BETWEEN home_contest.start
+                                            AND home_contest.end
+                WHERE home_contest.contest_id = %s
+                ON CONFLICT (account_id, contest_id) DO UPDATE SET
+                    steps = EXCLUDED.steps,
+                    device_id = EXCLUDED.device_id
+                RETURNING steps
+                """,
+                [account_id, contest_id, device_id, account_id, contest_id],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            LeaderboardRanking.patch(contest_id, account_id, row[0])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "contest"], name="account_contest"
+            ),
+        ]
+
+
+class LeaderboardRanking:
+    """In-memory ranking of a contest's leaderboard entries.
+
+    The leaderboard is fetched on every app open, so each process keeps the
+    entries of a contest (testers and everyone else ranked separately) sorted
+    by steps: the top of the leaderboard is a slice and anyone's rank is a
+    binary search. Entries written through Leaderboard.apply_deltas or
+    recompute are patched in once their transaction commits; any other
+    change (see home.signals) drops the contest's rankings. Other processes pick changes up when their
+    rankings expire after LEADERBOARD_CACHE_TTL seconds.
+    """
+
+    _lock = threading.Lock()
+    # (contest_id, is_tester) -> LeaderboardRanking
+    _rankings = {}
+
+    def __init__(self, entries, expires):
+        # account_id -> steps
+        self.steps = dict(entries)
+        # (-steps, account_id), most steps first
+        self._order = sorted(
+            (-steps, account_id) for account_id, steps in self.steps.items()
+        )
+        self.expires = expires
+
+    def __len__(self):
+        return len(self._order)
+
+    def top(self, n):
+        # [(account_id, steps, rank)] for the n entries with the most steps,
+        # where tied entries share the best rank (like SQL RANK())
+        top = []
+        with self._lock:
+            for neg_steps, account_id in self._order[:n]:
+                rank = bisect_left(self._order, (neg_steps,)) + 1
+                top.append((account_id, -neg_steps, rank))
+        return top
+
+    def rank(self, steps):
+        # Number of entries with at least this many steps
+        with self._lock:
+            return bisect_left(self._order, (-steps + 1,))
+
+    def _update(self, account_id, steps):
+        previous = self.steps.get(account_id)
+        if previous is not None:
+            del self._order[bisect_left(self._order, (-previous, account_id))]
+        self.steps[account_id] = steps
+        insort(self._order, (-steps, account_id))
+
+    @classmethod
+    def current(cls, contest_id, is_tester):
+        key = (str(contest_id), is_tester)
+        now = time.monotonic()
+        with cls._lock:
+            ranking = cls._rankings.get(key)
+            if ranking is not None and now < ranking.expires:
+                return ranking
+        entries = Leaderboard.objects.filter(
+            contest_id=contest_id, account__is_tester=is_tester
+        ).values_list("account_id", "steps")
+        ranking = cls(entries, now + settings.LEADERBOARD_CACHE_TTL)
+        with cls._lock:
+            cls._rankings[key] = ranking
+        return ranking
+
+    @classmethod
+    def patch(cls, contest_id, account_id, steps):
+        # Applies a written leaderboard entry to the cached rankings once the
+        # current transaction commits, so a rolled back write isn't ranked
+        transaction.on_commit(
+            lambda: cls._patch(str(contest_id), account_id, steps)
+        )
+
+    @classmethod
+    def _patch(cls, contest_id, account_id, steps):
+        with cls._lock:
+            cached = False
+            for is_tester in (False, True):
+                ranking = cls._rankings.get((contest_id, is_tester))
+                if ranking is not None and account_id in ranking.steps:
+                    ranking._update(account_id, steps)
+                    return
+                cached = cached or ranking is not None
+        if not cached:
+            return
+
+        # A new entry: add it to the ranking for the account's kind
+        is_tester = (
+            Account.objects.filter(pk=account_id)
+            .values_list("is_tester", flat=True)
+            .first()
+        )
+        with cls._lock:
+            ranking = cls._rankings.get((contest_id, is_tester))
+            if ranking is not None:
+                ranking._update(account_id, steps)
+
+    @classmethod
+    def account_changed(cls, account_id, is_tester=None):
+        # Drops the rankings of contests where the account is ranked with
+        # the wrong kind of accounts (or at all, if is_tester is None
+        # because it was deleted)
+        with cls._lock:
+            stale = [
+                contest_id
+                for (contest_id, tester), ranking in cls._rankings.items()
+                if tester != is_tester and account_id in ranking.steps
+            ]
+        for contest_id in stale:
+            cls.invalidate(contest_id)
+
+    @classmethod
+    def invalidate(cls, contest_id=None):
+        with cls._lock:
+            if contest_id is None:
+                cls._rankings.clear()
+            else:
+                cls._rankings.pop((str(contest_id), False), None)
+                cls._rankings.pop((str(contest_id), True), None)
@@ -0,0 +1,203 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from home.models import (
+    Account,
+    AccountContestStats,
+    Contest,
+    DailyStats,
+    DailyWalk,
+    Device,
+    IntentionalWalk,
+    Leaderboard,
+    WeeklyGoal,
+)
+from home.models.contest import ContestCalendar
+from home.models.device import DeviceResolver
+from home.models.leaderboard import LeaderboardRanking
+from home.utils import dataversion
+
+
+@receiver(post_save, sender=Contest)
+@receiver(post_delete, sender=Contest)
+def invalidate_contest_calendar(sender, **kwargs):
+    ContestCalendar.invalidate()
+    LeaderboardRanking.invalidate()
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device(sender, instance, **kwargs):
+    DeviceResolver.invalidate(device_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Account)
+def invalidate_saved_account(sender, instance, created=False, **kwargs):
+    if not created:
+        # A new account has no devices to drop
+        DeviceResolver.invalidate(account_ids=[instance.pk])
+    # The account may have switched between tester and non-tester rankings
+    LeaderboardRanking.account_changed(instance.pk, instance.is_tester)
+
+
+@receiver(post_delete, sender=Account)
+def invalidate_deleted_account(sender, instance, **kwargs):
+    DeviceResolver.invalidate(account_ids=[instance.pk])
+    LeaderboardRanking.account_changed(instance.pk)
+
+
+@receiver(post_save, sender=IntentionalWalk)
+@receiver(post_delete, sender=IntentionalWalk)
+def invalidate_intentionalwalk_totals(sender, instance, **kwargs):
+    IntentionalWalk.invalidate_totals(instance.account_id)
+
+
+@receiver(post_save, sender=Leaderboard)
+@receiver(post_delete, sender=Leaderboard)
+def invalidate_leaderboard_ranking(sender, instance, **kwargs):
+    LeaderboardRanking.invalidate(instance.contest_id)
+
+
+# Daily walks saved through DailyWalk.ingest update the daily stats
+# themselves; these keep them in sync with every other change.
+
+
+@receiver(pre_save, sender=DailyWalk)
+def remember_dailywalk(sender, instance, **kwargs):
+    instance._previous = (
+        DailyWalk.objects.filter(pk=instance.pk)
+        .values_list("account_id", "date", "steps", "distance")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=DailyWalk)
+def update_saved_dailywalk_stats(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        account_id, walk_date, steps, distance = previous
+        DailyStats.add(account_id, [(walk_date, -steps, -distance, -1, 0)])
+    DailyStats.add(
+        instance.account_id,
+        [(instance.date, instance.steps, instance.distance, 1, 0)],
+    )
+
+
+@receiver(post_delete, sender=DailyWalk)
+def update_deleted_dailywalk_stats(sender, instance, **kwargs):
+    # When the account is being deleted its row is still there (walks are
+    # deleted first)
+    DailyStats.add(
+        instance.account_id,
+        [(instance.date, -instance.steps, -instance.distance, -1, 0)],
+    )
+
+
+@receiver(pre_save, sender=Account)
+def remember_account(sender, instance, **kwargs):
+    instance._was_tester = (
+        Account.objects.filter(pk=instance.pk)
+        .values_list("is_tester", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Account)
+def update_saved_account_stats(sender, instance, created, **kwargs):
+    signup_date = timezone.localdate(instance.created)
+    if created:
+        DailyStats.add(instance.pk, [(signup_date, 0, 0, 0, 1)])
+        return
+    was_tester = getattr(instance, "_was_tester", None)
+    if was_tester is not None and was_tester != instance.is_tester:
+        # Move the account's totals over to the other kind of accounts
+        DailyStats.refresh(
+            [signup_date]
+            + list(instance.dailywalk_set.values_list("date", flat=True))
+        )
+
+
+@receiver(pre_delete, sender=Account)
+def update_deleted_account_stats(sender, instance, **kwargs):
+    DailyStats.add(
+        instance.pk, [(timezone.localdate(instance.created), 0, 0, 0, -1)]
+    )
+
+
+# DailyWalk.ingest and IntentionalWalk.insert_batch refresh the accounts'
+# contest totals themselves; these keep them in sync with every other change.
+
+
+@receiver(post_save, sender=DailyWalk)
+@receiver(post_delete, sender=DailyWalk)
+def update_dailywalk_contest_stats(sender, instance, **kwargs):
+    AccountContestStats.walks_changed(instance.account_id, [instance.date])
+    previous = getattr(instance, "_previous", None)
+    if previous is not None and previous[:2] != (
+        instance.account_id,
+        instance.date,
+    ):
+        account_id, walk_date, _, _ = previous
+        AccountContestStats.walks_changed(account_id, [walk_date])
+
+
+@receiver(post_save, sender=IntentionalWalk)
+@receiver(post_delete, sender=IntentionalWalk)
+def update_intentionalwalk_contest_stats(sender, instance, **kwargs):
+    AccountContestStats.walks_changed(instance.account_id, [instance.start])
+
+
+@receiver(post_save, sender=Contest)
+def update_contest_stats(sender, instance, **kwargs):
+    # The contest's dates may have changed
+    AccountContestStats.refresh(contest_ids=[instance.pk])
+
+
+@receiver(m2m_changed, sender=Account.contests.through)
+def update_enrollment_contest_stats(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance is a contest, pk_set account ids
+        AccountContestStats.refresh(
+            account_ids=pk_set, contest_ids=[instance.pk]
+        )
+    else:
+        AccountContestStats.refresh(
+            account_ids=[instance.pk], contest_ids=pk_set
+        )
+
+
+# Writes through the ORM change the data version cached admin responses are
+# keyed on. DailyWalk.ingest and IntentionalWalk.insert_batch bump it
+# themselves.
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(m2m_changed, sender=Account.contests.through)
+@receiver(post_save, sender=Contest)
+@receiver(post_delete, sender=Contest)
+@receiver(post_save, sender=DailyWalk)
+@receiver(post_delete, sender=DailyWalk)
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=IntentionalWalk)
+@receiver(post_delete, sender=IntentionalWalk)
+@receiver(post_save, sender=Leaderboard)
+@receiver(post_delete, sender=Leaderboard)
+@receiver(post_save, sender=WeeklyGoal)
+@receiver(post_delete, sender=WeeklyGoal)
+def bump_data_version(sender, **kwargs):
+    dataversion.bump()
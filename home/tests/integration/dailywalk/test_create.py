@@ -1,6 +1,24 @@
-from django.test import Client, TestCase
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
-from home.models import Contest, Device
+from home.models import (
+    AccountContestStats,
+    Contest,
+    DailyStats,
+    DailyWalk,
+    DailyWalkBatch,
+    Device,
+    IntentionalWalk,
+    Leaderboard,
+)
+from home.utils import metrics
 
 
 class ApiTestCase(TestCase):
@@ -269,3 +287,435 @@ class ApiTestCase(TestCase):
                 self.bulk_request_params["daily_walks"][i]["distance"],
                 msg=fail_message,
             )
+
+    # Test that a bulk request writes all daily walks in a single statement,
+    # updating dates that were already recorded
+    def test_bulk_upsert_dailywalk(self):
+        # Record the first date ahead of time
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path=self.url,
+                data=self.bulk_request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "success", msg=fail_message)
+        self.assertEqual(
+            response_data["payload"]["daily_walks"],
+            self.bulk_request_params["daily_walks"],
+            msg=fail_message,
+        )
+
+        # Only one statement touches the daily walk table
+        dailywalk_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "home_dailywalk" in query["sql"]
+            and "pg_advisory_xact_lock" not in query["sql"]
+        ]
+        self.assertEqual(1, len(dailywalk_queries), msg=dailywalk_queries)
+
+        acct = Device.objects.get(device_id=self.device_id).account
+        self.assertEqual(
+            [
+                (str(dw.date), dw.steps, dw.distance)
+                for dw in DailyWalk.objects.filter(account=acct).order_by(
+                    "date"
+                )
+            ],
+            [
+                (dw["date"], dw["steps"], dw["distance"])
+                for dw in self.bulk_request_params["daily_walks"]
+            ],
+        )
+
+    # Test that resent days that haven't changed aren't rewritten
+    def test_resend_dailywalk_unchanged(self):
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        updated = dict(DailyWalk.objects.values_list("date", "updated"))
+
+        # Resend the history with one day changed
+        self.bulk_request_params["daily_walks"][1]["steps"] = 700
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(
+            response_data["payload"]["daily_walks"],
+            self.bulk_request_params["daily_walks"],
+            msg=fail_message,
+        )
+
+        # Only the changed day was written
+        changed = [
+            str(walk_date)
+            for walk_date, timestamp in DailyWalk.objects.values_list(
+                "date", "updated"
+            )
+            if timestamp != updated[walk_date]
+        ]
+        self.assertEqual(changed, ["3000-02-22"])
+        self.assertEqual(
+            metrics.snapshot("dailywalk."),
+            {"dailywalk.sent": 6, "dailywalk.changed": 4},
+        )
+
+    # Test that an invalid entry rejects the whole batch
+    def test_bulk_create_dailywalk_invalid_entry(self):
+        self.bulk_request_params["daily_walks"][2]["date"] = "3000-02-30"
+
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "error", msg=fail_message)
+        self.assertEqual(
+            response_data["message"],
+            "Invalid date '3000-02-30' in the request",
+            msg=fail_message,
+        )
+        self.assertFalse(DailyWalk.objects.exists())
+
+    # Test queueing daily walks for the ingest worker
+    @override_settings(DAILYWALK_ASYNC_INGEST=True)
+    def test_queue_dailywalk(self):
+        contest = Contest()
+        contest.start_baseline = "3000-01-01"
+        contest.start_promo = "3000-02-01"
+        contest.start = "3000-02-01"
+        contest.end = "3000-02-28"
+        contest.save()
+
+        with freeze_time("3000-02-23"):
+            response = self.client.post(
+                path=self.url,
+                data=self.bulk_request_params,
+                content_type=self.content_type,
+            )
+            self.assertEqual(response.status_code, 202)
+            response_data = response.json()
+            fail_message = f"Server response - {response_data}"
+            self.assertEqual(
+                response_data["status"], "success", msg=fail_message
+            )
+            self.assertEqual(
+                response_data["message"],
+                "Dailywalks queued successfully",
+                msg=fail_message,
+            )
+            self.assertEqual(len(response_data["payload"]["daily_walks"]), 3)
+
+            # A later sync overwrites a queued date
+            response = self.client.post(
+                path=self.url,
+                data=self.request_params,
+                content_type=self.content_type,
+            )
+            self.assertEqual(response.status_code, 202)
+
+            # Nothing is saved until the worker runs
+            self.assertFalse(DailyWalk.objects.exists())
+            self.assertEqual(DailyWalkBatch.objects.count(), 2)
+
+            out = StringIO()
+            call_command("ingest_worker", "--once", stdout=out)
+            self.assertIn("Batches saved: 2", out.getvalue())
+
+        self.assertFalse(DailyWalkBatch.objects.exists())
+        self.assertEqual(DailyWalkBatch.lag(), 0)
+        steps = dict(DailyWalk.objects.values_list("date", "steps"))
+        self.assertEqual(sorted(steps.values()), [500, 1000, 1500])
+        account = Device.objects.get(device_id=self.device_id).account
+        self.assertEqual(
+            list(account.contests.values_list("pk", flat=True)),
+            [str(contest.pk)],
+        )
+        leaderboard = Leaderboard.objects.get(account=account)
+        self.assertEqual(leaderboard.steps, 3000)
+
+    # Test that numbers sent as strings or floats are still accepted
+    def test_create_dailywalk_coerced_numbers(self):
+        self.bulk_request_params["daily_walks"][0]["steps"] = "1500"
+        self.bulk_request_params["daily_walks"][1]["steps"] = 500.0
+        self.bulk_request_params["daily_walks"][2]["distance"] = "1.4"
+
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "success", msg=fail_message)
+        self.assertEqual(
+            [
+                (walk["steps"], walk["distance"])
+                for walk in response_data["payload"]["daily_walks"]
+            ],
+            [(1500, 2.1), (500, 0.8), (1000, 1.4)],
+        )
+
+    # Test that bad values are rejected rather than queued
+    @override_settings(DAILYWALK_ASYNC_INGEST=True)
+    def test_queue_dailywalk_invalid_entry(self):
+        self.bulk_request_params["daily_walks"][1]["steps"] = "many"
+
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "error", msg=fail_message)
+        self.assertEqual(
+            response_data["message"],
+            "Invalid steps or distance for '3000-02-22' in the request",
+            msg=fail_message,
+        )
+        self.assertFalse(DailyWalkBatch.objects.exists())
+
+    # Test that workers claim the oldest accounts nobody holds, and give
+    # up on batches that keep failing
+    @override_settings(INGEST_MAX_ATTEMPTS=2)
+    def test_ingest_worker_claims(self):
+        def advisory_locks():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT COUNT(*) FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid()
+                    """
+                )
+                return cursor.fetchone()[0]
+
+        account = Device.objects.get(device_id=self.device_id).account
+        bad = DailyWalkBatch.enqueue(
+            account.id, self.device_id, [(date(3000, 2, 22), "many", 1.0)]
+        )
+        self.client.post(
+            path="/api/appuser/create",
+            data={
+                "name": "Other",
+                "email": "other@blah.com",
+                "zip": "72185",
+                "age": 99,
+                "account_id": "67890",
+            },
+            content_type="application/json",
+        )
+        other = Device.objects.get(device_id="67890").account
+        DailyWalkBatch.enqueue(
+            other.id, "67890", [(date(3000, 2, 22), 500, 1.0)]
+        )
+
+        # Only the account claimed is locked
+        self.assertEqual(DailyWalkBatch.flush(1), (1, 0))
+        self.assertEqual(advisory_locks(), 1)
+        self.assertEqual(DailyWalkBatch.flush(2), (2, 1))
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertIn("invalid input syntax", bad.error)
+
+        # A dead batch no longer holds up the queue
+        self.assertEqual(DailyWalkBatch.flush(1), (0, 0))
+        self.assertEqual(DailyWalkBatch.lag(), 0)
+        self.assertEqual(list(DailyWalkBatch.dead()), [bad])
+        self.assertTrue(DailyWalk.objects.filter(account=other).exists())
+
+    def test_dailywalk_updates_dailystats(self):
+        def stats():
+            DailyStats.fold()
+            return list(
+                DailyStats.objects.filter(active_accounts__gt=0)
+                .order_by("date", "is_tester")
+                .values_list("date", "is_tester", "steps", "active_accounts")
+            )
+
+        # Syncs append their changes, without writing the days' rows
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path=self.url,
+                data=self.request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            self.assertNotRegex(
+                query["sql"], r"(INSERT INTO|UPDATE) home_dailystats\b"
+            )
+        self.assertEqual(DailyStats.totals(False)["steps"], 500)
+        out = StringIO()
+        call_command("fold_dailystats", stdout=out)
+        # The signup and the walk
+        self.assertIn("Daily stats changes folded: 2", out.getvalue())
+        self.assertEqual(DailyStats.totals(False)["steps"], 500)
+        # Resend the first date with new values, along with two new dates
+        response = self.client.post(
+            path=self.url,
+            data=self.bulk_request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(str(row[0]), *row[1:]) for row in stats()],
+            [
+                ("3000-02-21", False, 1500, 1),
+                ("3000-02-22", False, 500, 1),
+                ("3000-02-23", False, 1000, 1),
+            ],
+        )
+        distance = DailyStats.objects.get(date="3000-02-22").distance
+        self.assertAlmostEqual(distance, 0.8)
+
+        # Turning the account into a tester moves its totals over
+        account = Device.objects.get(device_id=self.device_id).account
+        account.is_tester = True
+        account.save()
+        self.assertEqual(
+            [row[1] for row in stats()],
+            [True, True, True],
+        )
+
+        # The rollup matches a rebuild from scratch
+        incremental = stats()
+        out = StringIO()
+        call_command("rebuild_dailystats", stdout=out)
+        self.assertEqual(stats(), incremental)
+        self.assertEqual(
+            DailyStats.objects.filter(is_tester=True).aggregate(
+                signups=Sum("signups")
+            )["signups"],
+            1,
+        )
+
+        # Deleting the account removes its walks and signup
+        account.delete()
+        self.assertEqual(stats(), [])
+        self.assertFalse(DailyStats.objects.filter(signups__gt=0).exists())
+
+    def test_dailywalk_updates_contest_stats(self):
+        contest = Contest.objects.create(
+            start_baseline="3000-02-01",
+            start_promo="3000-02-20",
+            start="3000-02-22",
+            end="3000-02-28",
+        )
+        account = Device.objects.get(device_id=self.device_id).account
+
+        def stats():
+            return list(
+                AccountContestStats.objects.filter(
+                    account=account, contest=contest
+                ).values_list(
+                    "dw_contest_count",
+                    "dw_contest_steps",
+                    "dw_baseline_count",
+                    "dw_baseline_steps",
+                    "iw_contest_count",
+                    "iw_contest_steps",
+                    "iw_contest_time",
+                )
+            )
+
+        # Not enrolled yet, no totals
+        with freeze_time("3000-02-10"):
+            response = self.client.post(
+                path=self.url,
+                data=self.request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats(), [])
+
+        # Enrolling counts the walks sent before, as well as the new ones
+        with freeze_time("3000-02-23"):
+            response = self.client.post(
+                path=self.url,
+                data=self.bulk_request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats(), [(2, 1500, 1, 1500, 0, 0, 0.0)])
+
+        # Resending the same walks leaves the totals alone
+        with freeze_time("3000-02-23"):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    path=self.url,
+                    data=self.bulk_request_params,
+                    content_type=self.content_type,
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                q["sql"]
+                for q in queries
+                if "home_accountconteststats" in q["sql"]
+            ],
+            [],
+        )
+
+        start = datetime(3000, 2, 24, 10, tzinfo=dt_timezone.utc)
+        IntentionalWalk.insert_batch(
+            account.id,
+            self.device_id,
+            [
+                {
+                    "event_id": "walk1",
+                    "start": start,
+                    "end": start + timedelta(minutes=30),
+                    "steps": 3000,
+                    "distance": 2.0,
+                    "pause_time": 300,
+                }
+            ],
+        )
+        self.assertEqual(stats(), [(2, 1500, 1, 1500, 1, 3000, 1500.0)])
+
+        # Saving a walk through the ORM and moving the contest update them
+        walk = DailyWalk.objects.get(account=account, date="3000-02-21")
+        walk.date = "3000-02-24"
+        walk.save()
+        self.assertEqual(stats(), [(3, 3000, 0, 0, 1, 3000, 1500.0)])
+        contest.end = "3000-02-23"
+        contest.save()
+        self.assertEqual(stats(), [(2, 1500, 0, 0, 0, 0, 0.0)])
+
+        # The totals match a rebuild from scratch
+        incremental = stats()
+        out = StringIO()
+        call_command("rebuild_contest_stats", stdout=out)
+        self.assertEqual(stats(), incremental)
+        # (with nothing to rewrite)
+        self.assertIn("rows written: 0", out.getvalue())
+
+        # Leaving the contest drops them
+        account.contests.remove(contest)
+        self.assertEqual(stats(), [])
+        account.contests.add(contest)
+        self.assertEqual(stats(), [(2, 1500, 0, 0, 0, 0, 0.0)])
+        account.delete()
+        self.assertFalse(AccountContestStats.objects.exists())
@@ -1,4 +1,5 @@
 from django.test import Client, TestCase
+from freezegun import freeze_time
 
 
 class ApiTestCase(TestCase):
@@ -315,3 +316,106 @@ class ApiTestCase(TestCase):
             ),
             msg=fail_message,
         )
+
+    # Check that only the requested days are returned, with full totals
+    def test_dailywalk_get_filtered(self):
+        response = self.client.post(
+            path=self.url,
+            data={"start_date": "2020-02-22", **self.request_params},
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(
+            [dw["date"] for dw in response_data["daily_walks"]],
+            ["2020-02-23", "2020-02-22"],
+            msg=fail_message,
+        )
+        self.assertEqual(response_data["total_steps"], 3000)
+
+        response = self.client.post(
+            path=self.url,
+            data={
+                "start_date": "2020-02-21",
+                "end_date": "2020-02-21",
+                **self.request_params,
+            },
+            content_type=self.content_type,
+        )
+        self.assertEqual(
+            [dw["date"] for dw in response.json()["daily_walks"]],
+            ["2020-02-21"],
+        )
+
+        # Only the days changed since the last response
+        with freeze_time("3000-01-01"):
+            self.client.post(
+                path="/api/dailywalk/create",
+                data={
+                    "account_id": "12345",
+                    "daily_walks": [
+                        {"date": "2020-02-22", "steps": 700, "distance": 1},
+                    ],
+                },
+                content_type=self.content_type,
+            )
+        response = self.client.post(
+            path=self.url,
+            data={"since": response_data["updated"], **self.request_params},
+            content_type=self.content_type,
+        )
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(
+            response_data["daily_walks"],
+            [{"date": "2020-02-22", "steps": 700, "distance": 1.0}],
+            msg=fail_message,
+        )
+        self.assertEqual(response_data["total_steps"], 3200)
+
+        response = self.client.post(
+            path=self.url,
+            data={"since": "yesterday", **self.request_params},
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.json()["status"], "error")
+
+    # Check that an unchanged history is answered with 304 Not Modified
+    def test_dailywalk_get_not_modified(self):
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # A new day changes the ETag
+        self.client.post(
+            path="/api/dailywalk/create",
+            data={
+                "account_id": "12345",
+                "daily_walks": [
+                    {"date": "2020-02-24", "steps": 100, "distance": 0.1},
+                ],
+            },
+            content_type=self.content_type,
+        )
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
@@ -1,4 +1,7 @@
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from home.models import IntentionalWalk
 
 
 class ApiTestCase(TestCase):
@@ -152,3 +155,120 @@ class ApiTestCase(TestCase):
             "Required input 'steps' missing in the request",
             msg=fail_message,
         )
+
+    # Test that walks already recorded are skipped, and reported as such
+    def test_create_intentionalwalk_existing(self):
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.request_params["intentional_walks"].append(
+            {
+                "event_id": "9999",
+                "start": "2020-02-22T12:15:00-05:00",
+                "end": "2020-02-22T12:45:00-05:00",
+                "steps": 1000,
+                "distance": 0.7,
+                "pause_time": 100,
+            }
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path=self.url,
+                data=self.request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "success", msg=fail_message)
+        self.assertEqual(
+            [
+                walk["event_id"]
+                for walk in response_data["payload"]["intentional_walks"]
+            ],
+            ["9999"],
+            msg=fail_message,
+        )
+        self.assertEqual(
+            response_data["payload"]["existing_event_ids"],
+            ["8888"],
+            msg=fail_message,
+        )
+
+        # One lookup and one insert
+        walk_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "home_intentionalwalk" in query["sql"]
+        ]
+        self.assertEqual(2, len(walk_queries), msg=walk_queries)
+
+        # Walk time is the time between start and end, less pauses
+        walk = IntentionalWalk.objects.get(event_id="9999")
+        self.assertEqual(walk.walk_time, 1700)
+        self.assertEqual(IntentionalWalk.objects.count(), 2)
+
+    # Test that an invalid timestamp rejects the whole batch
+    def test_create_intentionalwalk_invalid_start(self):
+        self.request_params["intentional_walks"][0]["start"] = "yesterday"
+
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.status_code, 200)
+        response_data = response.json()
+        fail_message = f"Server response - {response_data}"
+        self.assertEqual(response_data["status"], "error", msg=fail_message)
+        self.assertEqual(
+            response_data["message"],
+            "Invalid start 'yesterday' in the request",
+            msg=fail_message,
+        )
+        self.assertFalse(IntentionalWalk.objects.exists())
+
+    # Test that a bad number rejects the whole batch instead of failing it
+    def test_create_intentionalwalk_invalid_numbers(self):
+        for field, value in [
+            ("pause_time", "long"),
+            ("steps", "many"),
+            ("distance", None),
+        ]:
+            with self.subTest(field=field):
+                walk = dict(self.request_params["intentional_walks"][0])
+                walk[field] = value
+                response = self.client.post(
+                    path=self.url,
+                    data={"account_id": "12345", "intentional_walks": [walk]},
+                    content_type=self.content_type,
+                )
+                self.assertEqual(response.status_code, 200)
+                response_data = response.json()
+                fail_message = f"Server response - {response_data}"
+                self.assertEqual(
+                    response_data["status"], "error", msg=fail_message
+                )
+                self.assertEqual(
+                    response_data["message"],
+                    "Invalid steps, distance or pause_time for '8888'"
+                    " in the request",
+                    msg=fail_message,
+                )
+        self.assertFalse(IntentionalWalk.objects.exists())
+
+        # Numbers sent as strings are still accepted
+        walk = self.request_params["intentional_walks"][0]
+        walk.update(steps="500", distance="1.3", pause_time="456")
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.json()["status"], "success")
+        walk = IntentionalWalk.objects.get(event_id="8888")
+        self.assertEqual((walk.steps, walk.walk_time), (500, 1344))
@@ -1,5 +1,7 @@
 from dateutil import parser
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 
 class ApiTestCase(TestCase):
@@ -447,3 +449,94 @@ class ApiTestCase(TestCase):
             ],
             msg=fail_message,
         )
+
+    # Check that walks can be fetched a page at a time, newest first
+    def test_intentionalwalk_get_paginated(self):
+        event_ids = []
+        cursor = None
+        for _ in range(3):
+            response = self.client.post(
+                path=self.url,
+                data={"limit": 2, "cursor": cursor, **self.request_params},
+                content_type=self.content_type,
+            )
+            self.assertEqual(response.status_code, 200)
+            response_data = response.json()
+            fail_message = f"Server response - {response_data}"
+            self.assertEqual(
+                response_data["status"], "success", msg=fail_message
+            )
+            # Totals always cover all the walks
+            self.assertEqual(response_data["total_steps"], 3000)
+            event_ids.append(
+                [
+                    walk["event_id"]
+                    for walk in response_data["intentional_walks"]
+                ]
+            )
+            cursor = response_data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(event_ids, [["3333", "2222"], ["1111"]])
+
+        for params, message in [
+            ({"limit": 0}, "limit must be between 1 and 1000"),
+            ({"cursor": "garbage"}, "Invalid cursor"),
+        ]:
+            response = self.client.post(
+                path=self.url,
+                data={**params, **self.request_params},
+                content_type=self.content_type,
+            )
+            self.assertEqual(
+                response.json(), {"status": "error", "message": message}
+            )
+
+    # Check that cached totals are refreshed by a new walk
+    @override_settings(INTENTIONALWALK_TOTALS_TTL=60)
+    def test_intentionalwalk_get_cached_totals(self):
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.json()["total_steps"], 3000)
+
+        # Only the page of walks is queried
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path=self.url,
+                data=self.request_params,
+                content_type=self.content_type,
+            )
+        self.assertEqual(response.json()["total_steps"], 3000)
+        walk_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "home_intentionalwalk" in query["sql"]
+        ]
+        self.assertEqual(1, len(walk_queries), msg=walk_queries)
+
+        self.client.post(
+            path="/api/intentionalwalk/create",
+            data={
+                "account_id": "12345",
+                "intentional_walks": [
+                    {
+                        "event_id": "4444",
+                        "start": "2020-02-23T13:15:00-05:00",
+                        "end": "2020-02-23T13:45:00-05:00",
+                        "steps": 200,
+                        "distance": 0.1,
+                        "pause_time": 0,
+                    },
+                ],
+            },
+            content_type=self.content_type,
+        )
+        response = self.client.post(
+            path=self.url,
+            data=self.request_params,
+            content_type=self.content_type,
+        )
+        self.assertEqual(response.json()["total_steps"], 3200)
@@ -1,12 +1,33 @@
 import logging
+import re
+from datetime import timedelta
+from io import StringIO
 from random import seed
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from home.models import Account, Contest, DailyWalk, Device, IntentionalWalk
+from home.utils import metrics
+from home.views.api.utils import encode_cursor
 
 from .utils import Login, generate_test_data
 
 logger = logging.getLogger(__name__)
 
 
+def parse_links(response):
+    # {rel: url} of a response's Link header
+    return {
+        rel: url
+        for url, rel in re.findall(
+            r'<([^>]+)>; rel="([^"]+)"', response.get("Link", "")
+        )
+    }
+
+
 class TestAdminViews(TestCase):
     contest0_id = None
 
@@ -61,7 +82,19 @@ class TestAdminViews(TestCase):
             [
                 ["Date", "Count"],
                 ["3000-02-28T00:00:00", 0],
+                ["3000-03-01T00:00:00", 0],
                 ["3000-03-02T00:00:00", 3],
+                ["3000-03-03T00:00:00", 0],
+                ["3000-03-04T00:00:00", 0],
+                ["3000-03-05T00:00:00", 0],
+                ["3000-03-06T00:00:00", 0],
+                ["3000-03-07T00:00:00", 0],
+                ["3000-03-08T00:00:00", 0],
+                ["3000-03-09T00:00:00", 0],
+                ["3000-03-10T00:00:00", 0],
+                ["3000-03-11T00:00:00", 0],
+                ["3000-03-12T00:00:00", 0],
+                ["3000-03-13T00:00:00", 0],
                 ["3000-03-14T00:00:00", 0],
             ],
         )
@@ -78,7 +111,19 @@ class TestAdminViews(TestCase):
             [
                 ["Date", "Count"],
                 ["3000-02-28T00:00:00", 0],
+                ["3000-03-01T00:00:00", 0],
                 ["3000-03-02T00:00:00", 3],
+                ["3000-03-03T00:00:00", 3],
+                ["3000-03-04T00:00:00", 3],
+                ["3000-03-05T00:00:00", 3],
+                ["3000-03-06T00:00:00", 3],
+                ["3000-03-07T00:00:00", 3],
+                ["3000-03-08T00:00:00", 3],
+                ["3000-03-09T00:00:00", 3],
+                ["3000-03-10T00:00:00", 3],
+                ["3000-03-11T00:00:00", 3],
+                ["3000-03-12T00:00:00", 3],
+                ["3000-03-13T00:00:00", 3],
                 ["3000-03-14T00:00:00", 3],
             ],
         )
@@ -112,6 +157,30 @@ class TestAdminViews(TestCase):
             ],
         )
 
+    def test_get_home_steps_weekly(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        response = c.get(
+            "/api/admin/home/steps/daily"
+            f"?contest_id={self.contest0_id}&granularity=week"
+        )
+        data = response.json()
+        # Weeks start on Mondays, the contest starts on Friday 3000-02-28
+        self.assertEqual(
+            data,
+            [
+                ["Date", "Count"],
+                ["3000-02-24T00:00:00", 75000],
+                ["3000-03-03T00:00:00", 175000],
+                ["3000-03-10T00:00:00", 100000],
+            ],
+        )
+        response = c.get(
+            "/api/admin/home/steps/daily"
+            f"?contest_id={self.contest0_id}&granularity=year"
+        )
+        self.assertEqual(response.status_code, 422)
+
     def test_get_home_steps_cumulative(self):
         c = Client()
         self.assertTrue(Login.login(c))
@@ -199,6 +268,77 @@ class TestAdminViews(TestCase):
             ],
         )
 
+    def test_get_home_series(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(
+                f"/api/admin/home/series?contest_id={self.contest0_id}"
+            )
+        data = response.json()
+        # All the charts come from one query
+        self.assertEqual(
+            len(
+                [
+                    query
+                    for query in queries.captured_queries
+                    if "home_dailystats" in query["sql"]
+                ]
+            ),
+            1,
+        )
+        # ...with the same data as their own endpoints
+        for value in ["users", "steps", "distance"]:
+            for interval in ["daily", "cumulative"]:
+                chart = c.get(
+                    f"/api/admin/home/{value}/{interval}"
+                    f"?contest_id={self.contest0_id}"
+                ).json()
+                self.assertEqual(data[f"{value}_{interval}"], chart)
+
+    def test_get_home_charts_from_dailystats(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        urls = [
+            "/api/admin/home",
+            f"/api/admin/home/users/daily?contest_id={self.contest0_id}",
+            f"/api/admin/home/steps/cumulative?contest_id={self.contest0_id}",
+        ]
+        before = [c.get(url).json() for url in urls]
+        # The charts don't re-aggregate the daily walks and accounts...
+        with CaptureQueriesContext(connection) as queries:
+            for url in urls:
+                c.get(url)
+        for query in queries.captured_queries:
+            self.assertNotIn("home_dailywalk", query["sql"])
+        # ...and show the same totals after a rebuild from scratch
+        call_command("rebuild_dailystats", stdout=StringIO())
+        self.assertEqual([c.get(url).json() for url in urls], before)
+
+    def test_get_home_cached(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        url = "/api/admin/home"
+        data = c.get(url).json()
+
+        # Served from the cache, also when blank parameters are added
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(c.get(f"{url}?is_tester=").json(), data)
+        for query in queries.captured_queries:
+            self.assertNotIn("home_dailystats", query["sql"])
+        self.assertEqual(
+            metrics.snapshot("response_cache."),
+            {"response_cache.hits": 1, "response_cache.misses": 1},
+        )
+
+        # Any write changes the data version, and the next request sees it
+        walk = DailyWalk.objects.filter(
+            date="3000-03-01", account__is_tester=False
+        ).first()
+        walk.steps += 1
+        walk.save()
+        self.assertEqual(c.get(url).json()["accounts_steps"], 350001)
+
     def test_get_contests(self):
         c = Client()
         self.assertTrue(Login.login(c))
@@ -272,6 +412,145 @@ class TestAdminViews(TestCase):
         data = response.json()
         self.assertEqual(ages, [user["age"] for user in data[::-1]])
 
+    def test_get_users_stats(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        # the stats of both kinds of walks come from the contest stats
+        # table, without reading the walks
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(
+                f"/api/admin/users?contest_id={self.contest0_id}"
+                "&order_by=-iw_steps"
+            )
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            self.assertNotIn("home_dailywalk", query["sql"])
+            self.assertNotIn("home_intentionalwalk", query["sql"])
+        self.assertTrue(
+            any("home_accountconteststats" in q["sql"] for q in queries)
+        )
+
+        data = response.json()
+        contest = Contest.objects.get(pk=self.contest0_id)
+        for user in data:
+            walks = IntentionalWalk.objects.filter(
+                account_id=user["id"],
+                start__gte=contest.start,
+                start__lt=contest.end + timedelta(days=1),
+            )
+            self.assertEqual(user["iw_count"], walks.count())
+            self.assertEqual(
+                user["iw_steps"], walks.aggregate(Sum("steps"))["steps__sum"]
+            )
+            self.assertEqual(
+                user["is_active"], user["dw_count"] + user["iw_count"] > 0
+            )
+        steps = [user["iw_steps"] for user in data]
+        self.assertIsNotNone(steps[0])
+        self.assertEqual(
+            steps,
+            sorted(s for s in steps if s is not None)[::-1]
+            + [s for s in steps if s is None],
+        )
+
+    def test_get_users_keyset(self):
+        # 40 more accounts, for two pages, some with the same name and
+        # some with steps
+        accounts = Account.objects.bulk_create(
+            Account(
+                email=f"extra{i}@example.com",
+                name=f"Extra {i % 7}",
+                zip="94103",
+                age=20 + i % 3,
+            )
+            for i in range(40)
+        )
+        for i, account in enumerate(accounts[:10]):
+            DailyWalk.objects.create(
+                device=Device.objects.create(
+                    device_id=f"extra{i}", account=account
+                ),
+                date="3000-03-02",
+                steps=i % 4 * 1000,
+                distance=1,
+            )
+
+        c = Client()
+        self.assertTrue(Login.login(c))
+        for order_by in ["", "age", "-age", "-dw_steps", "dw_steps"]:
+            offset_ids = []
+            for page in (1, 2):
+                response = c.get(
+                    f"/api/admin/users?order_by={order_by}&page={page}"
+                )
+                offset_ids += [user["id"] for user in response.json()]
+            self.assertEqual(len(offset_ids), 45)
+
+            # follow the "next" links from the first page
+            response = c.get(f"/api/admin/users?order_by={order_by}")
+            self.assertEqual(response["X-Total-Count"], "45")
+            links = parse_links(response)
+            self.assertEqual(set(links), {"next"})
+            self.assertIn("cursor=", links["next"])
+            self.assertIn("page=2", links["next"])
+            keyset_ids = [user["id"] for user in response.json()]
+            response = c.get(links["next"])
+            keyset_ids += [user["id"] for user in response.json()]
+            self.assertEqual(keyset_ids, offset_ids, order_by)
+            links = parse_links(response)
+            self.assertEqual(set(links), {"prev"})
+            self.assertNotIn("cursor=", links["prev"])
+
+        # estimated from table statistics once the table is big enough
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE home_account")
+        with override_settings(ACCOUNT_COUNT_ESTIMATE_MIN=1):
+            with CaptureQueriesContext(connection) as queries:
+                response = c.get("/api/admin/users")
+            self.assertEqual(response["X-Total-Count"], "45")
+            self.assertFalse(
+                any("__count" in query["sql"] for query in queries)
+            )
+            # but not when filtered by more than is_tester
+            with CaptureQueriesContext(connection) as queries:
+                response = c.get("/api/admin/users?query=Extra 1")
+            self.assertEqual(response["X-Total-Count"], "6")
+            self.assertTrue(
+                any("__count" in query["sql"] for query in queries)
+            )
+
+        # the count can be skipped
+        response = c.get("/api/admin/users?count=none")
+        self.assertNotIn("X-Total-Count", response)
+        self.assertEqual(len(response.json()), 25)
+
+        response = c.get("/api/admin/users?cursor=nonsense")
+        self.assertEqual(response.status_code, 422)
+        response = c.get(f"/api/admin/users?cursor={encode_cursor(['a'])}")
+        self.assertEqual(response.status_code, 422)
+
+    def test_get_users_search_ranked(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+        response = c.get("/api/admin/users?query=user 2&search=ranked")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # the prefix match comes first
+        self.assertEqual(data[0]["name"], "User 2")
+
+        # matches emails as well, case insensitively
+        email = Account.objects.get(name="User 3").email
+        response = c.get(
+            f"/api/admin/users?query={email[:5].upper()}&search=ranked"
+        )
+        self.assertIn("User 3", [user["name"] for user in response.json()])
+
+        response = c.get("/api/admin/users?query=zzzzzz&search=ranked")
+        self.assertEqual(response.json(), [])
+
+        response = c.get("/api/admin/users?query=user&search=fuzzy")
+        self.assertEqual(response.status_code, 422)
+
     def test_get_users_by_zip(self):
         c = Client()
         self.assertTrue(Login.login(c))
@@ -288,8 +567,13 @@ class TestAdminViews(TestCase):
     def test_get_users_active_by_zip(self):
         c = Client()
         self.assertTrue(Login.login(c))
-        response = c.get(
-            f"/api/admin/users/zip/active?contest_id={self.contest0_id}"
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(
+                f"/api/admin/users/zip/active?contest_id={self.contest0_id}"
+            )
+        # totals and new accounts come from the same query
+        self.assertEqual(
+            len([q for q in queries if "home_dailywalk" in q["sql"]]), 1
         )
         data = response.json()
         self.assertEqual(
@@ -1,11 +1,23 @@
 import csv
+import gzip
 import io
 import logging
+import tempfile
 
 from datetime import date, timedelta
 
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 
+from home.models import ExportJob
+from home.utils import dataversion
 from home.views.api.export import CSV_COLUMNS
 from .utils import Login, generate_test_data
 
@@ -50,6 +62,11 @@ class TestExportViews(TestCase):
             rows[0]["Total Recorded Steps During Contest"], "4000"
         )
 
+        # steps of every day, empty without a daily walk
+        self.assertEqual(rows[0]["3000-02-28"], "10000")
+        self.assertEqual(rows[0]["3000-03-13"], "10000")
+        self.assertEqual(rows[0]["3000-03-14"], "")
+
         self.assertEqual(rows[1]["Participant Name"], "User 3")
         self.assertEqual(rows[1]["Is New Signup"], "True")
         self.assertEqual(rows[1]["Active During Contest"], "True")
@@ -75,3 +92,172 @@ class TestExportViews(TestCase):
         self.assertEqual(rows[3]["Total Steps During Contest"], "")
         self.assertEqual(rows[3]["Total Recorded Walks During Contest"], "0")
         self.assertEqual(rows[3]["Total Recorded Steps During Contest"], "")
+        self.assertEqual(rows[3]["3000-03-01"], "")
+
+    def test_export_users_gzip(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+
+        url = f"/api/export/users?contest_id={self.contest0_id}"
+        plain = c.get(url)
+        self.assertTrue(plain.streaming)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        # the header comes first, on its own
+        chunks = iter(plain.streaming_content)
+        self.assertEqual(next(chunks).decode("utf-8").count("\n"), 1)
+
+        response = c.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertEqual(
+            'attachment; filename="users_agg.csv"',
+            response["Content-Disposition"],
+        )
+        self.assertEqual(
+            gzip.decompress(response.getvalue()),
+            c.get(url).getvalue(),
+        )
+
+    def test_export_users_batches(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+
+        url = f"/api/export/users?contest_id={self.contest0_id}"
+        content = c.get(url).getvalue()
+        # the 4 accounts in batches of 3, through one cursor, with their
+        # days of steps pivoted in the same query
+        with override_settings(EXPORT_BATCH_SIZE=3):
+            response = c.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b"".join(chunks), content)
+        self.assertEqual(
+            len([q for q in queries if "home_account" in q["sql"]]), 1
+        )
+        for query in queries:
+            self.assertNotIn("OFFSET", query["sql"])
+
+    def test_export_users_background(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+
+        url = f"/api/export/users?contest_id={self.contest0_id}"
+        content = c.get(url).getvalue()
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        with override_settings(EXPORT_ROOT=export_root.name):
+            # the export is queued once, until the worker runs it
+            response = c.get(f"{url}&background=true")
+            self.assertEqual(202, response.status_code)
+            job = response.json()
+            self.assertEqual(job["status"], "queued")
+            self.assertEqual(job["rows_done"], 0)
+            self.assertNotIn("url", job)
+            response = c.get(f"{url}&background=true")
+            self.assertEqual(202, response.status_code)
+            self.assertEqual(response.json()["id"], job["id"])
+
+            status_url = f"/api/export/jobs/{job['id']}"
+            self.assertEqual(c.get(status_url).json()["status"], "queued")
+            self.assertEqual(404, c.get(f"{status_url}/download").status_code)
+
+            out = io.StringIO()
+            call_command("run_export_jobs", "--once", stdout=out)
+            self.assertIn("Jobs done: 1, failed: 0", out.getvalue())
+
+            status = c.get(status_url).json()
+            self.assertEqual(status["status"], "done")
+            self.assertEqual(status["rows_done"], 4)
+            self.assertEqual(status["rows_total"], 4)
+            self.assertEqual(status["url"], f"{status_url}/download")
+
+            # the artifact is served as is to clients accepting gzip
+            response = c.get(status["url"], HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual("gzip", response["Content-Encoding"])
+            self.assertEqual(gzip.decompress(response.getvalue()), content)
+            response = c.get(status["url"])
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertEqual(response.getvalue(), content)
+
+            # and for the unchanged contest, rather than querying it again
+            with CaptureQueriesContext(connection) as queries:
+                response = c.get(url, HTTP_ACCEPT_ENCODING="gzip")
+                self.assertEqual(gzip.decompress(response.getvalue()), content)
+            self.assertEqual(
+                [q for q in queries if "home_account" in q["sql"]], []
+            )
+            response = c.get(f"{url}&background=true")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(response.json(), status)
+
+            # a write queues a new export, which supersedes the old one
+            dataversion.bump()
+            response = c.get(f"{url}&background=true")
+            self.assertEqual(202, response.status_code)
+            self.assertNotEqual(response.json()["id"], job["id"])
+            self.assertFalse(c.get(url).has_header("Content-Encoding"))
+            call_command("run_export_jobs", "--once", stdout=io.StringIO())
+            self.assertEqual(
+                list(ExportJob.objects.values_list("status", flat=True)),
+                ["done"],
+            )
+            self.assertEqual(404, c.get(status_url).status_code)
+
+    def test_export_job_auth(self):
+        c = Client()
+        self.assertEqual(401, c.get("/api/export/jobs/1").status_code)
+        self.assertEqual(401, c.get("/api/export/jobs/1/download").status_code)
+        self.assertTrue(Login.login(c))
+        self.assertEqual(404, c.get("/api/export/jobs/1").status_code)
+
+
+class TestExportCommittedViews(TransactionTestCase):
+    # Data is committed rather than set up in the test's transaction, as
+    # exports are streamed after the request's transaction, and worker
+    # processes read it through their own connections
+    def setUp(self):
+        with transaction.atomic():
+            self.contest0_id = generate_test_data()
+
+    def test_export_users_cursor(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+
+        url = f"/api/export/users?contest_id={self.contest0_id}"
+        with override_settings(EXPORT_BATCH_SIZE=3):
+            response = c.get(url)
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            next(chunks)
+            # the accounts are streamed from a cursor in the export's own
+            # transaction, not one held (and built in full) past it
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT is_holdable FROM pg_cursors")
+                self.assertEqual(cursor.fetchall(), [(False,)])
+            self.assertEqual(len(list(chunks)), 1)
+
+    def test_export_users_workers(self):
+        c = Client()
+        self.assertTrue(Login.login(c))
+
+        url = f"/api/export/users?contest_id={self.contest0_id}"
+        content = c.get(url).getvalue()
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        # the 4 accounts in shards of 1, merged back in order
+        with override_settings(
+            EXPORT_ROOT=export_root.name, EXPORT_BATCH_SIZE=1
+        ):
+            job = c.get(f"{url}&background=true").json()
+            out = io.StringIO()
+            call_command(
+                "run_export_jobs", "--once", "--workers", "2", stdout=out
+            )
+            self.assertIn("Jobs done: 1, failed: 0", out.getvalue())
+
+            status = c.get(f"/api/export/jobs/{job['id']}").json()
+            self.assertEqual(status["rows_done"], 4)
+            self.assertEqual(c.get(status["url"]).getvalue(), content)
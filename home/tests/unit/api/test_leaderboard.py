@@ -1,10 +1,14 @@
 import logging
 import urllib
+from io import StringIO
 
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
 from django.test import Client, TestCase
 from freezegun import freeze_time
 
 from home.models import Contest, Device, Leaderboard
+from home.models.leaderboard import LeaderboardRanking
 from home.utils.generators import (
     AccountGenerator,
     DeviceGenerator,
@@ -108,6 +112,61 @@ class TestLeaderboard(TestCase):
             self.assertEqual(1, leaderboard_count)
             self.assertEqual(500, leaderboard_steps_count)
 
+    # Test that resent and updated days change the leaderboard by their delta
+    def test_update_dailywalk_and_leaderboard(self):
+        contest = Contest()
+        contest.start_baseline = "3000-01-01"
+        contest.start_promo = "3000-02-01"
+        contest.start = "3000-02-10"
+        contest.end = "3000-02-28"
+        contest.save()
+
+        def post(daily_walks):
+            response = self.client.post(
+                path=self.url,
+                data={
+                    "account_id": self.device_id,
+                    "daily_walks": daily_walks,
+                },
+                content_type=self.content_type,
+            )
+            self.assertEqual(response.json()["status"], "success")
+            return Leaderboard.objects.get(device=self.device_id).steps
+
+        with freeze_time("3000-02-25"):
+            self.assertEqual(
+                1500, post(self.bulk_request_params["daily_walks"][:1])
+            )
+            self.assertEqual(
+                3000, post(self.bulk_request_params["daily_walks"])
+            )
+            # resending the same days doesn't change the total
+            self.assertEqual(
+                3000, post(self.bulk_request_params["daily_walks"])
+            )
+            # updating a day only adds the difference
+            self.assertEqual(
+                3500,
+                post([{"date": "3000-02-22", "steps": 1000, "distance": 1}]),
+            )
+            # promo period steps don't count towards the contest
+            self.assertEqual(
+                3500,
+                post([{"date": "3000-02-05", "steps": 700, "distance": 1}]),
+            )
+
+        # the incremental total agrees with a full recompute
+        Leaderboard.objects.update(steps=0)
+        out = StringIO()
+        call_command("reconcile_leaderboard", "--fix", stdout=out)
+        self.assertIn("Mismatched entries: 1 (fixed)", out.getvalue())
+        self.assertEqual(
+            3500, Leaderboard.objects.get(device=self.device_id).steps
+        )
+        out = StringIO()
+        call_command("reconcile_leaderboard", stdout=out)
+        self.assertIn("Mismatched entries: 0", out.getvalue())
+
     # Leaderboard Get request test and data validation
     # Test that tester account is not included
     def test_get_leaderboard(self):
@@ -357,7 +416,10 @@ class TestLeaderboard(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-        with freeze_time("3000-02-15"):
+        # The cached ranking is patched once the sync commits
+        with freeze_time("3000-02-15"), self.captureOnCommitCallbacks(
+            execute=True
+        ):
             # Dailywalk submitted during contest period
             response = self.client.post(
                 path=self.url,
@@ -388,3 +450,48 @@ class TestLeaderboard(TestCase):
             response_data_pretest["payload"]["leaderboard"],
         )
         self.assertEqual(response.status_code, 200)
+
+    def test_leaderboard_ranking(self):
+        ranking = LeaderboardRanking(
+            [(1, 500), (2, 900), (3, 500), (4, 100)], expires=0
+        )
+        # Ties share the best rank
+        self.assertEqual(
+            ranking.top(3), [(2, 900, 1), (1, 500, 2), (3, 500, 2)]
+        )
+        self.assertEqual(ranking.rank(500), 3)
+        self.assertEqual(ranking.rank(100), 4)
+
+        ranking._update(4, 1000)
+        self.assertEqual(ranking.top(2), [(4, 1000, 1), (2, 900, 2)])
+        self.assertEqual(ranking.rank(500), 4)
+        self.assertEqual(len(ranking), 4)
+
+    def test_leaderboard_ranking_patch(self):
+        account_id = Device.objects.get(device_id=self.device_id).account_id
+        contest = Contest.objects.create(
+            start_baseline="3000-01-01",
+            start_promo="3000-02-01",
+            start="3000-02-01",
+            end="3000-02-28",
+        )
+        ranking = LeaderboardRanking.current(contest.contest_id, False)
+        self.assertEqual(len(ranking), 0)
+
+        # A rolled back write isn't ranked
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    LeaderboardRanking.patch(
+                        contest.contest_id, account_id, 500
+                    )
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(ranking), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaderboardRanking.patch(contest.contest_id, account_id, 500)
+            self.assertEqual(len(ranking), 0)
+        self.assertEqual(ranking.top(1), [(account_id, 500, 1)])
@@ -249,3 +249,53 @@ class TestContest(TestCase):
         acct.contests.add(contest)
         acct.contests.add(contest)
         self.assertEqual(1, len(Contest.objects.all()))
+
+    def test_calendar(self):
+        contest1 = Contest.objects.create(
+            start_baseline="3000-04-01",
+            start_promo="3000-04-24",
+            start="3000-05-01",
+            end="3000-05-31",
+        )
+        contest1.refresh_from_db()
+        # promo overlaps the end of the previous contest
+        contest2 = Contest.objects.create(
+            start_baseline="3000-05-15",
+            start_promo="3000-05-25",
+            start="3000-06-01",
+            end="3000-06-30",
+        )
+        contest2.refresh_from_db()
+
+        calendar = Contest.calendar()
+        with self.assertNumQueries(0):
+            self.assertEqual(contest1.pk, calendar.get(contest1.pk).pk)
+            self.assertIsNone(calendar.get("missing"))
+            # earliest promo start wins where promo periods overlap
+            self.assertEqual(
+                contest1.pk, calendar.active(date(3000, 5, 28), True).pk
+            )
+            self.assertEqual(
+                contest2.pk, calendar.active(date(3000, 6, 1), True).pk
+            )
+            self.assertIsNone(calendar.active(date(3000, 7, 1), True))
+            self.assertEqual(contest2.pk, calendar.active("3000-07-01").pk)
+            # latest contest start wins where baselines overlap
+            self.assertEqual(
+                contest1.pk, calendar.for_baseline(date(3000, 4, 30)).pk
+            )
+            self.assertEqual(
+                contest2.pk, calendar.for_baseline(date(3000, 5, 15)).pk
+            )
+            self.assertIsNone(calendar.for_baseline(date(3000, 6, 1)))
+            self.assertEqual(
+                contest2.pk, calendar.for_contest(date(3000, 6, 30)).pk
+            )
+            self.assertIsNone(calendar.for_contest(date(3000, 7, 1)))
+
+        # saving or deleting a contest rebuilds the calendar
+        contest2.delete()
+        self.assertIsNone(Contest.calendar().get(contest2.pk))
+        self.assertEqual(
+            contest1.pk, Contest.active(date(3000, 7, 1), strict=False).pk
+        )
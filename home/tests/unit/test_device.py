@@ -0,0 +1,90 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from home.models import Account, Device
+from home.models.device import DeviceResolver
+
+
+class TestDeviceResolver(TestCase):
+    def setUp(self):
+        self.account = Account.objects.create(
+            email="john@blah.com",
+            name="John Doe",
+            zip="94102",
+            age=40,
+        )
+        Device.objects.create(device_id="12345", account=self.account)
+
+    def test_resolve(self):
+        # The first lookup also finds where the invalidation log ends
+        with self.assertNumQueries(2):
+            device = Device.resolve("12345")
+            self.assertEqual(device, Device.resolve("12345"))
+        self.assertEqual(device.device_id, "12345")
+        self.assertEqual(device.account_id, self.account.id)
+        self.assertFalse(device.is_tester)
+
+        # Unregistered ids are cached as well
+        with self.assertNumQueries(1):
+            self.assertIsNone(Device.resolve("fakeID"))
+            self.assertIsNone(Device.resolve("fakeID"))
+
+        stats = DeviceResolver.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["size"], 2)
+
+    def test_invalidation(self):
+        Device.resolve("12345")
+        Device.resolve("23456")
+
+        # Account updates drop the account's devices
+        self.account.is_tester = True
+        self.account.save()
+        self.assertTrue(Device.resolve("12345").is_tester)
+
+        # Registering a device drops its negative entry
+        Device.objects.create(device_id="23456", account=self.account)
+        self.assertEqual(Device.resolve("23456").account_id, self.account.id)
+
+        # Deleting the account drops all of its devices
+        self.account.delete()
+        self.assertIsNone(Device.resolve("12345"))
+        self.assertIsNone(Device.resolve("23456"))
+
+    def test_invalidation_elsewhere(self):
+        other = Account.objects.create(
+            email="jane@blah.com", name="Jane Doe", zip="94102", age=40
+        )
+        Device.objects.create(device_id="23456", account=other)
+        Device.resolve("12345")
+        Device.resolve("23456")
+
+        # Another process updates the account and logs it
+        Account.objects.filter(pk=self.account.pk).update(is_tester=True)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO home_device_invalidation (account_id)"
+                " VALUES (%s)",
+                [self.account.pk],
+            )
+        # The log isn't read again until DEVICE_CACHE_CHECK seconds passed
+        with self.assertNumQueries(0):
+            self.assertFalse(Device.resolve("12345").is_tester)
+        with override_settings(DEVICE_CACHE_CHECK=0), self.assertNumQueries(2):
+            self.assertTrue(Device.resolve("12345").is_tester)
+        # Only the account's devices were dropped
+        with self.assertNumQueries(0):
+            self.assertEqual(Device.resolve("23456").account_id, other.pk)
+
+    @override_settings(DEVICE_CACHE_SIZE=2)
+    def test_eviction(self):
+        for device_id in ("12345", "a", "12345", "b"):
+            Device.resolve(device_id)
+        # "a" was the least recently used
+        with self.assertNumQueries(0):
+            Device.resolve("12345")
+            Device.resolve("b")
+        stats = DeviceResolver.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 2)
@@ -0,0 +1,157 @@
+from datetime import date
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from home.models import DailyStats
+from home.utils.series import dense_series, invalidate_series
+
+SOURCE = """
+    SELECT "date"::date, "steps"
+    FROM (VALUES ('2023-08-21', 100), ('2023-08-23', 50),
+                 ('2023-09-04', 10)) AS walks ("date", "steps")
+"""
+
+
+class TestSeries(TestCase):
+    def test_dense_series_fills_gaps(self):
+        series = dense_series(
+            SOURCE,
+            {"steps": "bigint"},
+            start_date=date(2023, 8, 21),
+            end_date=date(2023, 8, 24),
+        )
+        self.assertEqual(
+            series,
+            [
+                (date(2023, 8, 21), {"steps": 100}, {"steps": 100}),
+                (date(2023, 8, 22), {"steps": 0}, {"steps": 100}),
+                (date(2023, 8, 23), {"steps": 50}, {"steps": 150}),
+                (date(2023, 8, 24), {"steps": 0}, {"steps": 150}),
+            ],
+        )
+
+    def test_dense_series_granularity(self):
+        # Defaults to the days in the source, weeks start on Mondays
+        series = dense_series(SOURCE, {"steps": "bigint"}, granularity="week")
+        self.assertEqual(
+            [(bucket, sums["steps"]) for bucket, sums, _ in series],
+            [
+                (date(2023, 8, 21), 150),
+                (date(2023, 8, 28), 0),
+                (date(2023, 9, 4), 10),
+            ],
+        )
+        series = dense_series(
+            SOURCE,
+            {"steps": "bigint"},
+            start_date=date(2023, 8, 22),
+            granularity="month",
+        )
+        self.assertEqual(
+            [(bucket, sums["steps"]) for bucket, sums, _ in series],
+            [(date(2023, 8, 1), 50), (date(2023, 9, 1), 10)],
+        )
+        with self.assertRaises(ValueError):
+            dense_series(SOURCE, {"steps": "bigint"}, granularity="year")
+
+    def test_dense_series_inlines_source(self):
+        # With the range given the source isn't materialized whole, so a
+        # filter on the range applies while it is read
+        def plan(**dates):
+            with CaptureQueriesContext(connection) as queries:
+                dense_series(SOURCE, {"steps": "bigint"}, **dates)
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {queries.captured_queries[0]['sql']}")
+                return "\n".join(row[0] for row in cursor.fetchall())
+
+        self.assertIn("CTE Scan on source", plan(start_date=date(2023, 8, 22)))
+        self.assertNotIn(
+            "CTE Scan on source",
+            plan(start_date=date(2023, 8, 22), end_date=date(2023, 8, 31)),
+        )
+
+
+class TestCachedSeries(TestCase):
+    def setUp(self):
+        self.client = Client()
+        response = self.client.post(
+            path="/api/appuser/create",
+            data={
+                "name": "Abhay Kashyap",
+                "email": "abhay@blah.com",
+                "zip": "72185",
+                "age": 99,
+                "account_id": "12345",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def sync(self, walk_date, steps):
+        response = self.client.post(
+            path="/api/dailywalk/create",
+            data={
+                "account_id": "12345",
+                "daily_walks": [
+                    {"date": walk_date, "steps": steps, "distance": 1.0}
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def steps(self, granularity="day"):
+        return [
+            (bucket, sums["steps"], totals["steps"])
+            for bucket, sums, totals in DailyStats.series(
+                False, date(2023, 1, 30), date(2023, 2, 2), granularity
+            )
+        ]
+
+    def test_closed_months_cached(self):
+        self.sync("2023-01-31", 100)
+        self.sync("2023-02-01", 10)
+        expected = [
+            (date(2023, 1, 30), 0, 0),
+            (date(2023, 1, 31), 100, 100),
+            (date(2023, 2, 1), 10, 110),
+            (date(2023, 2, 2), 0, 110),
+        ]
+        self.assertEqual(self.steps(), expected)
+
+        # Served from the cache, with a query for the months' versions
+        with self.assertNumQueries(2):
+            self.assertEqual(self.steps(), expected)
+            self.assertEqual(
+                self.steps("month"),
+                [(date(2023, 1, 1), 100, 100), (date(2023, 2, 1), 10, 110)],
+            )
+
+        # A backdated sync drops the month it touches
+        self.sync("2023-02-02", 5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.steps()[-1], (date(2023, 2, 2), 5, 115))
+        self.assertEqual(len(queries.captured_queries), 2)
+
+        # as does a write in another process, which only shares the
+        # database (and not the cache) with this one
+        DailyStats.fold()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE home_dailystats SET steps = 200
+                WHERE date = '2023-01-31' AND NOT is_tester
+                """
+            )
+        self.assertEqual(self.steps()[1], (date(2023, 1, 31), 100, 100))
+        invalidate_series("dailystats:users", [date(2023, 1, 31)])
+        self.assertEqual(self.steps()[1], (date(2023, 1, 31), 200, 200))
+
+    @override_settings(SERIES_LIVE_DAYS=10000)
+    def test_live_tail_not_cached(self):
+        self.sync("2023-01-31", 100)
+        self.assertEqual(self.steps()[1], (date(2023, 1, 31), 100, 100))
+        with self.assertNumQueries(1):
+            self.steps()
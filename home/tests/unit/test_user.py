@@ -1,7 +1,7 @@
 from datetime import date, datetime, timedelta
 
 from django.test import Client, TestCase
-from home.models import Contest
+from home.models import Account, Contest, Device
 from home.utils import localize
 from home.utils.generators import (
     AccountGenerator,
@@ -162,6 +162,29 @@ class TestUserListView(TestCase):
         self.assertEqual(4, plum_data["num_rws"])
         self.assertEqual(4, mustard_data["num_rws"])
 
+    def test_UserListView_with_contest_id_window(self):
+        # Accounts are listed whether or not they enrolled, and recorded
+        # walks only count when they also ended before the contest did
+        device = Device.objects.get(account__email="mustard@clue.net")
+        # Half an hour before the end of the contest's last day
+        start = localize(date(3000, 3, 15)) - timedelta(minutes=30)
+        next(
+            IntentionalWalkGenerator([device]).generate(
+                1, steps=20, start=start, end=start + timedelta(hours=1)
+            )
+        )
+        response = Client().get(
+            "/users/", {"contest_id": self.contest.contest_id}
+        )
+        user_stats = {
+            row["account"]["email"]: row
+            for row in response.context_data["user_stats_list"]
+        }
+        self.assertFalse(
+            Account.objects.filter(contests=self.contest).exists()
+        )
+        self.assertEqual(4, user_stats["mustard@clue.net"]["num_rws"])
+
     def test_UserListView_user_counts(self):
         client = Client()
         response = client.get(
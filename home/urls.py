@@ -50,6 +50,11 @@ urlpatterns.extend(
         path(
             "api/admin/home", views.AdminHomeView.as_view(), name="admin_home"
         ),
+        path(
+            "api/admin/home/series",
+            views.AdminHomeSeriesView.as_view(),
+            name="admin_home_series",
+        ),
         path(
             "api/admin/home/users/daily",
             views.AdminHomeUsersDailyView.as_view(),
@@ -135,6 +140,16 @@ urlpatterns.extend(
             views.ExportUsersView.as_view(),
             name="export_users",
         ),
+        path(
+            "api/export/jobs/<int:job_id>",
+            views.ExportJobView.as_view(),
+            name="export_job",
+        ),
+        path(
+            "api/export/jobs/<int:job_id>/download",
+            views.ExportJobDownloadView.as_view(),
+            name="export_job_download",
+        ),
         path(
             "api/intentionalwalk/create",
             views.IntentionalWalkView.as_view(),
@@ -0,0 +1,24 @@
+from django.db import connection, transaction
+
+# Global version of the app's data, shared by all processes through the
+# home_data_version sequence. Writes bump it and responses cached under an
+# older version are never served again (see views.api.utils.cache_response).
+
+
+def current() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT last_value FROM home_data_version")
+        return cursor.fetchone()[0]
+
+
+def _bump() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('home_data_version')")
+
+
+def bump() -> None:
+    # Sequences aren't transactional: bump right away and again once the
+    # write is committed, so a response computed in between from the data
+    # before the write can't be served under the final version
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,27 @@
+import threading
+from collections import Counter
+
+# Process-local counters, e.g. for cache hit rates and write volumes.
+# Names are dotted by subsystem ("device_cache.hits").
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def increment(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot(prefix: str = "") -> dict:
+    # Current values of the counters whose names start with prefix
+    with _lock:
+        return {
+            name: value
+            for name, value in _counters.items()
+            if name.startswith(prefix)
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
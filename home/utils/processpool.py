@@ -0,0 +1,41 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection
+
+# Worker processes are spawned rather than forked, so they don't share the
+# parent's database connection (or its locks) and open their own instead.
+# Importing this module doesn't import any models, so it can be loaded before
+# Django is set up in a worker.
+
+
+def django_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool whose workers have Django set up, on the same database
+
+    Parameters
+    ----------
+    workers: int
+        Number of worker processes
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        The pool, to be kept for as long as there is work for it, as
+        starting workers is slow, and shut down by the caller
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_setup_worker,
+        initargs=(
+            # e.g. the test database, when running tests
+            connection.settings_dict["NAME"],
+        ),
+    )
+
+
+def _setup_worker(database_name):
+    # DJANGO_SETTINGS_MODULE is inherited from the parent's environment
+    django.setup()
+    connection.settings_dict["NAME"] = database_name
@@ -0,0 +1,290 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def dense_series(
+    source: str,
+    columns: Dict[str, str],
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    granularity: str = "day",
+    params: Optional[Dict[str, Any]] = None,
+    tz: Optional[str] = None,
+) -> List[Tuple[date, Dict[str, Any], Dict[str, Any]]]:
+    """Sums a query of daily values into dense, gap-filled buckets
+
+    Buckets come from generate_series, left joined to the sums of the
+    source, so every day (week, month) of the range is there even when the
+    source has no rows for it.
+
+    Parameters
+    ----------
+    source
+        SQL query with a "date" column and the columns to sum. It may use
+        %(name)s placeholders for params, and %(tz)s for the time zone to
+        convert timestamps to dates in. It should filter its rows on
+        %(start_date)s and %(end_date)s when they are given, so only the
+        range is read.
+    columns
+        Columns to sum, with the SQL type of their sums, e.g.
+        {"steps": "bigint", "distance": "float"}
+    start_date, end_date
+        Days to cover (inclusive), defaulting to the first and last day of
+        the source
+    granularity
+        "day", "week" (starting on Mondays) or "month"
+    params
+        Parameters of the source query
+    tz
+        Time zone name, defaults to the TIME_ZONE setting
+
+    Returns
+    -------
+        [(first day of the bucket, {column: sum}, {column: running sum})]
+        for every bucket of the range, in order
+
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity '{granularity}'")
+
+    sums = []
+    totals = []
+    for column, sql_type in columns.items():
+        sums.append(f'SUM("{column}")::{sql_type} AS "{column}"')
+        totals.append(f'COALESCE(sums."{column}", 0)::{sql_type}')
+        totals.append(
+            f'(SUM(COALESCE(sums."{column}", 0))'
+            f" OVER (ORDER BY buckets.bucket))::{sql_type}"
+        )
+    params = {
+        **(params or {}),
+        "tz": tz or settings.TIME_ZONE,
+        "granularity": granularity,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+    if start_date is not None and end_date is not None:
+        # The source is only read once, so Postgres inlines it instead of
+        # materializing all of it
+        bounds = """
+            SELECT %(start_date)s::date AS start_date,
+                   %(end_date)s::date AS end_date
+        """
+    else:
+        bounds = """
+            SELECT COALESCE(%(start_date)s::date, MIN("date"))
+                       AS start_date,
+                   COALESCE(%(end_date)s::date, MAX("date"))
+                       AS end_date
+            FROM source
+        """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH source AS (
+                {source}
+            ), bounds AS (
+                {bounds}
+            ), buckets AS (
+                SELECT generate_series(
+                    date_trunc(%(granularity)s, start_date::timestamp),
+                    end_date::timestamp,
+                    ('1 ' || %(granularity)s)::interval
+                )::date AS bucket
+                FROM bounds
+            ), sums AS (
+                SELECT date_trunc(%(granularity)s, "date"::timestamp)::date
+                           AS bucket,
+                       {", ".join(sums)}
+                FROM source, bounds
+                WHERE "date" BETWEEN bounds.start_date AND bounds.end_date
+                GROUP BY 1
+            )
+            SELECT buckets.bucket, {", ".join(totals)}
+            FROM buckets
+            LEFT JOIN sums ON sums.bucket = buckets.bucket
+            ORDER BY buckets.bucket
+            """,
+            params,
+        )
+        rows = cursor.fetchall()
+
+    series = []
+    for bucket, *values in rows:
+        series.append(
+            (
+                bucket,
+                dict(zip(columns, values[::2])),
+                dict(zip(columns, values[1::2])),
+            )
+        )
+    return series
+
+
+def _month(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(month: date) -> date:
+    return (month + timedelta(days=31)).replace(day=1)
+
+
+def _bucket(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return _month(day)
+    return day
+
+
+def _closed_before() -> date:
+    # Months that ended before the live tail are closed
+    return _month(
+        timezone.localdate() - timedelta(days=settings.SERIES_LIVE_DAYS)
+    )
+
+
+def _segment_versions(name: str, months: List[date]) -> Dict[date, int]:
+    # Versions live in the database rather than the cache, so a write in
+    # any process drops the segments every process has cached
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT month, version FROM home_series_version
+            WHERE name = %s AND month = ANY(%s::date[])
+            """,
+            [name, months],
+        )
+        versions = dict(cursor.fetchall())
+    return {month: versions.get(month, 0) for month in months}
+
+
+def cached_series(
+    name: str,
+    source: str,
+    columns: Dict[str, str],
+    start_date: date,
+    end_date: date,
+    granularity: str = "day",
+    params: Optional[Dict[str, Any]] = None,
+    tz: Optional[str] = None,
+) -> List[Tuple[date, Dict[str, Any], Dict[str, Any]]]:
+    """Same as dense_series, with the days of closed months cached
+
+    Months that ended before the last SERIES_LIVE_DAYS days are closed:
+    their daily sums are cached, by month, until invalidate_series is called
+    for one of their days. Only the rest of the range (the live tail and
+    closed months missing from the cache) is queried, so charts of finished
+    contests are served from the cache, after a single query for the
+    versions of their months.
+
+    Parameters
+    ----------
+    name
+        Name of the source and its params in cache keys, e.g.
+        "dailystats:users"
+
+    Other parameters and the return value are those of dense_series,
+    except that the range must be given.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity '{granularity}'")
+
+    days = {}
+    closed_before = _closed_before()
+    tail_start = start_date
+    if start_date < closed_before:
+        months = [_month(start_date)]
+        tail_start = _next_month(months[-1])
+        while tail_start < closed_before and tail_start <= end_date:
+            months.append(tail_start)
+            tail_start = _next_month(tail_start)
+        versions = _segment_versions(name, months)
+        keys = {
+            f"series:{name}:{month}:{versions[month]}": month
+            for month in months
+        }
+        segments = cache.get_many(keys)
+
+        # Query all the missing months at once
+        missing = [month for key, month in keys.items() if key not in segments]
+        if missing:
+            computed = {}
+            for day, sums, _ in dense_series(
+                source,
+                columns,
+                start_date=missing[0],
+                end_date=_next_month(missing[-1]) - timedelta(days=1),
+                params=params,
+                tz=tz,
+            ):
+                computed.setdefault(_month(day), []).append(sums)
+            missing = {
+                key: computed[month]
+                for key, month in keys.items()
+                if key not in segments
+            }
+            cache.set_many(missing, None)
+            segments.update(missing)
+
+        for key, month in keys.items():
+            for i, sums in enumerate(segments[key]):
+                days[month + timedelta(days=i)] = sums
+
+    if tail_start <= end_date:
+        for day, sums, _ in dense_series(
+            source,
+            columns,
+            start_date=tail_start,
+            end_date=end_date,
+            params=params,
+            tz=tz,
+        ):
+            days[day] = sums
+
+    # Sum the days of the range into buckets, in order
+    buckets = {}
+    day = start_date
+    while day <= end_date:
+        sums = buckets.setdefault(
+            _bucket(day, granularity), dict.fromkeys(columns, 0)
+        )
+        for column, value in days[day].items():
+            sums[column] += value
+        day += timedelta(days=1)
+    series = []
+    totals = dict.fromkeys(columns, 0)
+    for bucket, sums in buckets.items():
+        totals = {column: totals[column] + sums[column] for column in columns}
+        series.append((bucket, sums, totals))
+    return series
+
+
+def invalidate_series(name: str, dates: Iterable[date]) -> None:
+    """Drops the cached months of a series containing any of the dates"""
+    closed_before = _closed_before()
+    months = {_month(day) for day in dates if day < closed_before}
+    if not months:
+        return
+
+    # In the write's transaction: segments read before it commits are
+    # cached under the old version, which is never read again afterwards
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_series_version (name, month, version)
+            SELECT %s, month, 1 FROM unnest(%s::date[]) AS month
+            ON CONFLICT (name, month) DO UPDATE
+                SET version = home_series_version.version + 1
+            """,
+            [name, sorted(months)],
+        )
@@ -2,6 +2,7 @@
 from .api.admin import (
     AdminMeView,
     AdminHomeView,
+    AdminHomeSeriesView,
     AdminHomeUsersDailyView,
     AdminHomeUsersCumulativeView,
     AdminHomeStepsDailyView,
@@ -17,7 +18,11 @@ from .api.admin import (
 )
 from .api.appuser import AppUserCreateView, AppUserDeleteView
 from .api.dailywalk import DailyWalkCreateView, DailyWalkListView
-from .api.export import ExportUsersView
+from .api.export import (
+    ExportUsersView,
+    ExportJobView,
+    ExportJobDownloadView,
+)
 from .api.intentionalwalk import IntentionalWalkView, IntentionalWalkListView
 from .api.contest import ContestCurrentView
 from .api.leaderboard import LeaderboardListView
@@ -1,25 +1,17 @@
 import itertools
 import logging
-import os
 
-from datetime import timedelta
-from dateutil import parser
+from datetime import date, datetime, timedelta
 
 from django.db import connection
-from django.db.models import (
-    CharField,
-    Count,
-    Q,
-    Sum,
-    Value,
-)
-from django.db.models.functions import Concat, TruncDate
+from django.db.models import Count, Q
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.views import View
 
-from home.models import Account, Contest, DailyWalk
+from home.models import Account, Contest, DailyStats, DailyWalk
 from home.models.intentionalwalk import IntentionalWalk
 from home.models.leaderboard import Leaderboard
+from home.utils.series import GRANULARITIES
 from home.views.api.histogram.serializers import (
     HistogramReqSerializer,
     ValidatedHistogramReq,
@@ -31,7 +23,7 @@ from home.views.api.serializers.response_serializers import (
     GetUsersRespSerializer,
 )
 
-from .utils import paginate, require_authn
+from .utils import cache_response, paginate, require_authn
 
 logger = logging.getLogger(__name__)
 
@@ -57,31 +49,73 @@ class AdminMeView(View):
 class AdminHomeView(View):
     http_method_names = ["get"]
 
+    @cache_response
     def get(self, request, *args, **kwargs):
         filters = {"is_tester": False}
         if request.user.is_authenticated:
-            results = Account.objects.filter(**filters).aggregate(
-                Sum("dailywalk__steps"),
-                Sum("dailywalk__distance"),
-            )
+            results = DailyStats.totals(**filters)
             payload = {
-                "accounts_count": Account.objects.filter(**filters).count(),
-                "accounts_steps": results["dailywalk__steps__sum"],
-                "accounts_distance": results["dailywalk__distance__sum"],
+                "accounts_count": results["signups"] or 0,
+                "accounts_steps": results["steps"],
+                "accounts_distance": results["distance"],
             }
             return JsonResponse(payload)
         else:
             return HttpResponse(status=204)
 
 
-class AdminHomeGraphView(View):
+class AdminHomeSeriesView(View):
+    """All the charts of the admin home page, computed in one pass
+
+    Returns {"<value>_<interval>": chart data} for every value of the series
+    attribute, daily and cumulative, e.g. "steps_daily" and
+    "steps_cumulative". With granularity=week or month the "daily" charts
+    have one point per week or month.
+
+    Closed months are cached until a write touches them (see
+    DailyStats.series), so charts of finished contests are served without
+    any queries. These views aren't wrapped in cache_response, which would
+    check the data version on every request.
+    """
+
     http_method_names = ["get"]
 
-    def is_cumulative(self):
-        return False
+    # value -> DailyStats column
+    series = {
+        "users": "signups",
+        "steps": "steps",
+        "distance": "distance",
+    }
 
     def get_results(self):
-        return []
+        # {"<value>_<interval>": [[date, count], ...]}, with every day (week,
+        # month) of the range, defaulting to the days with daily stats
+        start_date, end_date = self.start_date, self.end_date
+        if start_date is None or end_date is None:
+            first, last = DailyStats.bounds(self.is_tester)
+            start_date = start_date or first
+            end_date = end_date or last
+        rows = []
+        if start_date and end_date:
+            rows = DailyStats.series(
+                self.is_tester, start_date, end_date, self.granularity
+            )
+        results = {}
+        for value, column in self.series.items():
+            results[f"{value}_daily"] = [
+                [f"{bucket.isoformat()}T00:00:00", sums[column]]
+                for bucket, sums, _ in rows
+            ]
+            results[f"{value}_cumulative"] = [
+                [f"{bucket.isoformat()}T00:00:00", totals[column]]
+                for bucket, _, totals in rows
+            ]
+        return results
+
+    def get_payload(self, results):
+        for chart in results.values():
+            chart.insert(0, ["Date", "Count"])
+        return results
 
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -90,139 +124,59 @@ class AdminHomeGraphView(View):
         # handle common parameters for all the chart data API endpoints
         contest_id = request.GET.get("contest_id", None)
         if contest_id:
-            contest = Contest.objects.get(pk=contest_id)
-            self.start_date = min(
-                contest.start_baseline, contest.start_promo
-            ).isoformat()
-            self.end_date = contest.end.isoformat()
+            contest = Contest.calendar().get(
+                contest_id
+            ) or Contest.objects.get(pk=contest_id)
+            self.start_date = min(contest.start_baseline, contest.start_promo)
+            self.end_date = contest.end
         else:
-            self.start_date = request.GET.get("start_date", None)
-            self.end_date = request.GET.get("end_date", None)
+            try:
+                self.start_date = self.end_date = None
+                if request.GET.get("start_date"):
+                    self.start_date = date.fromisoformat(
+                        request.GET["start_date"]
+                    )
+                if request.GET.get("end_date"):
+                    self.end_date = date.fromisoformat(request.GET["end_date"])
+            except ValueError:
+                return HttpResponse(status=422)
         self.is_tester = request.GET.get("is_tester", None) == "true"
+        self.granularity = request.GET.get("granularity") or "day"
+        if self.granularity not in GRANULARITIES:
+            return HttpResponse(status=422)
 
-        # let the concrete subclass implement the actual query
-        results = self.get_results()
-
-        # handle common result processing for the chart data
-        if len(results) > 0:
-            if (
-                self.start_date
-                and results[0][0] != f"{self.start_date}T00:00:00"
-            ):
-                results.insert(0, [f"{self.start_date}T00:00:00", 0])
-            if self.end_date and results[-1][0] != f"{self.end_date}T00:00:00":
-                if self.is_cumulative():
-                    results.append(
-                        [f"{self.end_date}T00:00:00", results[-1][1]]
-                    )
-                else:
-                    results.append([f"{self.end_date}T00:00:00", 0])
-        else:
-            results.append([self.start_date, 0])
-            results.append([self.end_date, 0])
-        results.insert(0, ["Date", "Count"])
-        return JsonResponse(results, safe=False)
+        payload = self.get_payload(self.get_results())
+        return JsonResponse(payload, safe=False)
 
 
-class AdminHomeUsersDailyView(AdminHomeGraphView):
-    def get_results(self):
-        filters = Q()
-        # filter to show users vs testers
-        filters = filters & Q(is_tester=self.is_tester)
-        # filter by date
-        if self.start_date:
-            filters = filters & Q(created__gte=self.start_date)
-        if self.end_date:
-            filters = filters & Q(
-                created__lt=parser.parse(self.end_date) + timedelta(days=1)
-            )
-        results = (
-            Account.objects.filter(filters)
-            .annotate(
-                date=Concat(
-                    TruncDate("created"),
-                    Value("T00:00:00"),
-                    output_field=CharField(),
-                )
-            )
-            .values("date")
-            .annotate(count=Count("id"))
-            .order_by("date")
-        )
-        results = [[row["date"], row["count"]] for row in results]
-        return results
+class AdminHomeGraphView(AdminHomeSeriesView):
+    """A single chart of the admin home page"""
 
+    def get_value_type(self):
+        return None
 
-class AdminHomeUsersCumulativeView(AdminHomeGraphView):
     def is_cumulative(self):
-        return True
+        return False
 
-    def get_results(self):
-        conditions = """
-            "is_tester"=%s
-        """
-        params = [self.is_tester]
-        if self.start_date:
-            conditions = f"""{conditions} AND
-                "created" >= %s
-            """
-            params.append(self.start_date)
-        if self.end_date:
-            conditions = f"""{conditions} AND
-                "created" < %s
-            """
-            params.append(parser.parse(self.end_date) + timedelta(days=1))
-
-        with connection.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT "date", (SUM("count") OVER (ORDER BY "date"))::int AS "count"
-                FROM
-                    (SELECT
-                        CONCAT(("created" AT TIME ZONE '{os.getenv("TIME_ZONE", "America/Los_Angeles")}')::date,
-                                'T00:00:00') AS "date",
-                        COUNT("id") AS "count"
-                     FROM "home_account"
-                     WHERE {conditions}
-                     GROUP BY "date") subquery
-                ORDER BY "date"
-                """,
-                params,
-            )
-            results = cursor.fetchall()
-        return list(results)
+    def get_payload(self, results):
+        interval = "cumulative" if self.is_cumulative() else "daily"
+        chart = results[f"{self.get_value_type()}_{interval}"]
+        chart.insert(0, ["Date", "Count"])
+        return chart
 
 
-class AdminHomeWalksDailyView(AdminHomeGraphView):
+class AdminHomeUsersDailyView(AdminHomeGraphView):
     def get_value_type(self):
-        return None
+        return "users"
 
-    def get_results(self):
-        filters = Q()
-        # filter to show users vs testers
-        filters = filters & Q(account__is_tester=self.is_tester)
-        # filter by date
-        if self.start_date:
-            filters = filters & Q(date__gte=self.start_date)
-        if self.end_date:
-            filters = filters & Q(date__lte=self.end_date)
-        results = (
-            DailyWalk.objects.filter(filters)
-            .annotate(
-                date_time=Concat(
-                    "date",
-                    Value("T00:00:00"),
-                    output_field=CharField(),
-                ),
-            )
-            .values("date_time")
-            .annotate(
-                count=Sum(self.get_value_type()),
-            )
-            .order_by("date_time")
-        )
-        results = [[row["date_time"], row["count"]] for row in results]
-        return results
+
+class AdminHomeUsersCumulativeView(AdminHomeUsersDailyView):
+    def is_cumulative(self):
+        return True
+
+
+class AdminHomeWalksDailyView(AdminHomeGraphView):
+    pass
 
 
 class AdminHomeStepsDailyView(AdminHomeWalksDailyView):
@@ -239,45 +193,6 @@ class AdminHomeWalksCumulativeView(AdminHomeGraphView):
     def is_cumulative(self):
         return True
 
-    def get_value_type(self):
-        return None
-
-    def get_results(self):
-        conditions = """
-            "home_account"."is_tester"=%s
-        """
-        params = [self.is_tester]
-        if self.start_date:
-            conditions = f"""{conditions} AND
-                "home_dailywalk"."date" >= %s
-            """
-            params.append(self.start_date)
-        if self.end_date:
-            conditions = f"""{conditions} AND
-                "home_dailywalk"."date" <= %s
-            """
-            params.append(self.end_date)
-
-        with connection.cursor() as cursor:
-            cursor.execute(
-                f"""
-                SELECT "date", (SUM("count") OVER (ORDER BY "date"))::int AS "count"
-                FROM
-                    (SELECT
-                        CONCAT("date", 'T00:00:00') AS "date",
-                        SUM("{self.get_value_type()}") AS "count"
-                     FROM "home_dailywalk"
-                     JOIN "home_account" ON "home_account"."id"="home_dailywalk"."account_id"
-                     WHERE {conditions}
-                     GROUP BY "date") subquery
-                ORDER BY "date"
-                """,
-                params,
-            )
-            results = cursor.fetchall()
-        results = list(results)
-        return results
-
 
 class AdminHomeStepsCumulativeView(AdminHomeWalksCumulativeView):
     def get_value_type(self):
@@ -316,45 +231,60 @@ class AdminUsersView(View):
         contest_id = validated["contest_id"]
         filters = validated["filters"]
         order_by = validated["order_by"]
+        order_field = validated["order_field"]
         page = validated["page"]
         per_page = validated["per_page"]
 
         annotate = validated["annotate"]
-        intentionalwalk_annotate = validated["intentionalwalk_annotate"]
 
+        # Count the accounts alone, without computing their stats
+        count = None
+        if validated["count"] == "estimate" and not validated["filtered"]:
+            count = Account.estimate_count(validated["is_tester"])
+        if validated["count"] != "none" and count is None:
+            count = Account.objects.filter(filters).count()
+
+        values = ["id", "name", "email", "age", "zip", "created"]
+        if order_field and order_field not in values + list(annotate):
+            # to make cursors from
+            values.append(order_field)
         query = (
             Account.objects.filter(filters)
-            .values("id", "name", "email", "age", "zip", "created")
+            .values(*values)
             .annotate(**annotate)
             .order_by(*order_by)
         )
-        query, links = paginate(request, query, page, per_page)
-        result_dto = [row for row in query]
 
-        iw_query = (
-            Account.objects.filter(id__in=(row["id"] for row in result_dto))
-            .values("id")
-            .annotate(**intentionalwalk_annotate)
+        def cursor_for(row):
+            key = [row["name"], row["id"]]
+            if order_field:
+                value = row[order_field]
+                if isinstance(value, (date, datetime)):
+                    value = value.isoformat()
+                key.insert(0, value)
+            return key
+
+        result_dto, links = paginate(
+            request,
+            query,
+            page,
+            per_page,
+            count=count,
+            seek=validated["seek"],
+            cursor_for=cursor_for,
         )
-        iw_results = [row for row in iw_query]
 
-        def update_user_dto(dto, iw_stats):
-            dto.update(iw_stats)
-            # at this point, we have enough info to determine if user is "active"
-            if contest_id:
+        # at this point, we have enough info to determine if user is "active"
+        if contest_id:
+            for dto in result_dto:
                 dto["is_active"] = dto["dw_count"] > 0 or dto["iw_count"] > 0
-            return dto
-
-        for dto in result_dto:
-            for iw_stat in iw_results:
-                if dto["id"] == iw_stat["id"]:
-                    update_user_dto(dto, iw_stat)
-                    break
 
         resp = GetUsersRespSerializer(result_dto, many=True)
         response = JsonResponse(resp.data, safe=False)
         if links:
             response.headers["Link"] = links
+        if count is not None:
+            response.headers["X-Total-Count"] = count
 
         return response
 
@@ -362,6 +292,7 @@ class AdminUsersView(View):
 class AdminUsersByZipView(View):
     http_method_names = ["get"]
 
+    @cache_response
     def get(self, request, *args, **kwargs):
         values = ["zip"]
         order_by = ["zip"]
@@ -415,6 +346,7 @@ class AdminUsersByZipView(View):
 class AdminUsersActiveByZipView(View):
     http_method_names = ["get"]
 
+    @cache_response
     def get(self, request, *args, **kwargs):
         contest_id = request.GET.get("contest_id", None)
         is_tester = request.GET.get("is_tester", None) == "true"
@@ -424,66 +356,51 @@ class AdminUsersActiveByZipView(View):
             payload = {}
             contest = Contest.objects.get(pk=contest_id)
 
+            # Accounts are active if they have any walk during the contest:
+            # EXISTS stops at the first one, where joining both walk tables
+            # would pair up every daily walk with every intentional walk of
+            # the account before DISTINCT. New accounts are counted in the
+            # same pass.
             with connection.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT zip, COUNT(*)
-                    FROM (
-                        SELECT DISTINCT(home_account.id), home_account.zip
-                        FROM home_account
-                        JOIN home_account_contests ON home_account.id=home_account_contests.account_id
-                        LEFT JOIN home_dailywalk ON home_account.id=home_dailywalk.account_id
-                        LEFT JOIN home_intentionalwalk ON home_account.id=home_intentionalwalk.account_id
-                        WHERE home_account.is_tester=%s AND
-                              home_account_contests.contest_id=%s AND
-                              ((home_dailywalk.id IS NOT NULL AND home_dailywalk.date BETWEEN %s AND %s) OR
-                               (home_intentionalwalk.id IS NOT NULL AND
-                                home_intentionalwalk.start >= %s AND home_intentionalwalk.start < %s))
-                    ) subquery
-                    GROUP BY zip
-                """,
-                    [
-                        is_tester,
-                        contest_id,
-                        contest.start,
-                        contest.end,
-                        contest.start,
-                        contest.end + timedelta(days=1),
-                    ],
+                    SELECT home_account.zip,
+                           COUNT(*),
+                           COUNT(*) FILTER (
+                               WHERE home_account.created >= %(start_promo)s
+                                 AND home_account.created < %(end)s
+                           )
+                    FROM home_account
+                    JOIN home_account_contests ON
+                        home_account_contests.account_id = home_account.id
+                    WHERE home_account.is_tester = %(is_tester)s AND
+                          home_account_contests.contest_id = %(contest_id)s AND
+                          (EXISTS (
+                               SELECT 1 FROM home_dailywalk
+                               WHERE home_dailywalk.account_id = home_account.id
+                                 AND home_dailywalk.date
+                                     BETWEEN %(start)s AND %(end_date)s
+                           ) OR EXISTS (
+                               SELECT 1 FROM home_intentionalwalk
+                               WHERE home_intentionalwalk.account_id
+                                         = home_account.id
+                                 AND home_intentionalwalk.start >= %(start)s
+                                 AND home_intentionalwalk.start < %(end)s
+                           ))
+                    GROUP BY home_account.zip
+                    """,
+                    {
+                        "is_tester": is_tester,
+                        "contest_id": contest_id,
+                        "start_promo": contest.start_promo,
+                        "start": contest.start,
+                        "end_date": contest.end,
+                        "end": contest.end + timedelta(days=1),
+                    },
                 )
                 rows = cursor.fetchall()
-                payload["total"] = {row[0]: row[1] for row in rows}
-                cursor.execute(
-                    """
-                    SELECT zip, COUNT(*)
-                    FROM (
-                        SELECT DISTINCT(home_account.id), home_account.zip
-                        FROM home_account
-                        JOIN home_account_contests ON home_account.id=home_account_contests.account_id
-                        LEFT JOIN home_dailywalk ON home_account.id=home_dailywalk.account_id
-                        LEFT JOIN home_intentionalwalk ON home_account.id=home_intentionalwalk.account_id
-                        WHERE home_account.is_tester=%s AND
-                              home_account_contests.contest_id=%s AND
-                              home_account.created >= %s AND home_account.created < %s AND
-                              ((home_dailywalk.id IS NOT NULL AND home_dailywalk.date BETWEEN %s AND %s) OR
-                               (home_intentionalwalk.id IS NOT NULL AND
-                                home_intentionalwalk.start >= %s AND home_intentionalwalk.start < %s))
-                    ) subquery
-                    GROUP BY zip
-                """,
-                    [
-                        is_tester,
-                        contest_id,
-                        contest.start_promo,
-                        contest.end + timedelta(days=1),
-                        contest.start,
-                        contest.end,
-                        contest.start,
-                        contest.end + timedelta(days=1),
-                    ],
-                )
-                rows = cursor.fetchall()
-                payload["new"] = {row[0]: row[1] for row in rows}
+            payload["total"] = {zip: total for zip, total, _ in rows}
+            payload["new"] = {zip: new for zip, _, new in rows if new}
 
             return JsonResponse(payload)
         else:
@@ -493,54 +410,36 @@ class AdminUsersActiveByZipView(View):
 class AdminUsersByZipMedianStepsView(View):
     http_method_names = ["get"]
 
+    @cache_response
     def get(self, request, *args, **kwargs):
         if request.user.is_authenticated:
             is_tester = request.GET.get("is_tester", None) == "true"
             contest_id = request.GET.get("contest_id", None)
             if contest_id is None:
                 return HttpResponse(status=422)
-            contest = Contest.objects.get(pk=contest_id)
             payload = {}
+            # The medians of the contest's step totals of active accounts,
+            # overall and by zip, in one pass over the contest stats
             with connection.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT PERCENTILE_CONT(0.5) WITHIN GROUP(ORDER BY sum)
-                    FROM (
-                        SELECT home_account.id AS id, SUM(home_dailywalk.steps) AS sum
-                        FROM home_account
-                        JOIN home_dailywalk ON home_account.id=home_dailywalk.account_id
-                        JOIN home_account_contests ON home_account.id=home_account_contests.account_id
-                        WHERE home_account.is_tester=%s AND
-                              home_account_contests.contest_id=%s AND
-                              home_dailywalk.date BETWEEN %s AND %s
-                        GROUP BY (home_account.id)
-                    ) subquery
-                """,
-                    [is_tester, contest_id, contest.start, contest.end],
-                )
-                row = cursor.fetchone()
-
-                payload["all"] = row[0]
-                cursor.execute(
-                    """
-                    SELECT zip, PERCENTILE_CONT(0.5) WITHIN GROUP(ORDER BY sum)
-                    FROM (
-                        SELECT home_account.id AS id, home_account.zip AS zip, SUM(home_dailywalk.steps) AS sum
-                        FROM home_account
-                        JOIN home_dailywalk ON home_account.id=home_dailywalk.account_id
-                        JOIN home_account_contests ON home_account.id=home_account_contests.account_id
-                        WHERE home_account.is_tester=%s AND
-                              home_account_contests.contest_id=%s AND
-                              home_dailywalk.date BETWEEN %s AND %s
-                        GROUP BY (home_account.id, home_account.zip)
-                    ) subquery
-                    GROUP BY zip
-                """,
-                    [is_tester, contest_id, contest.start, contest.end],
+                    SELECT GROUPING(home_account.zip) = 1,
+                           home_account.zip,
+                           PERCENTILE_CONT(0.5) WITHIN GROUP(
+                               ORDER BY stats.dw_contest_steps
+                           )
+                    FROM home_accountconteststats AS stats
+                    JOIN home_account ON home_account.id = stats.account_id
+                    WHERE home_account.is_tester = %s AND
+                          stats.contest_id = %s AND
+                          stats.dw_contest_count > 0
+                    GROUP BY GROUPING SETS ((), (home_account.zip))
+                    ORDER BY 1 DESC, 2
+                    """,
+                    [is_tester, contest_id],
                 )
-                rows = cursor.fetchall()
-                for row in rows:
-                    payload[row[0]] = row[1]
+                for is_all, zip, median in cursor.fetchall():
+                    payload["all" if is_all else zip] = median
 
             response = JsonResponse(payload)
             return response
@@ -559,6 +458,7 @@ class AdminHistogramView(View):
     }
 
     @require_authn
+    @cache_response
     def get(self, request: HttpRequest, model_name: str) -> HttpResponse:
         """Get histogram data for a given model across a numberic field.
 
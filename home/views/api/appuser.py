@@ -170,8 +170,9 @@ class AppUserCreateView(View):
             return JsonResponse(json_status)
 
         # Update user attributes.
-        device = Device.objects.get(device_id=json_data["account_id"])
-        account = Account.objects.get(email__iexact=device.account.email)
+        account = Account.objects.get(
+            device__device_id=json_data["account_id"]
+        )
         update_account(account, json_data)
         message = "Account updated successfully"
 
@@ -307,9 +308,8 @@ class AppUserDeleteView(View):
             return JsonResponse(json_status)
 
         # Look for specified user/device account
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -317,8 +317,8 @@ class AppUserDeleteView(View):
                 }
             )
 
-        device.account.delete()
-        device.delete()
+        # Deletes the account's devices too, and drops them from the cache
+        Account.objects.filter(pk=device.account_id).delete()
 
         return JsonResponse(
             {
@@ -1,17 +1,22 @@
+import hashlib
 import json
 import logging
 from datetime import date
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.http import JsonResponse
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
-from home.models import Contest, DailyWalk, Device
+from home.models import DailyWalk, DailyWalkBatch, Device
 
 
-from .utils import validate_request_json
+from .utils import coerce_float, coerce_integer, validate_request_json
 
 logger = logging.getLogger(__name__)
 
@@ -36,9 +41,8 @@ class DailyWalkCreateView(View):
             return JsonResponse(json_status)
 
         # Get the device if already registered
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -60,81 +64,73 @@ class DailyWalkCreateView(View):
             },
         }
 
-        active_contests = set()
-
+        # Validate the whole batch before writing anything
+        daily_walks = []
         for daily_walk_data in json_data["daily_walks"]:
-            # Validate data
             json_status = validate_request_json(
                 daily_walk_data,
                 required_fields=["date", "steps", "distance"],
             )
             if "status" in json_status and json_status["status"] == "error":
                 return JsonResponse(json_status)
-
-            walk_date = daily_walk_data["date"]
-            contest = Contest.active(
-                for_date=date.fromisoformat(walk_date), strict=True
-            )
-            if contest is not None:
-                active_contests.add(contest)
-
-            # Check if there is already an entry for this date. If there is,
-            # update the entry.
-            # NOTE: By definition, there should be one and only one entry for
-            # a given email and date.
-            # NOTE: This is a potential vulnerability. Since there is no email
-            # authentication at the moment, anyone can simply spoof an email
-            # id with a new device and overwrite daily walk data for the
-            # target email. This is also a result of no session auth
-            # (can easily hit the api directly)
             try:
-                # Updation
-                daily_walk = DailyWalk.objects.get(
-                    account=device.account, date=walk_date
+                walk_date = date.fromisoformat(daily_walk_data["date"])
+            except (TypeError, ValueError):
+                return JsonResponse(
+                    {
+                        "status": "error",
+                        "message": (
+                            f"Invalid date '{daily_walk_data['date']}'"
+                            " in the request"
+                        ),
+                    }
                 )
-                daily_walk.steps = daily_walk_data["steps"]
-                daily_walk.distance = daily_walk_data["distance"]
-                daily_walk.device_id = json_data["account_id"]
-                daily_walk.save()
-            except ObjectDoesNotExist:
-                # Creation if object is missing
-                daily_walk = DailyWalk.objects.create(
-                    date=walk_date,
-                    steps=daily_walk_data["steps"],
-                    distance=daily_walk_data["distance"],
-                    device=device,
+            # Convert numbers sent as strings (or steps as floats) as the
+            # database would, but catch values it would reject now, as
+            # queued batches are only saved later
+            try:
+                steps = coerce_integer(daily_walk_data["steps"])
+                distance = coerce_float(daily_walk_data["distance"])
+            except (TypeError, ValueError):
+                return JsonResponse(
+                    {
+                        "status": "error",
+                        "message": (
+                            f"Invalid steps or distance for '{walk_date}'"
+                            " in the request"
+                        ),
+                    }
                 )
+            daily_walks.append((walk_date, steps, distance))
+
+        # Under load, queue the batch for the ingest worker instead of
+        # holding the request open while it is saved
+        if settings.DAILYWALK_ASYNC_INGEST:
+            DailyWalkBatch.enqueue(
+                device.account_id, device.device_id, daily_walks
+            )
+            json_response["message"] = "Dailywalks queued successfully"
+            json_response["payload"]["daily_walks"] = [
+                {"date": walk_date, "steps": steps, "distance": distance}
+                for walk_date, steps, distance in daily_walks
+            ]
+            return JsonResponse(json_response, status=202)
+
+        saved = DailyWalk.ingest(
+            device.account_id, device.device_id, daily_walks
+        )
 
-            # Update the json object
+        # Update the json object, in the order the walks were sent
+        for walk_date, _, _ in daily_walks:
+            walk_date, steps, distance = saved[walk_date][:3]
             json_response["payload"]["daily_walks"].append(
                 {
-                    "date": daily_walk.date,
-                    "steps": daily_walk.steps,
-                    "distance": daily_walk.distance,
+                    "date": walk_date,
+                    "steps": steps,
+                    "distance": distance,
                 }
             )
 
-        # Register contest for account if the day falls between contest dates
-        contest = Contest.active(for_date=date.today(), strict=True)
-        if contest:
-            active_contests.add(contest)
-            try:
-                acct = device.account
-                acct.contests.add(contest)
-            except Exception:
-                logger.error(
-                    "Could not associate contest "
-                    f"{contest} with account {acct}!",
-                    exc_info=True,
-                )
-        else:
-            # No active contest
-            pass
-
-        # Update Leaderboard
-        for contest in active_contests:
-            DailyWalk.update_leaderboard(device=device, contest=contest)
-
         return JsonResponse(json_response)
 
     def http_method_not_allowed(self, request):
@@ -162,10 +158,8 @@ class DailyWalkListView(View):
             return JsonResponse(json_status)
 
         # Get the device if already registered
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-            # appuser = AppUser.objects.get(account_id=json_data["account_id"])
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -177,6 +171,35 @@ class DailyWalkListView(View):
                 }
             )
 
+        # Optional filters, so the app only fetches the days it's missing:
+        # since: rows added or changed after this timestamp (the "updated"
+        #        value of a previous response)
+        # start_date/end_date: dates in this range (inclusive)
+        filters = {}
+        try:
+            if json_data.get("since"):
+                since = parse_datetime(json_data["since"])
+                if since is None:
+                    raise ValueError(json_data["since"])
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+                filters["updated__gt"] = since
+            if json_data.get("start_date"):
+                filters["date__gte"] = date.fromisoformat(
+                    json_data["start_date"]
+                )
+            if json_data.get("end_date"):
+                filters["date__lte"] = date.fromisoformat(
+                    json_data["end_date"]
+                )
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {
+                    "status": "error",
+                    "message": "Invalid since/start_date/end_date",
+                }
+            )
+
         # Get walks from tied to this account
         # NOTE: This is very hacky and cannot distinguish between legit and
         # fake users.
@@ -184,36 +207,47 @@ class DailyWalkListView(View):
         # email id and have the metrics simply aggregated.
         # For the simple use case, this is likely not an issue and would need
         # to be handled manually if needed
-        daily_walks = DailyWalk.objects.filter(account=device.account)
-
-        # Hacky serializer
-        total_steps = 0
-        total_distance = 0
-        daily_walk_list = []
-        for daily_walk in daily_walks:
-            daily_walk_list.append(
-                {
-                    "date": daily_walk.date,
-                    "steps": daily_walk.steps,
-                    "distance": daily_walk.distance,
-                }
-            )
-            total_steps += daily_walk.steps
-            total_distance += daily_walk.distance
-        total_distance = round(total_distance, 6)
-
-        # Sort the list based on the date
-        daily_walk_list = sorted(
-            daily_walk_list, key=lambda x: x["date"], reverse=True
+        daily_walks = DailyWalk.objects.filter(
+            account_id=device.account_id
+        ).order_by()
+
+        # Totals over the whole history, and the version of the history the
+        # ETag is based on, in one aggregate
+        summary = daily_walks.aggregate(
+            count=Count("id"),
+            updated=Max("updated"),
+            total_steps=Sum("steps"),
+            total_distance=Sum("distance"),
+        )
+        version = (device.account_id, summary["count"], summary["updated"])
+        etag = quote_etag(
+            hashlib.md5(
+                repr((version, sorted(filters.items()))).encode(),
+                usedforsecurity=False,
+            ).hexdigest()
         )
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
         # Create the payload with meta information and send it back
+        # Note: walks are ordered by the latest date
         payload = {
-            "daily_walks": daily_walk_list,
-            "total_steps": total_steps,
-            "total_distance": total_distance,
+            "daily_walks": list(
+                daily_walks.filter(**filters)
+                .order_by("-date")
+                .values("date", "steps", "distance")
+            ),
+            "total_steps": summary["total_steps"] or 0,
+            "total_distance": round(summary["total_distance"] or 0, 6),
+            # Full precision, to be passed back as "since"
+            "updated": (summary["updated"] and summary["updated"].isoformat()),
             "status": "success",
         }
-        return JsonResponse(payload)
+        response = JsonResponse(payload)
+        response["ETag"] = etag
+        return response
 
     def http_method_not_allowed(self, request):
         return JsonResponse(
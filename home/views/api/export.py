@@ -1,23 +1,39 @@
+import collections
 import csv
+import gzip
+import io
+import itertools
 import logging
-import os
-import tempfile
 
 from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.db import transaction
 from django.db.models import (
     BooleanField,
-    Count,
+    Case,
     ExpressionWrapper,
+    F,
+    IntegerField,
     Q,
-    Sum,
+    When,
 )
-from django.http import FileResponse, HttpResponse
+from django.db.models.expressions import RawSQL
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
 
-from home.models import Account, Contest, DailyWalk
+from home.models import Account, Contest, ExportJob
 
 logger = logging.getLogger(__name__)
 
@@ -73,93 +89,73 @@ CSV_COLUMNS = [
 ]
 
 
-def get_dailywalk_stats(name, ids, dailywalk_filter):
-    filters = Q(id__in=ids)
-    values = ["id"]
-    annotate = {
-        f"dw_{name}_count": Count("dailywalk", filter=dailywalk_filter),
-        f"dw_{name}_steps": Sum("dailywalk__steps", filter=dailywalk_filter),
-        f"dw_{name}_distance": Sum(
-            "dailywalk__distance", filter=dailywalk_filter
-        ),
-    }
-    order_by = ["id"]
-    return (
-        Account.objects.filter(filters)
-        .values(*values)
-        .annotate(**annotate)
-        .order_by(*order_by)
+def contest_stat(name):
+    """The account's total from its AccountContestStats row for the contest,
+    e.g. dw_baseline_steps. Sums are NULL without walks, as they are when
+    aggregated from the walks themselves.
+    """
+    value = F(f"contest_stats__{name}")
+    if name.endswith("_count"):
+        return value
+    count = "_".join(name.split("_")[:2] + ["count"])
+    return Case(
+        When(Q(**{f"contest_stats__{count}__gt": 0}), then=value),
+        default=None,
     )
 
 
-def get_intentionalwalk_stats(name, ids, intentionalwalk_filter):
-    filters = Q(id__in=ids)
-    values = ["id"]
-    annotate = {
-        f"iw_{name}_count": Count(
-            "intentionalwalk", filter=intentionalwalk_filter
-        ),
-        f"iw_{name}_steps": Sum(
-            "intentionalwalk__steps", filter=intentionalwalk_filter
-        ),
-        f"iw_{name}_distance": Sum(
-            "intentionalwalk__distance", filter=intentionalwalk_filter
-        ),
-        f"iw_{name}_time": Sum(
-            "intentionalwalk__walk_time", filter=intentionalwalk_filter
-        ),
-    }
-    order_by = ["id"]
-    return (
-        Account.objects.filter(filters)
-        .values(*values)
-        .annotate(**annotate)
-        .order_by(*order_by)
+def daily_steps(contest):
+    """The account's steps on every day from the start of the contest's
+    baseline to its end, as an array with a NULL for each day without a
+    daily walk. The days are pivoted in SQL, one row per account rather than
+    one per daily walk.
+    """
+    return RawSQL(
+        """
+        ARRAY(
+            SELECT home_dailywalk.steps
+            FROM generate_series(%s::date, %s::date, interval '1 day')
+                AS days (day)
+            LEFT JOIN home_dailywalk ON
+                home_dailywalk.account_id = home_account.id AND
+                home_dailywalk.date = days.day::date
+            ORDER BY days.day
+        )
+        """,
+        [contest.start_baseline, contest.end],
+        output_field=ArrayField(IntegerField()),
     )
 
 
-def get_daily_walks(ids, contest):
-    filters = Q(
-        account_id__in=ids, date__range=(contest.start_baseline, contest.end)
-    )
-    values = ["account_id", "date", "steps"]
-    order_by = ["account_id", "date"]
-    return (
-        DailyWalk.objects.filter(filters).values(*values).order_by(*order_by)
+def read_survey_file(survey_file, email_col, id_col):
+    # Returns the survey ids in the file by (lower case) email, and a hash
+    # of the file and columns identifying the export's artifacts, or an
+    # empty mapping and hash without a file
+    survey_ids = {}
+    if survey_file is None:
+        return survey_ids, ""
+    logger.info(
+        "Processing survey file, email column: %s, id column: %s",
+        email_col,
+        id_col,
     )
+    content = survey_file.read()
+    reader = csv.reader(content.decode("utf-8").splitlines())
+    for row in reader:
+        survey_ids[row[email_col].lower()] = row[id_col]
+    return survey_ids, ExportJob.survey_digest(content, email_col, id_col)
 
 
-def export_contest_users_data(
-    file, contest_id, is_tester, survey_file=None, email_col=None, id_col=None
-):
-    # if a survey file is provided, extract the email and id columns into a mapping
-    survey_ids = {}
-    if survey_file is not None:
-        logger.info(
-            "Processing survey file, email column: %s, id column: %s",
-            email_col,
-            id_col,
-        )
-        reader = csv.reader(survey_file.read().decode("utf-8").splitlines())
-        for row in reader:
-            survey_ids[row[email_col].lower()] = row[id_col]
+def contest_users(contest, is_tester):
+    # The accounts enrolled in the contest, one per row of its export
+    return Account.objects.filter(
+        contest_stats__contest_id=contest.contest_id, is_tester=is_tester
+    )
 
-    # get the Contest object
-    contest = Contest.objects.get(pk=contest_id)
 
-    # configure the CSV writer
-    fieldnames = [col["id"] for col in CSV_COLUMNS]
-    header = {col["id"]: col["name"] for col in CSV_COLUMNS}
-    # add headers for every day in the output range (start of baseline to end of contest)
-    for dt in range((contest.end - contest.start_baseline).days + 1):
-        date = contest.start_baseline + timedelta(days=dt)
-        fieldnames.append(str(date))
-        header[str(date)] = str(date)
-    writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
-    writer.writerow(header)
-
-    # query for the base attributes
-    filters = Q(contests__contest_id=contest_id, is_tester=is_tester)
+def contest_users_rows(contest, is_tester):
+    # query for the base attributes, and the account's totals for the
+    # contest from the same join as the filter
     values = [
         "id",
         "created",
@@ -184,126 +180,234 @@ def export_contest_users_data(
             output_field=BooleanField(),
         ),
     }
+    for kind, totals in [
+        ("dw", ["count", "steps", "distance"]),
+        ("iw", ["count", "steps", "distance", "time"]),
+    ]:
+        for period in ["baseline", "contest"]:
+            for total in totals:
+                name = f"{kind}_{period}_{total}"
+                annotate[name] = contest_stat(name)
+    annotate["daily_steps"] = daily_steps(contest)
     order_by = ["id"]
-    results = (
-        Account.objects.filter(filters)
+    return (
+        contest_users(contest, is_tester)
         .values(*values)
         .annotate(**annotate)
         .order_by(*order_by)
     )
 
-    # set up to process in batches
-    offset = 0
-    limit = 25
-    total = results.count()
-    while offset < total:
-        ids = []
-        rows = []
-        for row in results[offset : offset + limit]:  # noqa E203
-            # check for a survey id mapping and add...
-            survey_id = survey_ids.get(row["email"].lower(), None)
-            if survey_id is not None:
-                row["survey_id"] = survey_id
-            # convert race Set into a comma delimited string
-            row["race"] = ",".join(row["race"])
-            # gather all rows and ids
-            rows.append(row)
-            ids.append(row["id"])
-        offset = offset + limit
-
-        # add in the baseline period dailywalk stats
-        dw_baseline_results = get_dailywalk_stats(
-            "baseline",
-            ids,
-            Q(
-                dailywalk__date__range=(
-                    contest.start_baseline,
-                    contest.start - timedelta(days=1),
-                )
-            ),
-        )
-        for i, row in enumerate(dw_baseline_results):
-            rows[i].update(row)
-
-        # add in the contest period dailywalk stats
-        dw_contest_results = get_dailywalk_stats(
-            "contest",
-            ids,
-            Q(dailywalk__date__range=(contest.start, contest.end)),
-        )
-        for i, row in enumerate(dw_contest_results):
-            rows[i].update(row)
 
-        # add in the baseline period intentionalwalk stats
-        iw_baseline_results = get_intentionalwalk_stats(
-            "baseline",
-            ids,
-            Q(
-                intentionalwalk__start__gte=contest.start_baseline,
-                intentionalwalk__start__lt=contest.start,
-            ),
+def contest_days(contest):
+    # every day in the output range (start of baseline to end of contest)
+    return [
+        str(contest.start_baseline + timedelta(days=dt))
+        for dt in range((contest.end - contest.start_baseline).days + 1)
+    ]
+
+
+def csv_writer(buffer, days):
+    return csv.DictWriter(
+        buffer,
+        fieldnames=[col["id"] for col in CSV_COLUMNS] + days,
+        extrasaction="ignore",
+    )
+
+
+def write_rows(accounts, days, survey_ids):
+    # Returns the CSV of the accounts' rows, and the number of rows
+    buffer = io.StringIO()
+    writer = csv_writer(buffer, days)
+    rows = []
+    for row in accounts:
+        # check for a survey id mapping and add...
+        survey_id = survey_ids.get(row["email"].lower(), None)
+        if survey_id is not None:
+            row["survey_id"] = survey_id
+        # convert race Set into a comma delimited string (sorted, as set
+        # order differs between processes)
+        row["race"] = ",".join(sorted(row["race"]))
+        row["is_active"] = (
+            row["dw_contest_count"] > 0 or row["iw_contest_count"] > 0
         )
-        for i, row in enumerate(iw_baseline_results):
-            rows[i].update(row)
+        # and add in every day of step data
+        row.update(zip(days, row.pop("daily_steps")))
+        rows.append(row)
 
-        # add in the contest period intentionalwalk stats
-        iw_contest_results = get_intentionalwalk_stats(
-            "contest",
-            ids,
-            Q(
-                intentionalwalk__start__gte=contest.start,
-                intentionalwalk__start__lt=contest.end + timedelta(days=1),
-            ),
+    # finally, write it out to the CSV...!
+    writer.writerows(rows)
+    return buffer.getvalue(), len(rows)
+
+
+def contest_users_csv(
+    contest, is_tester, survey_ids, progress=None, batches=None
+):
+    # Returns an iterator of the chunks of the contest's CSV export: the
+    # header, then the rows of each batch of accounts, queried as the
+    # chunks are consumed. progress, if given, is called with the number
+    # of rows in each batch once it is written.
+    #
+    # batches: iterator of the (chunk, rows) of each batch, written in this
+    #          process by default (see serial_batches and shard_batches)
+    days = contest_days(contest)
+    buffer = io.StringIO()
+    header = {col["id"]: col["name"] for col in CSV_COLUMNS}
+    header.update(zip(days, days))
+    csv_writer(buffer, days).writerow(header)
+    yield buffer.getvalue()
+
+    if batches is None:
+        batches = serial_batches(contest, is_tester, survey_ids)
+    for chunk, rows in batches:
+        yield chunk
+        if progress is not None:
+            progress(rows)
+
+
+def serial_batches(contest, is_tester, survey_ids):
+    # fetch the accounts through a server-side cursor, rather than
+    # re-running the query with an OFFSET for every batch, and write them
+    # out in batches until one comes back empty.
+    #
+    # Streamed responses are consumed after the request's transaction has
+    # ended. Outside a transaction, the cursor would be declared WITH HOLD,
+    # which Postgres materializes in full before returning the first row.
+    days = contest_days(contest)
+    batch_size = settings.EXPORT_BATCH_SIZE
+    with transaction.atomic():
+        accounts = contest_users_rows(contest, is_tester).iterator(
+            chunk_size=batch_size
         )
-        for i, row in enumerate(iw_contest_results):
-            rows[i].update(row)
-            # at this point, we have enough info to determine if user is "active"
-            rows[i]["is_active"] = (
-                rows[i]["dw_contest_count"] > 0
-                or rows[i]["iw_contest_count"] > 0
+        while True:
+            chunk, rows = write_rows(
+                itertools.islice(accounts, batch_size), days, survey_ids
             )
+            if not rows:
+                break
+            yield chunk, rows
+
+
+def shard_batches(job, pool, workers):
+    # Splits the accounts of an export job into shards of consecutive ids,
+    # of a batch each, queried and written by a pool of worker processes
+    # (see home.utils.processpool) kept by the run_export_jobs command.
+    # Formatting rows is what takes the time, and it runs in parallel. The
+    # shards are yielded in id order, as they complete, with a couple per
+    # worker queued ahead, so the chunks are those of serial_batches.
+    batch_size = settings.EXPORT_BATCH_SIZE
+    ids = list(
+        contest_users(job.contest, job.is_tester)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    shards = iter(
+        [
+            (ids[i], ids[min(i + batch_size, len(ids)) - 1])
+            for i in range(0, len(ids), batch_size)
+        ]
+    )
+    pending = collections.deque(
+        pool.submit(export_shard, job.pk, *shard)
+        for shard in itertools.islice(shards, workers * 2)
+    )
+    try:
+        while pending:
+            chunk, rows = pending.popleft().result()
+            for shard in itertools.islice(shards, 1):
+                pending.append(pool.submit(export_shard, job.pk, *shard))
+            yield chunk, rows
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# The export job a shard worker process last worked on (see export_shard)
+shard_export = {}
+
+
+def export_shard(job_id, first_id, last_id):
+    # Returns the CSV of the job's accounts with ids in the range, and the
+    # number of rows (in a shard worker process)
+    if shard_export.get("job_id") != job_id:
+        job = ExportJob.objects.select_related("contest").get(pk=job_id)
+        shard_export.update(
+            job_id=job_id,
+            accounts=contest_users_rows(job.contest, job.is_tester),
+            days=contest_days(job.contest),
+            survey_ids=job.survey_ids,
+        )
+    return write_rows(
+        shard_export["accounts"].filter(id__gte=first_id, id__lte=last_id),
+        shard_export["days"],
+        shard_export["survey_ids"],
+    )
 
-        # now add in every day of step data for each user
-        daily_walks = get_daily_walks(ids, contest)
-        rows_iter = iter(rows)
-        account = next(rows_iter)
-        for row in daily_walks:
-            while row["account_id"] != account["id"]:
-                account = next(rows_iter)
-            account[str(row["date"])] = row["steps"]
 
-        # finally, write it out to the CSV...!
-        writer.writerows(rows)
+def csv_response(chunks, filename):
+    # Streams the chunks as a CSV attachment
+    response = StreamingHttpResponse(chunks, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 
+def artifact_response(request, job):
+    # Serves the job's gzipped CSV as is to clients accepting gzip, and
+    # decompressed as it is read otherwise
+    path = job.storage().path(job.artifact)
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = FileResponse(open(path, "rb"), content_type="text/csv")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = StreamingHttpResponse(
+            gzip.open(path, "rb"), content_type="text/csv"
+        )
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["Content-Disposition"] = 'attachment; filename="users_agg.csv"'
+    return response
+
+
+def job_status(job):
+    status = {
+        "id": job.pk,
+        "contest_id": job.contest_id,
+        "is_tester": job.is_tester,
+        "status": job.status,
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+    }
+    if job.status == ExportJob.DONE:
+        status["url"] = reverse("home:export_job_download", args=[job.pk])
+    return status
+
+
+# Exports are compressed for clients accepting gzip, as they are streamed.
+#
+# With background=true, the export is queued for the run_export_jobs command
+# instead, and the job's status returned (202 until it is done). Its
+# progress can then be polled from api/export/jobs/<id>, and the export
+# downloaded once done. Either way, an export whose data hasn't changed since
+# a job wrote it is served from the job's artifact.
 @method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(gzip_page, name="dispatch")
 class ExportUsersView(View):
     http_method_names = ["get", "post"]
 
     def get(self, request, *args, **kwargs):
         contest_id = request.GET.get("contest_id", None)
         is_tester = request.GET.get("is_tester", None) == "true"
+        background = request.GET.get("background", None) == "true"
 
         if not contest_id:
             return HttpResponse(status=422)
         elif not request.user.is_authenticated:
             return HttpResponse(status=401)
 
-        try:
-            tmp_file = tempfile.NamedTemporaryFile(delete=False)
-            with open(tmp_file.name, "w") as file:
-                export_contest_users_data(file, contest_id, is_tester)
-            return FileResponse(
-                open(tmp_file.name, "rb"),
-                as_attachment=True,
-                filename="users_agg.csv",
-            )
-        finally:
-            os.remove(tmp_file.name)
+        return self.export(request, contest_id, is_tester, background)
 
     def post(self, request, *args, **kwargs):
         contest_id = request.POST.get("contest_id", None)
         is_tester = request.POST.get("is_tester", None) == "true"
+        background = request.POST.get("background", None) == "true"
 
         if not contest_id:
             return HttpResponse(status=422)
@@ -314,16 +418,78 @@ class ExportUsersView(View):
         email_col = int(request.POST.get("email", None))
         id_col = int(request.POST.get("id", None))
 
-        try:
-            tmp_file = tempfile.NamedTemporaryFile(delete=False)
-            with open(tmp_file.name, "w") as file:
-                export_contest_users_data(
-                    file, contest_id, is_tester, survey_file, email_col, id_col
-                )
-            return FileResponse(
-                open(tmp_file.name, "rb"),
-                as_attachment=True,
-                filename="users_agg.csv",
+        return self.export(
+            request,
+            contest_id,
+            is_tester,
+            background,
+            survey_file,
+            email_col,
+            id_col,
+        )
+
+    def export(
+        self,
+        request,
+        contest_id,
+        is_tester,
+        background,
+        survey_file=None,
+        email_col=None,
+        id_col=None,
+    ):
+        # The survey file and the contest are read right away, so the
+        # request can be answered with an error rather than a broken stream
+        survey_ids, survey_hash = read_survey_file(
+            survey_file, email_col, id_col
+        )
+        contest = Contest.objects.get(pk=contest_id)
+
+        if background:
+            job = ExportJob.enqueue(
+                contest.pk, is_tester, survey_ids, survey_hash
+            )
+            return JsonResponse(
+                job_status(job),
+                status=200 if job.status == ExportJob.DONE else 202,
             )
-        finally:
-            os.remove(tmp_file.name)
+
+        job = ExportJob.current(contest.pk, is_tester, survey_hash)
+        if job is not None and job.status == ExportJob.DONE:
+            if job.has_artifact():
+                return artifact_response(request, job)
+
+        return csv_response(
+            contest_users_csv(contest, is_tester, survey_ids),
+            "users_agg.csv",
+        )
+
+
+class ExportJobView(View):
+    http_method_names = ["get"]
+
+    def get(self, request, job_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+
+        job = ExportJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return HttpResponse(status=404)
+
+        return JsonResponse(job_status(job))
+
+
+class ExportJobDownloadView(View):
+    http_method_names = ["get"]
+
+    def get(self, request, job_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+
+        job = ExportJob.objects.filter(pk=job_id).first()
+        if job is None or job.status != ExportJob.DONE:
+            return HttpResponse(status=404)
+        elif not job.has_artifact():
+            return HttpResponse(status=404)
+
+        return artifact_response(request, job)
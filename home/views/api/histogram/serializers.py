@@ -1,4 +1,4 @@
-from datetime import date, datetime, time
+from datetime import date
 from rest_framework import serializers
 from django.db.models import (
     Max,
@@ -20,8 +20,8 @@ from home.models.dailywalk import DailyWalk
 from home.models.intentionalwalk import IntentionalWalk
 from home.models.leaderboard import Leaderboard
 from home.models.account import Account
+from home.models.accountconteststats import AccountContestStats
 from django.db import models as djmodel
-from django.utils.timezone import make_aware
 
 
 class ValidatedHistogramReq(TypedDict):
@@ -431,17 +431,28 @@ class HistogramReqSerializer(serializers.Serializer):
             # OR the date range.
 
             if contest:
-                # Attach time and timezone to the dates,
-                # because in the database, the dates are stored as
-                # date objects with no time and timezone.
-                # We'll use the beginning of the start_date day,
-                # and the end of the end_date day to capture all records
-                start_date = make_aware(
-                    datetime.combine(
-                        contest.start_baseline or contest.start, time.min
-                    )
-                )
-                end_date = make_aware(datetime.combine(contest.end, time.max))
+                # The accounts enrolled in the contest with any walk during
+                # its baseline or contest period, from their contest totals
+                #
+                # SQL equivalent:
+                # SELECT * FROM account WHERE id IN (
+                #     SELECT account_id FROM accountconteststats
+                #     WHERE contest_id = <contest_id> AND (
+                #         dw_contest_count > 0 OR dw_baseline_count > 0
+                #         OR iw_contest_count > 0 OR iw_baseline_count > 0
+                #     )
+                # )
+                kwargs = {
+                    "is_tester": is_tester,
+                    "id__in": AccountContestStats.objects.filter(
+                        Q(dw_contest_count__gt=0)
+                        | Q(dw_baseline_count__gt=0)
+                        | Q(iw_contest_count__gt=0)
+                        | Q(iw_baseline_count__gt=0),
+                        contest_id=contest.contest_id,
+                    ).values("account_id"),
+                }
+                return Q(**{k: v for k, v in kwargs.items() if v is not None})
 
             # SQL equivalent:
             # SELECT * FROM account WHERE id IN (
@@ -1,14 +1,25 @@
 import json
 
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
 from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
 from home.models import Device, IntentionalWalk
 
-from .utils import validate_request_json
+from .utils import (
+    coerce_float,
+    coerce_integer,
+    decode_cursor,
+    encode_cursor,
+    validate_request_json,
+)
+
+# Most walks returned per page of IntentionalWalkListView
+MAX_PAGE_SIZE = 1000
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -30,9 +41,8 @@ class IntentionalWalkView(View):
             return JsonResponse(json_status)
 
         # Get the device if already registered
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -53,9 +63,9 @@ class IntentionalWalkView(View):
             },
         }
 
-        # Loop through all the intentional walks
+        # Validate the whole batch before writing anything
+        intentional_walks = []
         for intentional_walk_data in json_data["intentional_walks"]:
-
             json_status = validate_request_json(
                 intentional_walk_data,
                 required_fields=[
@@ -69,31 +79,73 @@ class IntentionalWalkView(View):
             )
             if "status" in json_status and json_status["status"] == "error":
                 return JsonResponse(json_status)
-
+            intentional_walk = dict(intentional_walk_data)
+            for field in ("start", "end"):
+                try:
+                    value = parse_datetime(intentional_walk_data[field])
+                except (TypeError, ValueError):
+                    value = None
+                if value is None:
+                    return JsonResponse(
+                        {
+                            "status": "error",
+                            "message": (
+                                f"Invalid {field} "
+                                f"'{intentional_walk_data[field]}'"
+                                " in the request"
+                            ),
+                        }
+                    )
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                intentional_walk[field] = value
+            # Convert numbers sent as strings as the models would, and
+            # reject values that can't be, rather than failing the insert
             try:
-                intentional_walk = IntentionalWalk.objects.create(
-                    event_id=intentional_walk_data["event_id"],
-                    start=intentional_walk_data["start"],
-                    end=intentional_walk_data["end"],
-                    steps=intentional_walk_data["steps"],
-                    distance=intentional_walk_data["distance"],
-                    pause_time=intentional_walk_data["pause_time"],
-                    device=device,
+                intentional_walk["steps"] = coerce_integer(
+                    intentional_walk_data["steps"]
+                )
+                for field in ("distance", "pause_time"):
+                    intentional_walk[field] = coerce_float(
+                        intentional_walk_data[field]
+                    )
+            except (TypeError, ValueError):
+                return JsonResponse(
+                    {
+                        "status": "error",
+                        "message": (
+                            "Invalid steps, distance or pause_time for"
+                            f" '{intentional_walk_data['event_id']}'"
+                            " in the request"
+                        ),
+                    }
                 )
-                json_response["payload"]["intentional_walks"].append(
+            intentional_walks.append(intentional_walk)
+
+        # IntentionalWalk records are immutable, so walks that were already
+        # recorded are skipped
+        inserted = IntentionalWalk.insert_batch(
+            device.account_id, device.device_id, intentional_walks
+        )
+        payload = json_response["payload"]
+        payload["existing_event_ids"] = []
+        for intentional_walk_data in json_data["intentional_walks"]:
+            event_id = intentional_walk_data["event_id"]
+            if event_id in inserted:
+                # Only list an event_id repeated in the batch once
+                inserted.discard(event_id)
+                payload["intentional_walks"].append(
                     {
-                        "event_id": intentional_walk.event_id,
-                        "start": intentional_walk.start,
-                        "end": intentional_walk.end,
-                        "steps": intentional_walk.steps,
-                        "distance": intentional_walk.distance,
-                        "pause_time": intentional_walk.pause_time,
+                        "event_id": event_id,
+                        "start": intentional_walk_data["start"],
+                        "end": intentional_walk_data["end"],
+                        "steps": intentional_walk_data["steps"],
+                        "distance": intentional_walk_data["distance"],
+                        "pause_time": intentional_walk_data["pause_time"],
                     }
                 )
-            except Exception:
-                # IntentionalWalk records are immutable- so ignore any errors
-                # that might occur if the record already exists, etc...
-                pass
+            else:
+                payload["existing_event_ids"].append(event_id)
 
         return JsonResponse(json_response)
 
@@ -121,9 +173,8 @@ class IntentionalWalkListView(View):
             return JsonResponse(json_status)
 
         # Get the device if already registered
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -135,43 +186,71 @@ class IntentionalWalkListView(View):
                 }
             )
 
-        # Get walks from all the accounts tied to the email
-        intentional_walks = IntentionalWalk.objects.filter(
-            account=device.account
-        )
-
-        # Hacky serializer
-        total_steps = 0
-        total_walk_time = 0
-        total_pause_time = 0
-        total_distance = 0
-        intentional_walk_list = []
-        for intentional_walk in intentional_walks:
-            intentional_walk_list.append(
+        # Optional keyset pagination, newest walks first:
+        # limit: number of walks per page
+        # cursor: "next_cursor" of the previous page
+        limit = json_data.get("limit")
+        if limit is not None and (
+            type(limit) is not int or not 0 < limit <= MAX_PAGE_SIZE
+        ):
+            return JsonResponse(
                 {
-                    "event_id": intentional_walk.event_id,
-                    "start": intentional_walk.start,
-                    "end": intentional_walk.end,
-                    "steps": intentional_walk.steps,
-                    "distance": intentional_walk.distance,
-                    "walk_time": intentional_walk.walk_time,
-                    "pause_time": intentional_walk.pause_time,
+                    "status": "error",
+                    "message": f"limit must be between 1 and {MAX_PAGE_SIZE}",
                 }
             )
-            total_steps += intentional_walk.steps
-            total_walk_time += intentional_walk.walk_time
-            total_distance += intentional_walk.distance
-            total_pause_time += intentional_walk.pause_time
-        total_distance = round(total_distance, 6)
-        intentional_walk_list = sorted(
-            intentional_walk_list, key=lambda x: x["start"], reverse=True
+
+        # Get walks from all the accounts tied to the email
+        intentional_walks = IntentionalWalk.objects.filter(
+            account_id=device.account_id
+        ).order_by("-start", "-id")
+        if json_data.get("cursor"):
+            try:
+                start, walk_id = decode_cursor(json_data["cursor"])
+                start = parse_datetime(start)
+                if start is None or type(walk_id) is not int:
+                    raise ValueError(json_data["cursor"])
+            except (TypeError, ValueError):
+                return JsonResponse(
+                    {"status": "error", "message": "Invalid cursor"}
+                )
+            intentional_walks = intentional_walks.filter(
+                Q(start__lt=start) | Q(start=start, id__lt=walk_id)
+            )
+
+        # Fetch one more than a page to know if there is a next page
+        intentional_walks = intentional_walks.values(
+            "id",
+            "event_id",
+            "start",
+            "end",
+            "steps",
+            "distance",
+            "walk_time",
+            "pause_time",
         )
+        if limit is not None:
+            intentional_walks = intentional_walks[: limit + 1]
+        intentional_walk_list = list(intentional_walks)
+        next_cursor = None
+        if limit is not None and len(intentional_walk_list) > limit:
+            del intentional_walk_list[limit:]
+            last = intentional_walk_list[-1]
+            next_cursor = encode_cursor(
+                [last["start"].isoformat(), last["id"]]
+            )
+        for intentional_walk in intentional_walk_list:
+            del intentional_walk["id"]
+
+        # Totals over all of the account's walks
+        totals = IntentionalWalk.totals(device.account_id)
         payload = {
             "intentional_walks": intentional_walk_list,
-            "total_steps": total_steps,
-            "total_walk_time": total_walk_time,
-            "total_pause_time": total_pause_time,
-            "total_distance": total_distance,
+            "next_cursor": next_cursor,
+            "total_steps": totals["steps"],
+            "total_walk_time": totals["walk_time"],
+            "total_pause_time": totals["pause_time"],
+            "total_distance": round(totals["distance"], 6),
             "status": "success",
         }
 
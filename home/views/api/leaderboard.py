@@ -2,17 +2,13 @@ from django.http import HttpResponse, JsonResponse
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models.functions import Rank
-from django.db.models.expressions import Window
-from django.db.models import F
-from django.core.exceptions import ObjectDoesNotExist
 
 
 from home.models import (
     Contest,
     Device,
-    Leaderboard,
 )
+from home.models.leaderboard import LeaderboardRanking
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -47,10 +43,8 @@ class LeaderboardListView(View):
         # Validate request. If any field is missing,
         # send back the response message
         # Get the device if already registered
-        device = None
-        try:
-            device = Device.objects.get(device_id=device_id)
-        except ObjectDoesNotExist:
+        device = Device.resolve(device_id)
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -72,44 +66,34 @@ class LeaderboardListView(View):
             },
         }
 
-        leaderboard_list = []
         leaderboard_length = 10
-        leaderboard = (
-            Leaderboard.objects.filter(
-                contest_id=contest_id,
-                account__is_tester=device.account.is_tester,
-            )
-            .values("account_id", "steps")
-            .annotate(
-                rank=Window(expression=Rank(), order_by=F("steps").desc())
-            )
-        )
+        ranking = LeaderboardRanking.current(contest_id, device.is_tester)
 
         # get top 10
-        leaderboard_list = list(leaderboard[0:leaderboard_length])
+        leaderboard_list = [
+            {"account_id": account_id, "steps": steps, "rank": rank}
+            for account_id, steps, rank in ranking.top(leaderboard_length)
+        ]
 
         # Check if user should be added after top 10 displayed
         eleventh_place = True
         for user in leaderboard_list:
-            if user["account_id"] == device.account.id:
+            if user["account_id"] == device.account_id:
                 user["device_id"] = device_id
                 eleventh_place = False
                 break
 
         # If user not in top 10, add as 11th in list
-        if eleventh_place:
-            leaderboard = Leaderboard.objects.filter(
-                contest_id=contest_id, account=device.account
-            ).values("account_id", "steps")
-            if len(leaderboard) > 0:
-                user = leaderboard[0]
-                user["device_id"] = device_id
-                user["rank"] = Leaderboard.objects.filter(
-                    contest_id=contest_id,
-                    steps__gte=user["steps"],
-                    account__is_tester=device.account.is_tester,
-                ).count()
-                leaderboard_list.append(user)
+        steps = ranking.steps.get(device.account_id)
+        if eleventh_place and steps is not None:
+            leaderboard_list.append(
+                {
+                    "account_id": device.account_id,
+                    "steps": steps,
+                    "device_id": device_id,
+                    "rank": ranking.rank(steps),
+                }
+            )
 
         json_response["payload"]["leaderboard"] = leaderboard_list
 
@@ -8,15 +8,58 @@ it for further processing.
 
 from rest_framework import serializers
 from datetime import timedelta
-from home.models import Contest
+from home.models import Contest, DailyWalk, IntentionalWalk
+from home.views.api.utils import decode_cursor
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
 from django.db.models import (
+    BigIntegerField,
     BooleanField,
-    Count,
+    Case,
     ExpressionWrapper,
     F,
+    FloatField,
+    Func,
+    IntegerField,
+    OuterRef,
     Q,
-    Sum,
+    Subquery,
+    Value,
+    When,
 )
+from django.db.models.functions import Greatest, Upper
+
+
+def _account_stat(model, function, column, output_field):
+    """Correlated subquery of an aggregate of the walks of each account.
+
+    The aggregate is a plain function call rather than a Django aggregate,
+    so the subquery isn't grouped and returns a row (0 or NULL) even for an
+    account with no walks.
+    """
+    return Subquery(
+        model.objects.filter(account=OuterRef("pk"))
+        .order_by()
+        .annotate(
+            value=Func(F(column), function=function, output_field=output_field)
+        )
+        .values("value"),
+        output_field=output_field,
+    )
+
+
+def _contest_stat(kind, total):
+    """Total of the walks of each account during the contest, read from its
+    AccountContestStats row. Sums are NULL without walks, as they are when
+    aggregated from the walks themselves.
+    """
+    value = F(f"contest_stats__{kind}_contest_{total}")
+    if total == "count":
+        return value
+    return Case(
+        When(Q(**{f"contest_stats__{kind}_contest_count__gt": 0}), then=value),
+        default=None,
+    )
 
 
 class GetUsersReqSerializer(serializers.Serializer):
@@ -45,10 +88,32 @@ class GetUsersReqSerializer(serializers.Serializer):
         help_text="The page number to return. Defaults to 1.",
         default=1,
     )
+    cursor = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Cursor from the 'next' link of the previous page, to seek"
+        + " past its last row instead of counting rows to skip.",
+    )
+    count = serializers.ChoiceField(
+        choices=["estimate", "exact", "none"],
+        required=False,
+        default="estimate",
+        help_text="How to count the results for the X-Total-Count header and"
+        + " the 'last' link: 'exact', 'none', or 'estimate' (the default),"
+        + " which uses table statistics when nothing but is_tester filters.",
+    )
     query = serializers.CharField(
         required=False,
         help_text="Query string to filter for containment in the name or email.",
     )
+    search = serializers.ChoiceField(
+        choices=["contains", "ranked"],
+        required=False,
+        default="contains",
+        help_text="How to match the query: 'contains' (the default), or"
+        + " 'ranked' for names or emails starting with or similar to it,"
+        + " best matches first unless order_by is given.",
+    )
 
     def validate(self, data):
         """Validates and prepares the incoming request data.
@@ -58,19 +123,26 @@ class GetUsersReqSerializer(serializers.Serializer):
         contest_id = data.get("contest_id")
         is_tester = data.get("is_tester")
         order_by = data.get("order_by")
+        cursor = data.get("cursor")
         page = data.get("page") or 1
         per_page = 25
         query = data.get("query")
+        search = data.get("search") or "contains"
 
         # filter and annotate based on contest_id
-        filters, annotate, intentionalwalk_filter = None, None, None
+        filters, annotate = None, None
         if contest_id:
-            contest = Contest.objects.get(pk=contest_id)
-            dailywalk_filter = Q(
-                dailywalk__date__range=(contest.start, contest.end)
-            )
+            contest = Contest.calendar().get(contest_id)
+            if contest is None:
+                raise serializers.ValidationError(
+                    {
+                        "contest_id": f"Contest with id {contest_id} does not exist."
+                    }
+                )
 
-            filters = Q(contests__contest_id=contest_id)
+            # Accounts enrolled in the contest have a row of totals for it,
+            # so the stats come from the same join as the filter
+            filters = Q(contest_stats__contest_id=contest_id)
             annotate = {
                 "is_new": ExpressionWrapper(
                     Q(
@@ -79,65 +151,128 @@ class GetUsersReqSerializer(serializers.Serializer):
                     ),
                     output_field=BooleanField(),
                 ),
-                "dw_count": Count("dailywalk", filter=dailywalk_filter),
-                "dw_steps": Sum("dailywalk__steps", filter=dailywalk_filter),
-                "dw_distance": Sum(
-                    "dailywalk__distance", filter=dailywalk_filter
-                ),
+                "dw_count": _contest_stat("dw", "count"),
+                "dw_steps": _contest_stat("dw", "steps"),
+                "dw_distance": _contest_stat("dw", "distance"),
+                "iw_count": _contest_stat("iw", "count"),
+                "iw_steps": _contest_stat("iw", "steps"),
+                "iw_distance": _contest_stat("iw", "distance"),
+                "iw_time": _contest_stat("iw", "time"),
             }
-            intentionalwalk_filter = Q(
-                intentionalwalk__start__gte=contest.start,
-                intentionalwalk__start__lt=contest.end + timedelta(days=1),
-            )
         else:
+            # Each stat is a subquery over the account's own walks, instead
+            # of joins of both walk tables grouped by account, so neither
+            # fans out the other. Postgres only evaluates them for the rows
+            # of the page, unless the list is ordered (or seeks) by one of
+            # them.
             filters = Q()
             annotate = {
-                "dw_count": Count("dailywalk"),
-                "dw_steps": Sum("dailywalk__steps"),
-                "dw_distance": Sum("dailywalk__distance"),
+                "dw_count": _account_stat(
+                    DailyWalk, "COUNT", "id", IntegerField()
+                ),
+                "dw_steps": _account_stat(
+                    DailyWalk, "SUM", "steps", BigIntegerField()
+                ),
+                "dw_distance": _account_stat(
+                    DailyWalk, "SUM", "distance", FloatField()
+                ),
+                "iw_count": _account_stat(
+                    IntentionalWalk, "COUNT", "id", IntegerField()
+                ),
+                "iw_steps": _account_stat(
+                    IntentionalWalk, "SUM", "steps", BigIntegerField()
+                ),
+                "iw_distance": _account_stat(
+                    IntentionalWalk, "SUM", "distance", FloatField()
+                ),
+                "iw_time": _account_stat(
+                    IntentionalWalk, "SUM", "walk_time", FloatField()
+                ),
             }
-            intentionalwalk_filter = Q()
-
-        intentionalwalk_annotate = {
-            "iw_count": Count(
-                "intentionalwalk", filter=intentionalwalk_filter
-            ),
-            "iw_steps": Sum(
-                "intentionalwalk__steps", filter=intentionalwalk_filter
-            ),
-            "iw_distance": Sum(
-                "intentionalwalk__distance", filter=intentionalwalk_filter
-            ),
-            "iw_time": Sum(
-                "intentionalwalk__walk_time", filter=intentionalwalk_filter
-            ),
-        }
 
         # filter to show users vs testers
         filters &= Q(is_tester=is_tester)
 
-        # filter by search query
-        if query:
+        # filter by search query. The trigram indexes on UPPER(name) and
+        # UPPER(email) serve both the case insensitive lookups and the
+        # word similarity operator.
+        if query and search == "ranked":
+            prefix = Q(name__istartswith=query) | Q(email__istartswith=query)
+            filters &= (
+                prefix
+                | Q(TrigramWordSimilar(Upper("name"), query.upper()))
+                | Q(TrigramWordSimilar(Upper("email"), query.upper()))
+            )
+            # prefix matches first, then by how similar they are
+            annotate["rank"] = Case(
+                When(prefix, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ) + Greatest(
+                TrigramWordSimilarity(query.upper(), Upper("name")),
+                TrigramWordSimilarity(query.upper(), Upper("email")),
+            )
+            order_by = order_by or "-rank"
+        elif query:
             filters &= Q(Q(name__icontains=query) | Q(email__icontains=query))
 
-        # set ordering
+        # set ordering, with the id last so that every row has a unique
+        # sort key to seek past. Nulls sort last either way.
         order = []
+        order_field = None
+        desc = False
         if order_by:
             desc = order_by.startswith("-")
-            field = F(order_by[1:] if desc else order_by)
+            order_field = order_by[1:] if desc else order_by
+            field = F(order_field)
             order.append(
                 field.desc(nulls_last=True)
                 if desc
                 else field.asc(nulls_first=None)
             )
         order.append(F("name"))
+        order.append(F("id"))
+
+        # keyset pagination: the cursor is the sort key of the last row of
+        # the previous page, [order_by value, name, id]
+        seek = None
+        if cursor:
+            try:
+                values = decode_cursor(cursor)
+                if order_field:
+                    value, name, account_id = values
+                    if not (
+                        value is None or type(value) in (bool, int, float, str)
+                    ):
+                        raise ValueError(cursor)
+                else:
+                    name, account_id = values
+                if type(name) is not str or type(account_id) is not int:
+                    raise ValueError(cursor)
+            except ValueError:
+                raise serializers.ValidationError(
+                    {"cursor": f"Invalid cursor '{cursor}'."}
+                )
+            seek = Q(name__gt=name) | Q(name=name, id__gt=account_id)
+            if order_field and value is None:
+                seek = Q(**{f"{order_field}__isnull": True}) & seek
+            elif order_field:
+                seek = (
+                    Q(**{f"{order_field}__{'lt' if desc else 'gt'}": value})
+                    | Q(**{f"{order_field}__isnull": True})
+                    | (Q(**{order_field: value}) & seek)
+                )
 
         return {
             "annotate": annotate,
-            "intentionalwalk_annotate": intentionalwalk_annotate,
             "contest_id": contest_id,
+            "is_tester": bool(is_tester),
             "filters": filters,
             "order_by": order,
+            "order_field": order_field,
+            "seek": seek,
+            "count": data.get("count") or "estimate",
+            "filtered": bool(contest_id or query),
             "page": page,
             "per_page": per_page,
         }
@@ -1,32 +1,123 @@
+import base64
 import functools
+import hashlib
+import json
+import logging
 from math import ceil
-from typing import Any, Dict, List, Callable
+from typing import Any, Callable, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
 from django.http import HttpResponse
 from django.views import View
 
+from home.utils import dataversion, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def paginate(
+    request,
+    results,
+    page: int,
+    per_page: int,
+    count: Optional[int] = None,
+    seek: Optional[Q] = None,
+    cursor_for: Optional[Callable[[Dict[str, Any]], List[Any]]] = None,
+):
+    """Fetches a page of results and builds its RFC 5988 Link header
+
+    Pages are skipped to with OFFSET, or, when the request has a cursor, by
+    seeking past the last row of the previous page, so going to the next
+    page costs the same however deep it is. The "next" link always carries
+    the cursor of the last row of the page (and the number of the next
+    page, for display), while "first", "prev" and "last" go by page number.
+
+    Parameters
+    ----------
+    request
+        Request for the page, whose query parameters are kept in the links
+    results
+        Ordered queryset of all the results
+    page
+        Number of the page (from 1)
+    per_page
+        Number of results per page
+    count
+        Total number of results, if known. Without it there is no "last"
+        link.
+    seek
+        Filter for the results after the previous page, made from the
+        request's cursor
+    cursor_for
+        Function returning the cursor values (the sort key) of a result
+
+    Returns
+    -------
+        Results of the page, and the Link header value
+
+    """
+    # Fetch one more than a page to know if there is a next page
+    if seek is not None:
+        rows = list(results.filter(seek)[: per_page + 1])
+    else:
+        offset = (page - 1) * per_page
+        rows = list(results[offset : offset + per_page + 1])  # noqa: E203
+    has_next = len(rows) > per_page
+    del rows[per_page:]
 
-def paginate(request, results, page, per_page):
-    count = results.count()
-    pages_count = ceil(count / per_page)
     base_url = f"{request.scheme}://{request.get_host()}{request.path}"
     query = request.GET.copy()
+    query.pop("cursor", None)
     links = []
-    if page < pages_count:
+    if has_next:
         query["page"] = page + 1
+        if cursor_for is not None:
+            query["cursor"] = encode_cursor(cursor_for(rows[-1]))
         links.append(f'<{base_url}?{query.urlencode()}>; rel="next"')
-    if page < pages_count - 1:
-        query["page"] = pages_count
-        links.append(f'<{base_url}?{query.urlencode()}>; rel="last"')
+        query.pop("cursor", None)
+    if count is not None:
+        pages_count = ceil(count / per_page)
+        if page < pages_count - 1:
+            query["page"] = pages_count
+            links.append(f'<{base_url}?{query.urlencode()}>; rel="last"')
     if page > 2:
         query["page"] = 1
         links.append(f'<{base_url}?{query.urlencode()}>; rel="first"')
     if page > 1:
         query["page"] = page - 1
         links.append(f'<{base_url}?{query.urlencode()}>; rel="prev"')
-    return (
-        results[(page - 1) * per_page : page * per_page],  # noqa: E203
-        ", ".join(links),
-    )
+    return rows, ", ".join(links)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encodes the sort key of the last row on a page as an opaque cursor
+
+    Parameters
+    ----------
+    values
+        JSON serializable sort key values (e.g. an ISO timestamp and an id)
+
+    Returns
+    -------
+        URL-safe cursor string for the client to send back for the next page
+
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decodes a cursor made by encode_cursor
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (AttributeError, TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values
 
 
 def validate_request_json(
@@ -63,6 +154,42 @@ def validate_request_json(
     return response
 
 
+def coerce_integer(value: Any) -> int:
+    """Converts a number from a request to an int, the way the database
+    would have cast it
+
+    Accepts ints, floats (rounded) and strings of ints, e.g. 1000, 1000.0
+    and "1000".
+
+    Raises
+    ------
+    TypeError, ValueError
+        If the value can't be converted, e.g. None, True or "many"
+    """
+    if isinstance(value, bool):
+        raise TypeError(f"Not a number: {value!r}")
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise ValueError(f"Not a finite number: {value!r}")
+        return round(value)
+    return int(value)
+
+
+def coerce_float(value: Any) -> float:
+    """Converts a number from a request to a float
+
+    Accepts ints, floats and strings of numbers, e.g. 1, 1.3 and "1.3".
+
+    Raises
+    ------
+    TypeError, ValueError
+        If the value can't be converted, e.g. None, True or "far"
+    """
+    if isinstance(value, bool):
+        raise TypeError(f"Not a number: {value!r}")
+    return float(value)
+
+
 def require_authn(func: Callable[[View, Any, Any], HttpResponse]):
     """Decorator for Django View methods to require authn.
 
@@ -87,3 +214,66 @@ def require_authn(func: Callable[[View, Any, Any], HttpResponse]):
         return func(self, *args, **kwargs)
 
     return wrapper
+
+
+def cache_response(func: Callable[[View, Any, Any], HttpResponse]):
+    """Decorator for Django View methods to cache their responses.
+
+    Successful responses to authenticated users are cached by path, query
+    parameters (ignoring order and blank values) and the current data
+    version (see home.utils.dataversion), so a cached response is served
+    until the next write and never after it.
+
+    Parameters
+    ----------
+    func:
+        The View method to decorate.
+
+    Returns
+    -------
+        The decorated method.
+
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        request = self.request
+        if not request.user.is_authenticated:
+            return func(self, *args, **kwargs)
+
+        query = sorted(
+            (name, sorted(values))
+            for name, values in request.GET.lists()
+            if any(values)
+        )
+        digest = hashlib.md5(
+            repr((request.path, query)).encode(), usedforsecurity=False
+        ).hexdigest()
+        key = f"response:{dataversion.current()}:{digest}"
+
+        cached = cache.get(key)
+        if cached is None:
+            metrics.increment("response_cache.misses")
+            response = func(self, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    settings.RESPONSE_CACHE_TIMEOUT,
+                )
+        else:
+            metrics.increment("response_cache.hits")
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+
+        stats = metrics.snapshot("response_cache.")
+        hits = stats.get("response_cache.hits", 0)
+        total = hits + stats.get("response_cache.misses", 0)
+        logger.info(
+            f"Response cache {'miss' if cached is None else 'hit'}"
+            f" for {request.path} (hit rate {hits / total:.0%}"
+            f" of {total})"
+        )
+        return response
+
+    return wrapper
@@ -46,10 +46,8 @@ class WeeklyGoalCreateView(View):
             return JsonResponse(json_status)
 
         # Get the device
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-            account = device.account
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -66,7 +64,7 @@ class WeeklyGoalCreateView(View):
             "status": "success",
             "message": "WeeklyGoal saved successfully",
             "payload": {
-                "account_id": account.id,
+                "account_id": device.account_id,
                 "weekly_goal": {},
             },
         }
@@ -84,7 +82,7 @@ class WeeklyGoalCreateView(View):
         # update the entry.
         try:
             weekly_goal = WeeklyGoal.objects.get(
-                account=account,
+                account_id=device.account_id,
                 start_of_week=start_of_week_update,
             )
             weekly_goal.steps = steps_update
@@ -96,7 +94,7 @@ class WeeklyGoalCreateView(View):
                 start_of_week=start_of_week_update,
                 steps=steps_update,
                 days=days_update,
-                account=account,
+                account_id=device.account_id,
             )
 
         # Update the json object
@@ -133,10 +131,8 @@ class WeeklyGoalsListView(View):
             return JsonResponse(json_status)
 
         # Get the account
-        try:
-            device = Device.objects.get(device_id=json_data["account_id"])
-            account = device.account
-        except ObjectDoesNotExist:
+        device = Device.resolve(json_data["account_id"])
+        if device is None:
             return JsonResponse(
                 {
                     "status": "error",
@@ -157,7 +153,7 @@ class WeeklyGoalsListView(View):
 
         # Get weekly goals tied to this account
         weekly_goals = list(
-            WeeklyGoal.objects.filter(account=account).values()
+            WeeklyGoal.objects.filter(account_id=device.account_id).values()
         )
         """ for goal in weekly_goals:
             goal = model_to_dict(goal) """
@@ -1,10 +1,10 @@
 import datetime
-import itertools
 
 from django.views import generic
 
-from home.models import Account, DailyWalk
+from home.models import Account, DailyStats
 from home.templatetags.format_helpers import m_to_mi
+from home.utils.series import GRANULARITIES
 
 # Date range for data aggregation
 DEFAULT_START_DATE = datetime.date(2020, 4, 1)
@@ -39,80 +39,31 @@ class HomeView(generic.TemplateView):
         # Save the total number of users
         context["accounts"] = all_accounts.values()
 
-        # Get signups per day
-        signup_dist = {
-            date: len(list(group))
-            for date, group in itertools.groupby(
-                all_accounts.values(), key=lambda x: x["created"].date()
-            )
-        }
-
-        # Fill the gaps cos google charts is annoying af
-        current_date = start_date
-        delta = datetime.timedelta(days=1)
+        # Get signups, steps and miles per day (week, month), with every
+        # day of the range filled in for the charts
+        granularity = self.request.GET.get("granularity")
+        series = DailyStats.series(
+            None,
+            start_date,
+            end_date,
+            granularity=granularity if granularity in GRANULARITIES else "day",
+        )
         context["daily_signups"] = []
-        # Iterate over the entire date range
-        while current_date <= end_date:
-            context["daily_signups"].append(
-                [current_date, signup_dist.get(current_date, 0)]
-            )
-            current_date += delta
-        # Get cumulative distribution
         context["cumu_signups"] = []
-        total = 0
-        for date, count in context["daily_signups"]:
-            total += count
-            context["cumu_signups"].append([date, total])
-
-        # Save the total number of daily walks over time
-        daily_walks = DailyWalk.objects.all().values()
-        # Get walks per day
-        step_dist = {
-            date: sum([walk["steps"] for walk in group])
-            for date, group in itertools.groupby(
-                daily_walks.values(), key=lambda x: x["date"]
-            )
-        }
-        # Fill the gaps cos google charts is annoying af
-        current_date = start_date
-        delta = datetime.timedelta(days=1)
         context["daily_steps"] = []
-        # Iterate over the entire date range
-        while current_date <= end_date:
-            context["daily_steps"].append(
-                [current_date, step_dist.get(current_date, 0)]
-            )
-            current_date += delta
         context["cumu_steps"] = []
-        total_steps = 0
-        for date, steps in context["daily_steps"]:
-            total_steps += steps
-            context["cumu_steps"].append([date, total_steps])
-        context["total_steps"] = total_steps
-
-        # Get growth for mile
-        mile_dist = {
-            date: sum([m_to_mi(walk["distance"]) for walk in group])
-            for date, group in itertools.groupby(
-                daily_walks.values(), key=lambda x: x["date"]
-            )
-        }
-        # Fill the gaps cos google charts if annoying af
-        current_date = start_date
-        delta = datetime.timedelta(days=1)
         context["daily_miles"] = []
-        # Iterate over the entire date range
-        while current_date <= end_date:
-            context["daily_miles"].append(
-                [current_date, mile_dist.get(current_date, 0)]
-            )
-            current_date += delta
         context["cumu_miles"] = []
-        total_miles = 0
-        for date, mile in context["daily_miles"]:
-            total_miles += mile
-            context["cumu_miles"].append([date, total_miles])
-        context["total_miles"] = total_miles
+        for date, sums, totals in series:
+            context["daily_signups"].append([date, sums["signups"]])
+            context["cumu_signups"].append([date, totals["signups"]])
+            context["daily_steps"].append([date, sums["steps"]])
+            context["cumu_steps"].append([date, totals["steps"]])
+            context["daily_miles"].append([date, m_to_mi(sums["distance"])])
+            context["cumu_miles"].append([date, m_to_mi(totals["distance"])])
+        totals = series[-1][2] if series else {"steps": 0, "distance": 0}
+        context["total_steps"] = totals["steps"]
+        context["total_miles"] = m_to_mi(totals["distance"])
 
         context["start_date"] = start_date
         context["end_date"] = end_date
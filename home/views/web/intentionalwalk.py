@@ -1,11 +1,11 @@
 import datetime
-import itertools
 
 from django.db.models import Sum
 from django.views import generic
 
 from home.models import Account, DailyWalk, IntentionalWalk
 from home.templatetags.format_helpers import m_to_mi
+from home.utils.series import GRANULARITIES, dense_series
 
 # Date range for data aggregation
 DEFAULT_START_DATE = datetime.date(2020, 4, 1)
@@ -37,56 +37,46 @@ class IntentionalWalkWebView(generic.ListView):
         # Get aggregate stats for all users
         all_accounts = Account.objects.all().order_by("created")
 
-        # Get recorded walks per day
-        recorded_walks = IntentionalWalk.objects.all().values()
-        recorded_walks_stats = {}
-        for date, group in itertools.groupby(
-            recorded_walks, key=lambda x: x["start"].date()
-        ):
-            recorded_walks_stats[date] = {
-                "count": 0,
-                "steps": 0,
-                "time": 0,
-                "miles": 0,
-            }
-            for obj in group:
-                recorded_walks_stats[date]["count"] += 1  # Update count
-                recorded_walks_stats[date]["steps"] += obj[
-                    "steps"
-                ]  # Update count
-                recorded_walks_stats[date]["time"] += (
-                    obj["end"] - obj["start"]
-                ).total_seconds() - obj["pause_time"]
-                recorded_walks_stats[date]["miles"] += m_to_mi(
-                    obj["distance"]
-                )  # Update count
-
-        # Fill the gaps cos google charts if annoying af
-        current_date = start_date
-        delta = datetime.timedelta(days=1)
+        # Get recorded walks per day (week, month), with every day of the
+        # range filled in for the charts
+        granularity = self.request.GET.get("granularity")
+        series = dense_series(
+            """
+            SELECT ("start" AT TIME ZONE %(tz)s)::date AS "date",
+                   1 AS "count",
+                   "steps",
+                   EXTRACT(EPOCH FROM "end" - "start") - "pause_time"
+                       AS "time",
+                   "distance"
+            FROM "home_intentionalwalk"
+            WHERE "start" >= %(start_date)s::timestamp AT TIME ZONE %(tz)s
+              AND "start" < (%(end_date)s::date + 1)::timestamp
+                            AT TIME ZONE %(tz)s
+            """,
+            {
+                "count": "bigint",
+                "steps": "bigint",
+                "time": "float",
+                "distance": "float",
+            },
+            start_date=start_date,
+            end_date=end_date,
+            granularity=granularity if granularity in GRANULARITIES else "day",
+        )
         context["daily_recorded_walks_stats"] = []
-        # Iterate over the entire date range
-        while current_date <= end_date:
-            context["daily_recorded_walks_stats"].append(
-                [
-                    current_date,
-                    recorded_walks_stats.get(
-                        current_date,
-                        {"count": 0, "steps": 0, "time": 0, "miles": 0},
-                    ),
-                ]
-            )
-            current_date += delta
         context["cumu_recorded_walks_stats"] = []
-        total = {"count": 0, "steps": 0, "time": 0, "miles": 0}
-        for date, stat_obj in context["daily_recorded_walks_stats"]:
-            # NOTE: Counters represent 0 counts as an empty dict and wont
-            # guarantee keys existence
-            total["count"] += stat_obj["count"]
-            total["steps"] += stat_obj["steps"]
-            total["time"] += stat_obj["time"]
-            total["miles"] += stat_obj["miles"]
-            context["cumu_recorded_walks_stats"].append([date, dict(total)])
+        for date, sums, totals in series:
+            for stats, key in [
+                (sums, "daily_recorded_walks_stats"),
+                (totals, "cumu_recorded_walks_stats"),
+            ]:
+                stats["miles"] = m_to_mi(stats.pop("distance"))
+                context[key].append([date, stats])
+        total = (
+            dict(series[-1][2])
+            if series
+            else {"count": 0, "steps": 0, "time": 0, "miles": 0}
+        )
         context["total_iw_stats"] = total
         context["total_iw_stats"]["time"] = int(
             context["total_iw_stats"]["time"] / 3600
@@ -171,6 +171,13 @@ class UserListView(generic.ListView):
             Contest.objects.get(contest_id=contest_id) if contest_id else None
         )
         daily_walks, intentional_walks, _, _ = get_contest_walks(contest)
+        # The accounts of the walk summaries, in one query
+        accounts = {
+            account["email"]: account
+            for account in Account.objects.values(*ACCOUNT_FIELDS).filter(
+                email__in=list(daily_walks)
+            )
+        }
 
         # Prepare loading of data into context
         user_stats_container = {}
@@ -199,9 +206,9 @@ class UserListView(generic.ListView):
 
         # Add all accounts found in filtered daily walk data
         for email, dw_row in daily_walks.items():
-            acct = Account.objects.values(*ACCOUNT_FIELDS).get(
-                email__iexact=email
-            )
+            acct = accounts.get(email) or Account.objects.values(
+                *ACCOUNT_FIELDS
+            ).get(email__iexact=email)
 
             # Skip testers unless include_testers
             if not include_testers and acct.get("is_tester"):
@@ -0,0 +1,87 @@
+"""
+Benchmark the admin dashboard endpoints (api/admin/home/...).
+
+Measures latency of the home totals and each chart for a year of daily
+walks from N accounts, loaded straight into the database.
+
+    $ python scripts/benchmarks/admin_home.py [--accounts N]
+"""
+
+import argparse
+from datetime import date, timedelta
+from io import StringIO
+
+from harness import measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+
+def run(accounts, days, repeat):
+    start = date.today() - timedelta(days=days)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com', 'Bench ' || n, '94102',
+                   40, n %% 50 = 0, TRUE, '{}',
+                   %s::date + (n %% %s) * interval '1 day',
+                   now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [start, days, accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start, days],
+        )
+        cursor.execute("ANALYZE")
+    call_command("rebuild_dailystats", stdout=StringIO())
+
+    User.objects.create_user(username="bench", password="bench")
+    client = Client()
+    client.login(username="bench", password="bench")
+    params = f"start_date={start}&end_date={date.today()}"
+
+    rows = []
+    for url in [
+        "/api/admin/home",
+        f"/api/admin/home/users/daily?{params}",
+        f"/api/admin/home/users/cumulative?{params}",
+        f"/api/admin/home/steps/daily?{params}",
+        f"/api/admin/home/steps/cumulative?{params}",
+        f"/api/admin/home/distance/daily?{params}",
+        f"/api/admin/home/distance/cumulative?{params}",
+    ]:
+        ms, queries = measure(lambda: client.get(url).json(), repeat=repeat)
+        rows.append([url.split("?")[0], queries, f"{ms:.1f}"])
+    report(rows, ["endpoint", "queries", "median ms"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=10000, help="Accounts walking"
+    )
+    p.add_argument("--days", type=int, default=365, help="Days of walks")
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.repeat)
@@ -0,0 +1,92 @@
+"""
+Benchmark the admin user list (api/admin/users).
+
+Measures latency of the first page, a deep page reached by page number and
+the page after it reached through the "next" link's cursor, sorting by a
+stat, and name/email searches, for N accounts with a month of daily walks
+each, loaded straight into the database.
+
+    $ python scripts/benchmarks/admin_users.py [--accounts N]
+"""
+
+import argparse
+import re
+from datetime import date, timedelta
+
+from harness import measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+
+
+def run(accounts, days, repeat):
+    start = date.today() - timedelta(days=days)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com',
+                   'Bench ' || md5(n::text) || ' ' || n, '94102',
+                   20 + n %% 50, n %% 50 = 0, TRUE, '{}', now(), now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start, days],
+        )
+        cursor.execute("ANALYZE")
+
+    User.objects.create_user(username="bench", password="bench")
+    client = Client()
+    client.login(username="bench", password="bench")
+
+    # The page after a deep one, through the cursor of its "next" link
+    deep = accounts // 2 // 25
+    link = client.get(f"/api/admin/users?page={deep}")["Link"]
+    next_url = re.search(r'<([^>]+)>; rel="next"', link)[1]
+
+    rows = []
+    for name, url in [
+        ("first page", "/api/admin/users"),
+        (f"page {deep + 1} by number", f"/api/admin/users?page={deep + 1}"),
+        (f"page {deep + 1} by cursor", next_url),
+        ("by dw_steps", "/api/admin/users?order_by=-dw_steps"),
+        ("search contains", "/api/admin/users?query=bench12345@"),
+        (
+            "search ranked",
+            "/api/admin/users?query=bench12345&search=ranked",
+        ),
+    ]:
+        ms, queries = measure(lambda: client.get(url).json(), repeat=repeat)
+        rows.append([name, queries, f"{ms:.1f}"])
+    report(rows, ["request", "queries", "median ms"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=100000, help="Accounts walking"
+    )
+    p.add_argument("--days", type=int, default=30, help="Days of walks")
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.repeat)
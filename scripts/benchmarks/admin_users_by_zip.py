@@ -0,0 +1,118 @@
+"""
+Benchmark the admin active users by zip endpoint
+(api/admin/users/zip/active).
+
+Every one of N accounts in a contest is a heavy recorder: a daily walk for
+each day of the contest and several intentional walks a day, loaded
+straight into the database. Joining both kinds of walks to the accounts
+produces (daily walks x intentional walks) rows per account.
+
+    $ python scripts/benchmarks/admin_users_by_zip.py [--accounts N]
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from harness import measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+
+from home.models import Contest
+
+
+def run(accounts, days, walks, repeat):
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    contest = Contest.objects.create(
+        start_promo=start,
+        start=start,
+        end=end,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com', 'Bench ' || n,
+                   (94102 + n %% 30)::text, 40, FALSE, TRUE, '{}',
+                   %s::date + (n %% %s) * interval '1 day', now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [start - timedelta(days=days), days * 2, accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_account_contests (account_id, contest_id)
+            SELECT id, %s FROM home_account
+            """,
+            [contest.pk],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start, days],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_intentionalwalk
+                (event_id, start, "end", steps, pause_time, walk_time,
+                 distance, device_id, account_id, created)
+            SELECT 'bench-' || home_account.id || '-' || w,
+                   %s::date + w * (%s::float / %s) * interval '1 day',
+                   %s::date + w * (%s::float / %s) * interval '1 day'
+                       + interval '30 minutes',
+                   3000, 0, 1800, 2400,
+                   'bench-' || home_account.id, home_account.id, now()
+            FROM home_account, generate_series(0, %s - 1) AS w
+            """,
+            [start, days, walks, start, days, walks, walks],
+        )
+        cursor.execute("ANALYZE")
+
+    User.objects.create_user(username="bench", password="bench")
+    client = Client()
+    client.login(username="bench", password="bench")
+
+    url = f"/api/admin/users/zip/active?contest_id={contest.pk}"
+    # Responses are cached until the next write, time the query each run
+    ms, queries = measure(
+        lambda: client.get(url).json(), repeat=repeat, setup=cache.clear
+    )
+    report(
+        [[url.split("?")[0], queries, f"{ms:.1f}"]],
+        ["endpoint", "queries", "median ms"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=2000, help="Accounts walking"
+    )
+    p.add_argument("--days", type=int, default=30, help="Days of contest")
+    p.add_argument(
+        "--walks",
+        type=int,
+        default=60,
+        help="Intentional walks per account during the contest",
+    )
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.walks, args.repeat)
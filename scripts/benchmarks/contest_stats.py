@@ -0,0 +1,131 @@
+"""
+Benchmark the endpoints reading accounts' contest totals: the admin user
+list of a contest, the median steps by zip, the age histogram of a contest,
+the contest export and the legacy user list page.
+
+N accounts are enrolled in a contest, with a daily walk for each day of the
+baseline and contest periods and a recorded walk every other day, loaded
+straight into the database. The time to rebuild the totals from scratch is
+reported too.
+
+    $ python scripts/benchmarks/contest_stats.py [--accounts N]
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from io import StringIO
+
+from harness import measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from home.models import Contest
+
+
+def run(accounts, days, repeat):
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    start_baseline = start - timedelta(days=days)
+    contest = Contest.objects.create(
+        start_baseline=start_baseline,
+        start_promo=start,
+        start=start,
+        end=end,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com', 'Bench ' || n,
+                   (94102 + n %% 30)::text, 20 + n %% 50, FALSE, TRUE, '{}',
+                   now(), now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_account_contests (account_id, contest_id)
+            SELECT id, %s FROM home_account
+            """,
+            [contest.pk],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start_baseline, days * 2],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_intentionalwalk
+                (event_id, start, "end", steps, pause_time, walk_time,
+                 distance, device_id, account_id, created)
+            SELECT 'bench-' || home_account.id || '-' || d,
+                   %s::date + d + interval '10 hours',
+                   %s::date + d + interval '10 hours 30 minutes',
+                   3000, 0, 1800, 2400,
+                   'bench-' || home_account.id, home_account.id, now()
+            FROM home_account, generate_series(0, %s - 1, 2) AS d
+            """,
+            [start_baseline, start_baseline, days * 2],
+        )
+    started = time.perf_counter()
+    call_command("rebuild_contest_stats", stdout=StringIO())
+    rebuild_ms = (time.perf_counter() - started) * 1000
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    User.objects.create_user(username="bench", password="bench")
+    client = Client()
+    client.login(username="bench", password="bench")
+
+    rows = [["rebuild_contest_stats", "", f"{rebuild_ms:.1f}"]]
+    for url in [
+        f"/api/admin/users?contest_id={contest.pk}&order_by=-dw_steps",
+        f"/api/admin/users/zip/steps?contest_id={contest.pk}",
+        f"/api/admin/users/histogram?field=age&bin_size=10"
+        f"&contest_id={contest.pk}",
+        f"/api/export/users?contest_id={contest.pk}",
+        f"/users/?contest_id={contest.pk}",
+    ]:
+        # Responses are cached until the next write, time the query each run
+        ms, queries = measure(
+            lambda: client.get(url).getvalue(),
+            repeat=repeat,
+            setup=cache.clear,
+        )
+        rows.append([url.split("?")[0], queries, f"{ms:.1f}"])
+    report(rows, ["endpoint", "queries", "median ms"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=5000, help="Accounts in the contest"
+    )
+    p.add_argument(
+        "--days", type=int, default=30, help="Days of contest and baseline"
+    )
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.repeat)
@@ -0,0 +1,81 @@
+"""
+Benchmark the daily walk sync endpoint (api/dailywalk/create).
+
+Measures round trips and latency for a first sync (all inserts) and a resync
+(the app resending the same history) of 30 and 365 days, with a contest
+covering the most recent days so the leaderboard path is exercised too.
+
+    $ python scripts/benchmarks/dailywalk_create.py [--repeat N]
+"""
+
+import argparse
+import json
+from datetime import date, timedelta
+
+from harness import measure, report, test_database
+
+from django.test import Client
+
+from home.models import Contest, DailyWalk
+
+
+def walks(days, end, steps=1000):
+    return [
+        {
+            "date": str(end - timedelta(days=n)),
+            "steps": steps + n,
+            "distance": (steps + n) * 0.8,
+        }
+        for n in range(days)
+    ]
+
+
+def run(repeat):
+    client = Client()
+    end = date.today()
+    Contest.objects.create(
+        start_baseline=end - timedelta(days=30),
+        start_promo=end - timedelta(days=14),
+        start=end - timedelta(days=7),
+        end=end + timedelta(days=7),
+    )
+    client.post(
+        "/api/appuser/create",
+        data={
+            "name": "Bench Mark",
+            "email": "bench@example.com",
+            "zip": "94102",
+            "age": 40,
+            "account_id": "bench-device",
+        },
+        content_type="application/json",
+    )
+
+    def post(days):
+        body = json.dumps(
+            {"account_id": "bench-device", "daily_walks": walks(days, end)}
+        )
+        response = client.post(
+            "/api/dailywalk/create", data=body, content_type="application/json"
+        )
+        assert response.json()["status"] == "success", response.content
+
+    rows = []
+    for days in (30, 365):
+        ms, queries = measure(
+            lambda: post(days),
+            repeat=repeat,
+            setup=lambda: DailyWalk.objects.all().delete(),
+        )
+        rows.append([days, "first sync", queries, f"{ms:.1f}"])
+        ms, queries = measure(lambda: post(days), repeat=repeat)
+        rows.append([days, "resync", queries, f"{ms:.1f}"])
+    report(rows, ["days", "request", "queries", "median ms"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.repeat)
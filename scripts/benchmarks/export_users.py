@@ -0,0 +1,135 @@
+"""
+Benchmark the contest export (api/export/users).
+
+Measures the time to the first chunk of the response, the time to the last
+one and the peak Python memory allocated while serving it, plain and
+gzipped, for N accounts enrolled in a contest with a daily walk for each day
+of its baseline and contest periods, loaded straight into the database.
+
+    $ python scripts/benchmarks/export_users.py [--accounts N]
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from io import StringIO
+
+from harness import report, test_database
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from home.models import Contest
+
+
+def run(accounts, days, repeat):
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    start_baseline = start - timedelta(days=days)
+    contest = Contest.objects.create(
+        start_baseline=start_baseline,
+        start_promo=start,
+        start=start,
+        end=end,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com', 'Bench ' || n,
+                   (94102 + n %% 30)::text, 20 + n %% 50, FALSE, TRUE, '{}',
+                   now(), now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_account_contests (account_id, contest_id)
+            SELECT id, %s FROM home_account
+            """,
+            [contest.pk],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start_baseline, days * 2],
+        )
+    call_command("rebuild_contest_stats", stdout=StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    User.objects.create_user(username="bench", password="bench")
+    client = Client()
+    client.login(username="bench", password="bench")
+    url = f"/api/export/users?contest_id={contest.pk}"
+
+    rows = []
+    for name, headers in [
+        ("plain", {}),
+        ("gzip", {"HTTP_ACCEPT_ENCODING": "gzip"}),
+    ]:
+        first, last = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            first.append((time.perf_counter() - started) * 1000)
+            for chunk in chunks:
+                pass
+            last.append((time.perf_counter() - started) * 1000)
+            response.close()
+
+        # Once more for the memory, as tracing slows everything down
+        tracemalloc.start()
+        response = client.get(url, **headers)
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        response.close()
+        rows.append(
+            [
+                name,
+                f"{statistics.median(first):.1f}",
+                f"{statistics.median(last):.1f}",
+                f"{peak / 2**20:.1f}",
+                f"{size / 2**20:.1f}",
+            ]
+        )
+    report(
+        rows,
+        ["response", "first chunk ms", "last chunk ms", "peak MiB", "MiB"],
+    )
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=5000, help="Accounts in the contest"
+    )
+    p.add_argument(
+        "--days", type=int, default=30, help="Days of contest and baseline"
+    )
+    p.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.repeat)
@@ -0,0 +1,143 @@
+"""
+Benchmark the contest export job with its batches formatted by 1, 2, 4 and
+8 worker processes (run_export_jobs --workers).
+
+N accounts are enrolled in a contest, with a daily walk for each day of its
+baseline and contest periods, loaded straight into the database. The time
+to the last chunk of the export and the speedup over a single process are
+reported. The command keeps its pool across jobs, so the time to start the
+pool is reported separately.
+
+    $ python scripts/benchmarks/export_workers.py [--accounts N]
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import date, timedelta
+from io import StringIO
+
+from harness import report, test_database
+
+from django.core.management import call_command
+from django.db import connection
+
+from home.models import Contest, ExportJob
+from home.utils.processpool import django_process_pool
+from home.views.api.export import contest_users_csv, shard_batches
+
+
+def run(accounts, days, workers, repeat):
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    start_baseline = start - timedelta(days=days)
+    contest = Contest.objects.create(
+        start_baseline=start_baseline,
+        start_promo=start,
+        start=start,
+        end=end,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO home_account
+                (email, name, zip, age, is_tester, is_sf_resident,
+                 race, created, updated)
+            SELECT 'bench' || n || '@example.com', 'Bench ' || n,
+                   (94102 + n %% 30)::text, 20 + n %% 50, FALSE, TRUE, '{}',
+                   now(), now()
+            FROM generate_series(1, %s) AS n
+            """,
+            [accounts],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_account_contests (account_id, contest_id)
+            SELECT id, %s FROM home_account
+            """,
+            [contest.pk],
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_device (device_id, account_id, created)
+            SELECT 'bench-' || id, id, now() FROM home_account
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO home_dailywalk
+                (date, steps, distance, device_id, account_id, created,
+                 updated)
+            SELECT %s::date + d, (random() * 20000)::int, random() * 16000,
+                   'bench-' || home_account.id, home_account.id, now(), now()
+            FROM home_account, generate_series(0, %s - 1) AS d
+            """,
+            [start_baseline, days * 2],
+        )
+    call_command("rebuild_contest_stats", stdout=StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    job = ExportJob.enqueue(contest.pk, False)
+
+    rows = []
+    serial = None
+    for n in workers:
+        pool = None
+        started_ms = 0
+        if n > 1:
+            started = time.perf_counter()
+            pool = django_process_pool(n)
+            # Workers are started on demand, have them all start
+            for future in [pool.submit(os.getpid) for _ in range(n)]:
+                future.result()
+            started_ms = (time.perf_counter() - started) * 1000
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            batches = None
+            if pool is not None:
+                batches = shard_batches(job, pool, n)
+            size = sum(
+                len(chunk)
+                for chunk in contest_users_csv(
+                    contest, False, {}, batches=batches
+                )
+            )
+            timings.append(time.perf_counter() - started)
+        if pool is not None:
+            pool.shutdown()
+        seconds = statistics.median(timings)
+        serial = serial or seconds
+        rows.append(
+            [
+                n,
+                f"{started_ms:.0f}",
+                f"{seconds:.2f}",
+                f"{serial / seconds:.2f}x",
+                f"{size / 2**20:.1f}",
+            ]
+        )
+    report(rows, ["workers", "pool start ms", "seconds", "speedup", "MiB"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--accounts", type=int, default=100000, help="Accounts in the contest"
+    )
+    p.add_argument(
+        "--days", type=int, default=30, help="Days of contest and baseline"
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Worker processes to compare",
+    )
+    p.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.accounts, args.days, args.workers, args.repeat)
@@ -0,0 +1,76 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Each benchmark runs against a throwaway test database (created next to the
+one configured by DATABASE_URL and dropped afterwards), so it is safe to run
+against a development environment:
+
+    $ python scripts/benchmarks/dailywalk_create.py
+
+Timings are wall clock and include the full Django request cycle when a
+benchmark goes through the test client.
+"""
+
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+
+# Make the project importable when run as `python scripts/benchmarks/<x>.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """Creates (and afterwards destroys) a migrated test database"""
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(
+            old_name, verbosity=0, keepdb=keepdb
+        )
+        teardown_test_environment()
+
+
+def measure(func, repeat=5, setup=None):
+    """Runs func `repeat` times, returning (median ms, queries per run)
+
+    If given, `setup` is called (untimed) before every run.
+    """
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        # The query log is bounded, start each run from an empty one
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(captured.captured_queries)
+    return statistics.median(timings), queries
+
+
+def report(rows, headers):
+    """Prints rows as a simple aligned table"""
+    table = [headers] + [[str(col) for col in row] for row in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(headers))]
+    for row in table:
+        print("  ".join(col.rjust(widths[i]) for i, col in enumerate(row)))
@@ -0,0 +1,95 @@
+"""
+Benchmark the leaderboard endpoint (api/leaderboard/get).
+
+Measures latency for a caller in the top 10 and one near the bottom of a
+contest with 50k participants, with the contest's ranking already cached
+in the process (warm) and rebuilt on every request (cold).
+
+    $ python scripts/benchmarks/leaderboard_get.py [--participants N]
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from harness import measure, report, test_database
+
+from django.test import Client
+
+from home.models import Account, Contest, Device, Leaderboard
+from home.models.leaderboard import LeaderboardRanking
+
+
+def run(participants, repeat):
+    end = date.today() + timedelta(days=7)
+    contest = Contest.objects.create(
+        start_baseline=end - timedelta(days=60),
+        start_promo=end - timedelta(days=30),
+        start=end - timedelta(days=28),
+        end=end,
+    )
+    accounts = Account.objects.bulk_create(
+        Account(
+            email=f"bench{n}@example.com",
+            name=f"Bench {n}",
+            zip="94102",
+            age=40,
+        )
+        for n in range(participants)
+    )
+    devices = Device.objects.bulk_create(
+        Device(device_id=f"bench-{n}", account=account)
+        for n, account in enumerate(accounts)
+    )
+    rng = random.Random(0)
+    Leaderboard.objects.bulk_create(
+        Leaderboard(
+            account=account,
+            device=device,
+            contest=contest,
+            steps=rng.randrange(0, 300000),
+        )
+        for account, device in zip(accounts, devices)
+    )
+    by_steps = list(
+        Leaderboard.objects.filter(contest=contest)
+        .order_by("-steps")
+        .values_list("device_id", flat=True)
+    )
+
+    client = Client()
+
+    def get(device_id):
+        response = client.get(
+            "/api/leaderboard/get/",
+            {"contest_id": contest.contest_id, "device_id": device_id},
+        )
+        assert response.json()["status"] == "success", response.content
+
+    rows = []
+    for caller, device_id in [
+        ("top 10", by_steps[0]),
+        ("bottom", by_steps[-10]),
+    ]:
+        # Resolve the device once, so only the leaderboard is measured
+        get(device_id)
+        ms, queries = measure(
+            lambda: get(device_id),
+            repeat=repeat,
+            setup=LeaderboardRanking.invalidate,
+        )
+        rows.append([caller, "cold", queries, f"{ms:.1f}"])
+        ms, queries = measure(lambda: get(device_id), repeat=repeat)
+        rows.append([caller, "warm", queries, f"{ms:.1f}"])
+    report(rows, ["caller", "ranking", "queries", "median ms"])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--participants", type=int, default=50000, help="Leaderboard size"
+    )
+    p.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = p.parse_args()
+    with test_database():
+        run(args.participants, args.repeat)
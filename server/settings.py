@@ -78,6 +78,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.admindocs",
     "django.contrib.humanize",
+    "django.contrib.postgres",
     "home.apps.HomeConfig",
 ]
 
@@ -199,3 +200,58 @@ LOGGING = {
 }
 
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+if CACHES["default"]["BACKEND"].endswith(".LocMemCache"):
+    # Room for cached chart months and responses (the default is 300)
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+    }
+# Seconds to keep cached admin responses. They are keyed on the data
+# version, so this only bounds how long stale entries take up memory.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 86400))
+
+# In-process caches
+# Seconds between checks for contests changed by other processes
+CONTEST_CALENDAR_TTL = int(os.getenv("CONTEST_CALENDAR_TTL", 60))
+# Registered devices cached per process, and for how many seconds
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", 10000))
+DEVICE_CACHE_TTL = int(os.getenv("DEVICE_CACHE_TTL", 60))
+# Seconds to remember unregistered device ids
+DEVICE_CACHE_NEGATIVE_TTL = int(os.getenv("DEVICE_CACHE_NEGATIVE_TTL", 5))
+# Seconds between checks for devices changed by other processes
+DEVICE_CACHE_CHECK = int(os.getenv("DEVICE_CACHE_CHECK", 5))
+# Seconds to cache an account's intentional walk totals (0 disables)
+INTENTIONALWALK_TOTALS_TTL = int(os.getenv("INTENTIONALWALK_TOTALS_TTL", 0))
+# Seconds before a contest's cached leaderboard ranking is rebuilt
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", 30))
+# Chart data for months that ended more than this many days ago is cached
+# (in CACHES) until a write touches one of their days, in any process (see
+# home.utils.series).
+SERIES_LIVE_DAYS = int(os.getenv("SERIES_LIVE_DAYS", 7))
+# Accounts there must be before the admin user list estimates its total
+# from table statistics instead of counting
+ACCOUNT_COUNT_ESTIMATE_MIN = int(
+    os.getenv("ACCOUNT_COUNT_ESTIMATE_MIN", 10000)
+)
+# Accounts per chunk of the contest export, fetched from the database
+# through a server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+# Directory the run_export_jobs command writes contest exports to
+EXPORT_ROOT = os.getenv("EXPORT_ROOT", PROJECT_ROOT / "exports")
+
+# Daily walk ingest
+# Queue synced daily walks for the ingest_worker command instead of saving
+# them during the request
+DAILYWALK_ASYNC_INGEST = os.getenv("DAILYWALK_ASYNC_INGEST") == "true"
+# Queued batches the worker saves per transaction
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 100))
+# Failed attempts to save a queued batch before it is no longer retried
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 5))